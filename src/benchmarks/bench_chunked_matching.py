@@ -0,0 +1,63 @@
+import sys
+import os
+import time
+
+# Ensure project root is on path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+from src.benchmarks.bench_map_matching import synthetic_run
+from src.core.chunked_matching import CHUNK_SIZE, match_points_chunked, snap_points_chunked
+from src.core.graph_loader import load_graph_arrays
+from src.core.map_matching import get_map_matcher
+from src.core.snapping_fast import snap_points_columnar
+
+
+# ---------------------------------------------------------
+# Main
+# ---------------------------------------------------------
+
+def timed(func):
+    t0 = time.perf_counter()
+    out = func()
+    return time.perf_counter() - t0, out
+
+
+def main():
+    """
+    Latency against track length, sequential vs chunked:
+
+        python src/benchmarks/bench_chunked_matching.py [workers] [chunk_size]
+    """
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else CHUNK_SIZE
+
+    ga = load_graph_arrays()
+    matcher = get_map_matcher(ga)
+    print(f"Workers: {workers}  chunk size: {chunk_size}  (cpus: {os.cpu_count()})")
+    print(f"{'points':>8} | {'nearest':>8} {'chunked':>8} | {'hmm':>8} {'chunked':>8} | same")
+
+    for n in (5_000, 10_000, 20_000, 40_000, 80_000):
+        pts, _ = synthetic_run(ga, n)
+
+        t_near, near = timed(lambda: snap_points_columnar(ga, pts, index=matcher.index))
+        t_near_c, near_c = timed(
+            lambda: snap_points_chunked(ga, pts, chunk_size=chunk_size, workers=workers)
+        )
+        t_hmm, seq = timed(lambda: matcher.match(pts))
+        t_hmm_c, par = timed(
+            lambda: match_points_chunked(ga, pts, chunk_size=chunk_size, workers=workers)
+        )
+
+        same = (
+            all(np.array_equal(near[k], near_c[k], equal_nan=True) for k in near)
+            and par.node_path == seq.node_path
+            and np.array_equal(par.edge, seq.edge)
+        )
+        print(f"{n:>8} | {t_near:8.3f} {t_near_c:8.3f} | {t_hmm:8.3f} {t_hmm_c:8.3f} | {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import sys
+import os
+import time
+
+# Ensure project root is on path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import osmnx as ox
+from src.core.graph_loader import MASTER_GRAPH_PATH, MASTER_SNAPSHOT_PATH
+from src.core.graph_snapshot import (
+    convert_graphml,
+    load_snapshot,
+    load_snapshot_arrays,
+    snapshot_is_current,
+)
+
+
+# ---------------------------------------------------------
+# Helper: best-of-N timing
+# ---------------------------------------------------------
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+# ---------------------------------------------------------
+# Main
+# ---------------------------------------------------------
+
+def main():
+    graphml_path = sys.argv[1] if len(sys.argv) > 1 else MASTER_GRAPH_PATH
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else MASTER_SNAPSHOT_PATH
+
+    if not snapshot_is_current(snapshot_path, graphml_path):
+        print("Converting", graphml_path, "->", snapshot_path)
+        convert_graphml(graphml_path, snapshot_path)
+
+    t_graphml, G = timed(lambda: ox.load_graphml(graphml_path), repeat=1)
+    t_snap_nx, G_snap = timed(lambda: load_snapshot(snapshot_path))
+    t_snap_arr, _ = timed(lambda: load_snapshot_arrays(snapshot_path))
+    t_snap_mmap, _ = timed(lambda: load_snapshot_arrays(snapshot_path, mmap_mode="r"))
+
+    print(f"Nodes: {len(G.nodes())}  Edges: {len(G.edges())}")
+    print(f"GraphML -> networkx     : {t_graphml:8.3f} s")
+    print(f"Snapshot -> networkx    : {t_snap_nx:8.3f} s  ({t_graphml / t_snap_nx:5.1f}x)")
+    print(f"Snapshot -> arrays      : {t_snap_arr:8.3f} s  ({t_graphml / t_snap_arr:5.1f}x)")
+    print(f"Snapshot -> arrays mmap : {t_snap_mmap:8.3f} s")
+
+    assert len(G_snap.nodes()) == len(G.nodes())
+    assert len(G_snap.edges()) == len(G.edges())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import sys
+import os
+import time
+
+# Ensure project root is on path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.core.graph_loader import MASTER_GRAPH_PATH, MASTER_SNAPSHOT_PATH
+from src.core.graph_repair import _repair_graph_loop, repair_candidates, repair_graph
+from src.core.graph_snapshot import convert_graphml, load_snapshot, snapshot_is_current
+
+
+# ---------------------------------------------------------
+# Helper: time one repair on a fresh copy
+# ---------------------------------------------------------
+
+def timed_repair(fn, G, max_gap_m, **kwargs):
+    G = G.copy()
+    t0 = time.perf_counter()
+    G = fn(G, max_gap_m=max_gap_m, **kwargs)
+    return time.perf_counter() - t0, G
+
+
+def edge_list(G):
+    return [
+        (u, v, k, d.get("length"), d["geometry"].wkb if "geometry" in d else None)
+        for u, v, k, d in G.edges(keys=True, data=True)
+    ]
+
+
+# ---------------------------------------------------------
+# Main
+# ---------------------------------------------------------
+
+def main():
+    graphml_path = sys.argv[1] if len(sys.argv) > 1 else MASTER_GRAPH_PATH
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else MASTER_SNAPSHOT_PATH
+    max_gap_m = float(sys.argv[3]) if len(sys.argv) > 3 else 30
+
+    if not snapshot_is_current(snapshot_path, graphml_path):
+        print("Converting", graphml_path, "->", snapshot_path)
+        convert_graphml(graphml_path, snapshot_path)
+
+    G = load_snapshot(snapshot_path)
+    print(f"Nodes: {len(G.nodes())}  Edges: {len(G.edges())}  max_gap_m: {max_gap_m}")
+
+    t_loop, G_loop = timed_repair(_repair_graph_loop, G, max_gap_m)
+    t_bulk, G_bulk = timed_repair(repair_graph, G, max_gap_m, prune=False)
+    t_pruned, G_pruned = timed_repair(repair_graph, G, max_gap_m)
+    workers = os.cpu_count() or 1
+    t_par, G_par = timed_repair(repair_graph, G, max_gap_m, workers=workers)
+
+    _, counts = repair_candidates(G, max_gap_m)
+    added = len(G_pruned.edges()) - len(G.edges())
+    print(f"Per-pair loop : {t_loop:8.3f} s")
+    print(f"Bulk STRtree  : {t_bulk:8.3f} s  ({t_loop / t_bulk:5.1f}x)")
+    print(f"Bulk + pruning: {t_pruned:8.3f} s  ({t_loop / t_pruned:5.1f}x)")
+    print(f"Pool x{workers:<3d}     : {t_par:8.3f} s  ({t_loop / t_par:5.1f}x)")
+    print(f"Candidates    : {counts['unlinked']} unlinked -> {counts['gaps']} gaps")
+    print(f"Edges added   : {added}")
+
+    assert sorted(edge_list(G_bulk)) == sorted(edge_list(G_loop)), "repair outputs differ"
+    assert edge_list(G_par) == edge_list(G_pruned), "parallel output differs from serial"
+    print("Outputs identical.")
+    if edge_list(G_pruned) != edge_list(G_bulk):
+        print("Note: pruning changed the added edges (expected after REPAIR_VERSION 2).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import sys
+import os
+import time
+
+# Ensure project root is on path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+from src.core.graph_loader import load_graph_arrays
+from src.core.map_matching import get_map_matcher
+from src.core.preprocessing import haversine_m_np
+from src.core.snapping_fast import snap_points_columnar
+
+
+# ---------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------
+
+def synthetic_run(ga, n, spacing_m=3.0, noise_m=4.0, seed=0):
+    """
+    n noisy GPS points, spacing_m apart (a 1 Hz run), along a random walk
+    through the graph that never turns straight back.
+    """
+    rng = np.random.default_rng(seed)
+    targets = np.asarray(ga.targets)
+    indptr = np.asarray(ga.indptr)
+
+    path = [int(rng.integers(0, ga.num_nodes))]
+    walked = 0.0
+    while walked < n * spacing_m:
+        here = path[-1]
+        nxt = targets[indptr[here]:indptr[here + 1]]
+        if len(path) > 1:
+            nxt = nxt[nxt != path[-2]]
+        if len(nxt) == 0:
+            break
+        step = int(rng.choice(nxt))
+        walked += float(ga.lengths[ga.find_edge(here, step)])
+        path.append(step)
+
+    lat, lon = np.asarray(ga.node_y)[path], np.asarray(ga.node_x)[path]
+    dist = np.concatenate([[0], np.cumsum(haversine_m_np(lat[:-1], lon[:-1], lat[1:], lon[1:]))])
+    at = np.linspace(0, min(dist[-1], n * spacing_m), n)
+    m_lat = 1 / 111_195
+    m_lon = m_lat / np.cos(np.radians(lat.mean()))
+    points = np.column_stack([
+        np.interp(at, dist, lat) + rng.normal(0, noise_m, n) * m_lat,
+        np.interp(at, dist, lon) + rng.normal(0, noise_m, n) * m_lon,
+    ])
+    return points, [int(i) for i in ga.node_ids[path]]
+
+
+# ---------------------------------------------------------
+# Main
+# ---------------------------------------------------------
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+
+    ga = load_graph_arrays()
+    pts, true_path = synthetic_run(ga, n)
+    matcher = get_map_matcher(ga)
+    print(f"Points: {n}  true path: {len(true_path)} nodes")
+
+    t0 = time.perf_counter()
+    nearest = snap_points_columnar(ga, pts, index=matcher.index)
+    t_nearest = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    result = matcher.match(pts)
+    t_hmm = time.perf_counter() - t0
+
+    print(f"Nearest-edge snapping: {t_nearest:8.3f} s")
+    print(f"HMM matching         : {t_hmm:8.3f} s")
+    print(f"Chain breaks         : {len(result.breaks) - 1}")
+
+    on_path = set(true_path)
+    src = ga.node_ids[ga.sources]
+    dst = ga.node_ids[np.asarray(ga.targets)]
+
+    def share(edges):
+        return np.mean([src[e] in on_path and dst[e] in on_path for e in edges.tolist()])
+
+    print(f"Points on true path  : nearest {share(nearest['edge']):.1%}  hmm {share(result.edge):.1%}")
+    print(f"Matched path         : {len(result.node_path)} nodes, "
+          f"{len(set(result.node_path) & on_path) / len(on_path):.1%} of true path")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import sys
+import os
+import time
+
+# Ensure project root is on path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+import osmnx as ox
+from src.benchmarks.bench_map_matching import synthetic_run
+from src.core.graph_loader import load_graph_arrays
+from src.core.preprocessing import haversine_m
+from src.core.snap_index import get_snap_index
+from src.core.snapping_fast import snap_points_columnar
+
+
+# ---------------------------------------------------------
+# Previous RunPath._compute_node_sequence variants
+# ---------------------------------------------------------
+
+def nodes_nearest_edges(G, snapped_points):
+    """networkx graphs: a second nearest_edges search per point."""
+    nodes = []
+    for lat, lon in snapped_points:
+        u, v, _ = ox.distance.nearest_edges(G, lon, lat)
+        d_u = haversine_m(lat, lon, G.nodes[u]["y"], G.nodes[u]["x"])
+        d_v = haversine_m(lat, lon, G.nodes[v]["y"], G.nodes[v]["x"])
+        nodes.append(u if d_u <= d_v else v)
+    return nodes
+
+
+def nodes_from_edges_loop(ga, cols):
+    """GraphArrays: snapped edge per point, two haversines per point."""
+    nodes = []
+    for edge, lat, lon in zip(cols["edge"].tolist(), cols["snapped_lat"].tolist(),
+                              cols["snapped_lon"].tolist()):
+        u, v = int(ga.sources[edge]), int(ga.targets[edge])
+        d_u = haversine_m(lat, lon, *ga.node_latlon(u))
+        d_v = haversine_m(lat, lon, *ga.node_latlon(v))
+        nodes.append(int(ga.node_ids[u if d_u <= d_v else v]))
+    return nodes
+
+
+def simplify(nodes):
+    nodes = np.asarray(nodes)
+    keep = np.ones(len(nodes), dtype=bool)
+    keep[1:] = nodes[1:] != nodes[:-1]
+    return nodes[keep].tolist()
+
+
+# ---------------------------------------------------------
+# Main
+# ---------------------------------------------------------
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    n_nx = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    ga = load_graph_arrays()
+    index = get_snap_index(ga)
+    pts, _ = synthetic_run(ga, n)
+    cols = snap_points_columnar(ga, pts, index=index)
+    snapped = np.column_stack([cols["snapped_lat"], cols["snapped_lon"]])
+    print(f"Points: {n}")
+
+    t0 = time.perf_counter()
+    new = simplify(cols["node"])
+    t_new = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    old = simplify(nodes_from_edges_loop(ga, cols))
+    t_loop = time.perf_counter() - t0
+
+    G = ga.to_graph()
+    t0 = time.perf_counter()
+    nodes_nearest_edges(G, snapped[:n_nx].tolist())
+    t_nx = (time.perf_counter() - t0) * n / n_nx
+
+    print(f"nearest_edges per point : {t_nx:8.3f} s  (extrapolated from {n_nx} points)")
+    print(f"Edge id + haversines    : {t_loop:8.3f} s")
+    print(f"Edge id + offset (numpy): {t_new:8.3f} s  ({t_loop / t_new:5.0f}x)")
+
+    # Offset < 0.5 is "closer along the edge"; on bent edges that can
+    # differ from the straight-line closer endpoint
+    print(f"Sequences agree: {old == new}  ({len(new)} vs {len(old)} nodes)")
+
+
+if __name__ == "__main__":
+    main()
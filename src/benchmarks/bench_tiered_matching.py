@@ -0,0 +1,120 @@
+import sys
+import os
+import time
+
+# Ensure project root is on path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import networkx as nx
+import numpy as np
+from src.benchmarks.bench_map_matching import synthetic_run
+from src.core.graph_arrays import GraphArrays
+from src.core.graph_loader import load_graph_arrays
+from src.core.map_matching import get_map_matcher
+from src.core.preprocessing import haversine_m
+from src.core.snapping_fast import snap_points_columnar
+from src.core.tiered_matching import match_points_tiered
+
+
+# ---------------------------------------------------------
+# Synthetic canal street
+# ---------------------------------------------------------
+
+def canal_run(n, spacing_m=3.0, gap_m=12.0, seg_m=10.0, block_m=80.0, seed=0):
+    """
+    (ga, points, true_path) for a run along a street split into seg_m
+    edges, with side streets every block_m. Over the first half a second
+    path runs gap_m to the north (the far side of a canal), and every 7th
+    point drifts towards it, so nearest-edge snapping jumps sides there
+    and the map matcher does not.
+    """
+    rng = np.random.default_rng(seed)
+    lat0, lon0 = 52.36, 4.90
+    m_lat = 1 / 111_195
+    m_lon = m_lat / np.cos(np.radians(lat0))
+    G = nx.MultiDiGraph(crs="epsg:4326")
+
+    def line(first, x0, y0, dx, dy, count):
+        for i in range(count + 1):
+            G.add_node(first + i, x=lon0 + (x0 + dx * i) * m_lon, y=lat0 + (y0 + dy * i) * m_lat)
+            if i:
+                connect(first + i - 1, first + i)
+        return list(range(first, first + count + 1))
+
+    def connect(a, b):
+        na, nb = G.nodes[a], G.nodes[b]
+        length = haversine_m(na["y"], na["x"], nb["y"], nb["x"])
+        G.add_edge(a, b, length=length)
+        G.add_edge(b, a, length=length)
+
+    k = int(np.ceil(n * spacing_m / seg_m)) + 2
+    street = line(0, 0, 0, seg_m, 0, k)
+    canal = line(1_000_000, 0, gap_m, seg_m, 0, k // 2)
+    connect(street[0], canal[0])
+    connect(street[k // 2], canal[-1])
+    side = int(block_m // seg_m)
+    for b, j in enumerate(range(side, k, side)):
+        connect(street[j], line(2_000_000 + 100 * b, j * seg_m, -seg_m, 0, -seg_m, side - 1)[0])
+
+    along = seg_m + np.arange(n) * spacing_m
+    north = rng.normal(0, 3, n)
+    north[::7] = 0.7 * gap_m
+    pts = np.column_stack([lat0 + north * m_lat, lon0 + along * m_lon])
+    return GraphArrays.from_graph(G), pts, street
+
+
+# ---------------------------------------------------------
+# Main
+# ---------------------------------------------------------
+
+def timed(func):
+    t0 = time.perf_counter()
+    out = func()
+    return time.perf_counter() - t0, out
+
+
+def main():
+    """
+    Nearest-edge vs full HMM vs tiered matching on a synthetic run through
+    the master graph, or along a synthetic canal street (canal_run), where
+    the HMM is more accurate than nearest-edge snapping:
+
+        python src/benchmarks/bench_tiered_matching.py [points] [--canal]
+    """
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    n = int(args[0]) if args else 10_000
+
+    if "--canal" in sys.argv:
+        ga, pts, true_path = canal_run(n)
+    else:
+        ga = load_graph_arrays()
+        pts, true_path = synthetic_run(ga, n)
+    matcher = get_map_matcher(ga)
+    print(f"Points: {n}  true path: {len(true_path)} nodes")
+
+    t_near, nearest = timed(lambda: snap_points_columnar(ga, pts, index=matcher.index))
+    t_hmm, hmm = timed(lambda: matcher.match(pts))
+    t_tier, tiered = timed(lambda: match_points_tiered(ga, pts))
+
+    on_path = set(true_path)
+    src = ga.node_ids[ga.sources]
+    dst = ga.node_ids[np.asarray(ga.targets)]
+
+    def share(edges):
+        return np.mean([src[e] in on_path and dst[e] in on_path for e in edges.tolist()])
+
+    print(f"{'':8} {'time s':>8} {'on path':>8}")
+    print(f"{'nearest':8} {t_near:8.3f} {share(nearest['edge']):8.1%}")
+    print(f"{'hmm':8} {t_hmm:8.3f} {share(hmm.edge):8.1%}")
+    print(f"{'tiered':8} {t_tier:8.3f} {share(tiered.edge):8.1%}")
+
+    tiers = "  ".join(f"{k} {v:.1%}" for k, v in tiered.tier_fractions.items())
+    flags = "  ".join(f"{k} {v:.1%}" for k, v in tiered.flag_fractions.items())
+    print(f"Tiers: {tiers}  ({len(tiered.windows)} windows)")
+    print(f"Flags: {flags}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+# src/core/batch_snap.py
+
+"""
+Batch snapping of the whole activity archive.
+
+    python -m src.core.batch_snap [--workers 4] [--mode nearest|hmm] [--max-gap-m 30]
+
+Every stream file dumped by strava/dump_streams.py (src/data/streams/<id>.json)
+is turned into a RunPath and its node sequence written to an SQLite store
+(ArchiveStore). Rows are keyed by (activity_id, graph_version, mode):
+
+    - re-running skips activities already stored for the current graph
+      version, so an interrupted run resumes where it stopped
+    - a new graph version (repair, patch) reprocesses everything, while the
+      results for older versions stay readable
+
+The graph is loaded once as a memory-mapped EdgeStore (see edge_store.py),
+and its SnapIndex (or MapMatcher) built before the worker processes are
+forked, so workers share one read-only copy instead of each loading GraphML. Only the parent writes to
+the store.
+
+The report gives activities and points per second plus the time spent per
+stage (load, clean, snap, nodes, stats in the workers; store in the parent).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+
+from src.core.graph_loader import load_edge_store
+from src.core.map_matching import get_map_matcher
+from src.core.run_path import MATCH_MODES, RunPath
+from src.core.snap_index import get_snap_index, graph_fingerprint
+
+STREAMS_DIR = os.path.join(PROJECT_ROOT, "src/data/streams")
+ARCHIVE_DB_PATH = os.path.join(PROJECT_ROOT, "src/data/activity_paths.sqlite")
+
+# Results written per store transaction; an interruption loses at most
+# this many, which are redone on the next run
+COMMIT_EVERY = 50
+
+# Stage names in report order
+STAGES = ("load", "clean", "snap", "nodes", "stats", "store")
+
+# Set in the parent before the pool forks; read by workers
+_WORKER = {}
+
+
+# -------------------------------------------------------------------
+# Store
+# -------------------------------------------------------------------
+
+class ArchiveStore:
+    """
+    SQLite table of processed activities. Node sequences are stored as
+    int64 blobs; status is "ok", "no_gps" (no latlng stream) or "error".
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS activity_paths (
+            activity_id   INTEGER NOT NULL,
+            graph_version TEXT    NOT NULL,
+            mode          TEXT    NOT NULL,
+            status        TEXT    NOT NULL,
+            num_points    INTEGER,
+            node_sequence BLOB,
+            stats         TEXT,
+            error         TEXT,
+            processed_at  TEXT    NOT NULL,
+            PRIMARY KEY (activity_id, graph_version, mode)
+        )
+    """
+
+    def __init__(self, path=ARCHIVE_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(self.SCHEMA)
+        self.conn.commit()
+
+    def done_ids(self, graph_version, mode):
+        """Activity ids that need no work for this graph version and mode."""
+        rows = self.conn.execute(
+            "SELECT activity_id FROM activity_paths"
+            " WHERE graph_version = ? AND mode = ? AND status != 'error'",
+            (graph_version, mode),
+        )
+        return {r[0] for r in rows}
+
+    def put(self, result, graph_version, mode):
+        """Insert or replace one worker result (not committed)."""
+        nodes = result.get("node_sequence")
+        self.conn.execute(
+            "INSERT OR REPLACE INTO activity_paths VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                result["activity_id"],
+                graph_version,
+                mode,
+                result["status"],
+                result.get("num_points"),
+                None if nodes is None else np.asarray(nodes, dtype=np.int64).tobytes(),
+                json.dumps(result["stats"]) if result.get("stats") else None,
+                result.get("error"),
+                datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            ),
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def get(self, activity_id, graph_version, mode="nearest"):
+        """Stored row as a dict (node_sequence as a list), or None."""
+        row = self.conn.execute(
+            "SELECT status, num_points, node_sequence, stats, error FROM activity_paths"
+            " WHERE activity_id = ? AND graph_version = ? AND mode = ?",
+            (activity_id, graph_version, mode),
+        ).fetchone()
+        if row is None:
+            return None
+        status, num_points, blob, stats, error = row
+        return {
+            "activity_id": activity_id,
+            "status": status,
+            "num_points": num_points,
+            "node_sequence": None if blob is None else np.frombuffer(blob, dtype=np.int64).tolist(),
+            "stats": None if stats is None else json.loads(stats),
+            "error": error,
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+# -------------------------------------------------------------------
+# Worker
+# -------------------------------------------------------------------
+
+def _activity_id(path):
+    return int(os.path.splitext(os.path.basename(path))[0])
+
+
+def _process_activity(path):
+    """Snap one stream file with the shared graph; returns a result dict."""
+    G, mode = _WORKER["G"], _WORKER["mode"]
+    result = {"activity_id": _activity_id(path), "timings": {}}
+
+    t0 = time.perf_counter()
+    try:
+        with open(path, "r") as f:
+            streams = json.load(f)
+        result["timings"]["load"] = time.perf_counter() - t0
+
+        latlng = streams.get("latlng", {}).get("data") if isinstance(streams, dict) else None
+        if not latlng:
+            result["status"] = "no_gps"
+            return result
+
+        run = RunPath.from_streams(G, streams, mode=mode)
+    except Exception as exc:
+        result["status"] = "error"
+        result["error"] = f"{type(exc).__name__}: {exc}"
+        return result
+
+    result["timings"].update(run.timings)
+    result.update(
+        status="ok",
+        num_points=len(run.raw_points),
+        node_sequence=np.asarray(run.node_sequence, dtype=np.int64),
+        stats=run.stats.__dict__,
+    )
+    return result
+
+
+def _run_activities(paths, workers):
+    """Yield _process_activity results, at most 2 * workers files in flight."""
+    if workers <= 1:
+        for p in paths:
+            yield _process_activity(p)
+        return
+
+    ctx = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        pending = set()
+        for p in paths:
+            pending.add(pool.submit(_process_activity, p))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    yield f.result()
+        for f in pending:
+            yield f.result()
+
+
+# -------------------------------------------------------------------
+# Driver
+# -------------------------------------------------------------------
+
+def stream_paths(streams_dir=STREAMS_DIR):
+    """Stream files named <activity_id>.json, sorted by activity id."""
+    if not os.path.isdir(streams_dir):
+        return []
+    names = [n for n in os.listdir(streams_dir) if n.endswith(".json") and n[:-5].isdigit()]
+    return [os.path.join(streams_dir, n) for n in sorted(names, key=lambda n: int(n[:-5]))]
+
+
+def snap_archive(G, paths, store, mode="nearest", workers=1, progress_every=100):
+    """
+    Snap every stream file in paths not yet stored for G's version and
+    write the results to store (an ArchiveStore). Returns a report dict.
+    """
+    if mode not in MATCH_MODES:
+        raise ValueError(f"Unknown mode '{mode}'. Expected one of {MATCH_MODES}.")
+
+    t_start = time.perf_counter()
+    version = graph_fingerprint(G)
+
+    # Build the shared indexes before forking, so workers inherit them
+    if mode != "nearest":
+        get_map_matcher(G)
+    else:
+        get_snap_index(G)
+    _WORKER.update(G=G, mode=mode)
+    setup_s = time.perf_counter() - t_start
+
+    done = store.done_ids(version, mode)
+    todo = [p for p in paths if _activity_id(p) not in done]
+    print(f"DEBUG: {len(paths)} activities, {len(paths) - len(todo)} already "
+          f"processed for graph {version}, {len(todo)} to do.")
+
+    counts = defaultdict(int)
+    stage_s = defaultdict(float)
+    num_points = 0
+    t_run = time.perf_counter()
+
+    try:
+        for i, result in enumerate(_run_activities(todo, workers), start=1):
+            t0 = time.perf_counter()
+            store.put(result, version, mode)
+            if i % COMMIT_EVERY == 0:
+                store.commit()
+            stage_s["store"] += time.perf_counter() - t0
+
+            counts[result["status"]] += 1
+            num_points += result.get("num_points") or 0
+            for stage, s in result["timings"].items():
+                stage_s[stage] += s
+
+            if progress_every and i % progress_every == 0:
+                rate = i / (time.perf_counter() - t_run)
+                print(f"DEBUG: {i}/{len(todo)} activities ({rate:.1f}/s)")
+    finally:
+        store.commit()
+        _WORKER.clear()
+
+    run_s = time.perf_counter() - t_run
+    processed = sum(counts.values())
+    return {
+        "graph_version": version,
+        "mode": mode,
+        "workers": workers,
+        "total": len(paths),
+        "skipped": len(paths) - len(todo),
+        "processed": processed,
+        "ok": counts["ok"],
+        "no_gps": counts["no_gps"],
+        "errors": counts["error"],
+        "points": num_points,
+        "setup_s": setup_s,
+        "run_s": run_s,
+        "activities_per_s": processed / run_s if run_s > 0 else 0.0,
+        "points_per_s": num_points / run_s if run_s > 0 else 0.0,
+        "stage_s": {stage: stage_s[stage] for stage in STAGES if stage in stage_s},
+    }
+
+
+def print_report(report):
+    print("\nArchive snapping report")
+    print("-----------------------")
+    print(f"graph version   {report['graph_version']} ({report['mode']}, "
+          f"{report['workers']} workers)")
+    print(f"activities      {report['processed']} processed, {report['skipped']} skipped "
+          f"({report['ok']} ok, {report['no_gps']} without GPS, {report['errors']} errors)")
+    print(f"setup           {report['setup_s']:.2f} s (graph indexes)")
+    print(f"run             {report['run_s']:.2f} s: {report['activities_per_s']:.2f} "
+          f"activities/s, {report['points_per_s']:.0f} points/s")
+
+    n = max(report["processed"], 1)
+    total = sum(report["stage_s"].values()) or 1.0
+    print("stage time (summed over workers):")
+    for stage, s in report["stage_s"].items():
+        print(f"  {stage:<6} {s:9.2f} s  {1000 * s / n:8.1f} ms/activity  {100 * s / total:5.1f}%")
+
+
+# -------------------------------------------------------------------
+# Main
+# -------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snap every dumped activity stream.")
+    parser.add_argument("--streams-dir", default=STREAMS_DIR)
+    parser.add_argument("--db", default=ARCHIVE_DB_PATH)
+    parser.add_argument("--mode", choices=MATCH_MODES, default="nearest")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-gap-m", type=float, default=30)
+    args = parser.parse_args(argv)
+
+    paths = stream_paths(args.streams_dir)
+    if not paths:
+        print(f"No stream files in {args.streams_dir}")
+        return
+
+    G = load_edge_store(max_gap_m=args.max_gap_m, mmap=True)
+    store = ArchiveStore(args.db)
+    try:
+        report = snap_archive(G, paths, store, mode=args.mode, workers=args.workers)
+    finally:
+        store.close()
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+# src/core/build_graph.py
+
+"""
+Offline graph build pipeline.
+
+    python -m src.core.build_graph amsterdam_east [--max-gap-m 30] [--detour-factor 3] [--workers 4] [--force]
+    python -m src.core.build_graph amsterdam_east --extract noord-holland.osm.pbf
+
+Produces every runtime artifact for a region under data/osm_cache/<region>/:
+
+    raw.graphml         dense, unsimplified walk network from OSM
+                        (not written when building from a local extract)
+    raw.snapshot/       binary snapshot of raw.graphml, or of the extract
+    repaired.snapshot/  raw graph after repair_graph
+    tiles/              spatial tiles of the repaired graph (see graph_tiles.py)
+    manifest.json       bbox, counts, hashes and per-stage records
+
+Each stage records the hashes of its inputs in the manifest and is skipped on
+the next run if those inputs and its output are unchanged.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.core.graph_arrays import GraphArrays
+from src.core.graph_loader import file_sha256, region_build_dir
+from src.core.graph_repair import DETOUR_FACTOR, REPAIR_VERSION, repair_graph
+from src.core.graph_snapshot import (
+    ARRAY_NAMES,
+    ATTRIBUTES_FILE,
+    SNAPSHOT_VERSION,
+    convert_graphml,
+    load_snapshot,
+    read_snapshot_meta,
+    save_snapshot,
+)
+from src.core.graph_tiles import TILE_SIZE_DEG, build_tiles, read_tiles_index
+from src.core.osm_extract import EXTRACT_VERSION, build_snapshot_from_extract
+from src.core.regions import get_region, region_polygon
+
+MANIFEST = "manifest.json"
+
+
+# ---------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------
+
+def snapshot_sha256(path):
+    """
+    Content hash of a snapshot directory (all arrays, in a fixed order, and
+    attributes.json if present).
+    """
+    h = hashlib.sha256()
+    for name in ARRAY_NAMES:
+        h.update(file_sha256(os.path.join(path, f"{name}.npy")).encode())
+    attributes = os.path.join(path, ATTRIBUTES_FILE)
+    if os.path.exists(attributes):
+        h.update(file_sha256(attributes).encode())
+    return h.hexdigest()
+
+
+def dict_sha256(d):
+    return hashlib.sha256(json.dumps(d, sort_keys=True).encode()).hexdigest()
+
+
+def read_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"stages": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(out_dir, manifest):
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+class Pipeline:
+    """
+    Runs named stages in order. A stage is skipped when its recorded inputs
+    match the current ones and its output still exists.
+    """
+
+    def __init__(self, out_dir, force=False):
+        self.out_dir = out_dir
+        self.force = force
+        self.manifest = read_manifest(out_dir)
+        self.timings = []
+
+    def run(self, name, inputs, output, build, exists):
+        record = self.manifest["stages"].get(name)
+        up_to_date = (
+            not self.force
+            and record is not None
+            and record.get("inputs") == inputs
+            and exists(output)
+        )
+
+        t0 = time.perf_counter()
+        if up_to_date:
+            status = "skipped"
+        else:
+            build(output)
+            status = "built"
+        dt = time.perf_counter() - t0
+
+        if not up_to_date:
+            self.manifest["stages"][name] = {
+                "inputs": inputs,
+                "output": os.path.relpath(output, self.out_dir),
+                "seconds": round(dt, 3),
+            }
+            write_manifest(self.out_dir, self.manifest)
+
+        self.timings.append((name, status, dt))
+        print(f"[{name:<10}] {status:<8} {dt:8.2f} s")
+
+
+def _snapshot_exists(path):
+    try:
+        read_snapshot_meta(path)
+        return True
+    except (FileNotFoundError, ValueError):
+        return False
+
+
+def _tiles_exist(path):
+    try:
+        read_tiles_index(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+# ---------------------------------------------------------
+# Stages
+# ---------------------------------------------------------
+
+def build_region(
+    region_name,
+    max_gap_m=30,
+    detour_factor=DETOUR_FACTOR,
+    tile_size_deg=TILE_SIZE_DEG,
+    extract=None,
+    force=False,
+    workers=1,
+):
+    """
+    Build (or incrementally update) every runtime artifact for a region.
+    With extract set to a local .osm/.osm.pbf file, the graph is streamed
+    from it instead of downloaded. workers > 1 runs the repair stage in a
+    process pool (same output).
+    """
+    region = get_region(region_name)
+    out_dir = region_build_dir(region_name)
+    os.makedirs(out_dir, exist_ok=True)
+
+    pipe = Pipeline(out_dir, force=force)
+    raw_graphml = os.path.join(out_dir, "raw.graphml")
+    raw_snapshot = os.path.join(out_dir, "raw.snapshot")
+    repaired_snapshot = os.path.join(out_dir, "repaired.snapshot")
+    tiles_dir = os.path.join(out_dir, "tiles")
+
+    if extract is not None:
+        # 1+2. Stream the local extract straight into a snapshot
+        bbox = (region["south"], region["north"], region["west"], region["east"])
+        pipe.run(
+            "extract",
+            {
+                "extract": file_sha256(extract),
+                "region": dict_sha256(region),
+                "extract_version": EXTRACT_VERSION,
+                "snapshot_version": SNAPSHOT_VERSION,
+            },
+            raw_snapshot,
+            lambda out: build_snapshot_from_extract(extract, out, bbox=bbox),
+            _snapshot_exists,
+        )
+    else:
+        # 1. Download the dense walk network
+        def download(out):
+            import osmnx as ox
+
+            G = ox.graph.graph_from_polygon(
+                region_polygon(region),
+                network_type=region["network_type"],
+                simplify=False,
+            )
+            ox.io.save_graphml(G, out)
+
+        pipe.run(
+            "download",
+            {"region": dict_sha256(region)},
+            raw_graphml,
+            download,
+            os.path.exists,
+        )
+
+        # 2. GraphML -> snapshot
+        pipe.run(
+            "snapshot",
+            {"graphml": file_sha256(raw_graphml), "snapshot_version": SNAPSHOT_VERSION},
+            raw_snapshot,
+            lambda out: convert_graphml(raw_graphml, out),
+            _snapshot_exists,
+        )
+
+    # 3. Repair
+    def repair(out):
+        G = repair_graph(
+            load_snapshot(raw_snapshot),
+            max_gap_m=max_gap_m,
+            detour_factor=detour_factor,
+            workers=workers,
+        )
+        save_snapshot(
+            G,
+            out,
+            max_gap_m=float(max_gap_m),
+            detour_factor=float(detour_factor),
+            repair_version=REPAIR_VERSION,
+        )
+
+    pipe.run(
+        "repair",
+        {
+            "snapshot": snapshot_sha256(raw_snapshot),
+            "max_gap_m": float(max_gap_m),
+            "detour_factor": float(detour_factor),
+            "repair_version": REPAIR_VERSION,
+        },
+        repaired_snapshot,
+        repair,
+        _snapshot_exists,
+    )
+
+    # 4. Spatial index: tiles
+    repaired_hash = snapshot_sha256(repaired_snapshot)
+    pipe.run(
+        "tiles",
+        {"snapshot": repaired_hash, "tile_size_deg": tile_size_deg},
+        tiles_dir,
+        lambda out: build_tiles(
+            GraphArrays.load(repaired_snapshot), out, tile_size_deg=tile_size_deg
+        ),
+        _tiles_exist,
+    )
+
+    # 5. Manifest summary
+    ga = GraphArrays.load(repaired_snapshot)
+    pipe.manifest.update({
+        "region": region,
+        "bbox": {
+            "min_lat": float(ga.node_y.min()),
+            "max_lat": float(ga.node_y.max()),
+            "min_lon": float(ga.node_x.min()),
+            "max_lon": float(ga.node_x.max()),
+        },
+        "num_nodes": ga.num_nodes,
+        "num_edges": ga.num_edges,
+        "num_tiles": len(read_tiles_index(tiles_dir)["tiles"]),
+        "hashes": {
+            "raw_snapshot": pipe.manifest["stages"]["repair"]["inputs"]["snapshot"],
+            "repaired_snapshot": repaired_hash,
+        },
+    })
+    write_manifest(out_dir, pipe.manifest)
+
+    total = sum(dt for _, _, dt in pipe.timings)
+    print(f"DONE: {ga.num_nodes} nodes, {ga.num_edges} edges in {total:.2f} s -> {out_dir}")
+    return pipe.manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build runtime graph artifacts for a region.")
+    parser.add_argument("region", help="region name from src/core/regions.py")
+    parser.add_argument("--max-gap-m", type=float, default=30)
+    parser.add_argument("--detour-factor", type=float, default=DETOUR_FACTOR,
+                        help="network/straight distance ratio above which a pair is a gap")
+    parser.add_argument("--tile-size-deg", type=float, default=TILE_SIZE_DEG)
+    parser.add_argument("--extract", help="local .osm / .osm.pbf extract to build from")
+    parser.add_argument("--force", action="store_true", help="rebuild every stage")
+    parser.add_argument("--workers", type=int, default=1, help="processes for the repair stage")
+    args = parser.parse_args(argv)
+
+    build_region(
+        args.region,
+        max_gap_m=args.max_gap_m,
+        detour_factor=args.detour_factor,
+        tile_size_deg=args.tile_size_deg,
+        extract=args.extract,
+        force=args.force,
+        workers=args.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
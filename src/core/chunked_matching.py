@@ -0,0 +1,222 @@
+# src/core/chunked_matching.py
+
+"""
+Parallel snapping and map matching of one long track.
+
+Marathon and ultra recordings have tens of thousands of points. The track
+is split into chunks of chunk_size points which worker processes handle in
+parallel, sharing the parent's SnapIndex / MapMatcher (the pool is forked
+after they are built, as in batch_snap.py). Both functions return exactly
+what the sequential call returns.
+
+Nearest-edge snapping is per point, so chunks are simply concatenated.
+
+HMM matching is not: the Viterbi scores at a point depend on the whole
+track before it. Each chunk after the first is therefore decoded over a
+window starting `overlap` points early, without knowing the scores at the
+window start. The window runs the recursion once per candidate of its
+first point; once every run's scores agree up to a constant (or the chain
+restarts) the window's scores equal the sequential scores up to a
+constant, so its back pointers from that point on are exact. The parent
+takes back pointers from each window from its convergence point on, the
+earlier ones from the previous window, and backtracks the stitched
+lattice once. If a window does not converge within its overlap, the track
+is matched sequentially instead.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.core.map_matching import (
+    MatchResult,
+    get_map_matcher,
+    viterbi_backtrack,
+    viterbi_forward,
+)
+from src.core.projection import to_metric
+from src.core.snap_index import get_snap_index
+from src.core.snapping_fast import snap_points_columnar
+
+# Points per chunk handed to one worker
+CHUNK_SIZE = 5000
+
+# Points a map-matching window starts before its chunk. A few hundred
+# metres of track is nearly always enough for the window to converge.
+CHUNK_OVERLAP = 200
+
+# Tolerance when comparing normalised Viterbi scores of different runs
+SCORE_ATOL = 1e-9
+
+# Set in the parent before the pool forks; read by workers
+_WORKER = {}
+
+
+# -------------------------------------------------------------------
+# Pool
+# -------------------------------------------------------------------
+
+def _chunk_starts(n, chunk_size):
+    return list(range(0, n, max(int(chunk_size), 1)))
+
+
+def _map(func, tasks, workers):
+    """func over tasks, in order; in a forked pool when workers > 1."""
+    if workers <= 1 or len(tasks) <= 1:
+        return [func(t) for t in tasks]
+
+    ctx = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=ctx) as pool:
+        return list(pool.map(func, tasks))
+
+
+# -------------------------------------------------------------------
+# Nearest-edge snapping
+# -------------------------------------------------------------------
+
+def _snap_chunk(points):
+    index = _WORKER["index"]
+    return snap_points_columnar(None, points, index=index)
+
+
+def snap_points_chunked(G, points, chunk_size=CHUNK_SIZE, workers=1):
+    """snap_points_columnar over chunks of chunk_size points in workers processes."""
+    index = get_snap_index(G)
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    starts = _chunk_starts(len(pts), chunk_size)
+    if len(starts) <= 1:
+        return snap_points_columnar(G, pts, index=index)
+
+    _WORKER.update(index=index)
+    try:
+        parts = _map(_snap_chunk, [pts[a:a + chunk_size] for a in starts], workers)
+    finally:
+        _WORKER.clear()
+
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+
+# -------------------------------------------------------------------
+# Map matching
+# -------------------------------------------------------------------
+
+def _converge(emission, trans, last):
+    """
+    Viterbi from every candidate of point 0 separately, until the runs'
+    normalised scores agree or the chain restarts. Returns (t, score) for
+    the first such point t <= last, or None.
+    """
+    if last < 0:
+        return None
+    first = np.flatnonzero(np.isfinite(emission[0]))
+    if len(first) <= 1:
+        return 0, emission[0] - (emission[0].max() if len(first) else 0.0)
+
+    k = emission.shape[1]
+    scores = np.full((len(first), k), -np.inf)
+    scores[np.arange(len(first)), first] = emission[0, first]
+
+    for t in range(1, last + 1):
+        scores = np.max(scores[:, :, None] + trans[t - 1][None], axis=1) + emission[t]
+        alive = np.isfinite(scores).any(axis=1)
+        if not alive.any():
+            # The sequential chain restarts here whatever the start scores
+            return t, emission[t] - emission[t].max()
+        if not alive.all():
+            return None
+
+        scores = scores - scores.max(axis=1, keepdims=True)
+        finite = np.isfinite(scores)
+        if (finite == finite[0]).all() and np.allclose(
+            scores[:, finite[0]], scores[0, finite[0]], rtol=0, atol=SCORE_ATOL
+        ):
+            return t, scores[0]
+    return None
+
+
+def _match_window(task):
+    """
+    Decode one window: returns its candidates and, from its convergence
+    point on, back pointers, vias, chain restarts and final scores.
+    """
+    start, first_exact, x, y = task
+    matcher = _WORKER["matcher"]
+    cand_edge, cand_off, emission, trans, via, _ = matcher.lattice(x, y)
+
+    n, k = cand_edge.shape
+    back = np.zeros((n, k), dtype=np.int64)
+    vias = np.full((n, k), -1, dtype=np.int64)
+    breaks, finals = [], {}
+
+    if start == 0:
+        c, score = 0, emission[0]
+        breaks.append(0)
+    else:
+        hit = _converge(emission, trans, first_exact - start - 1)
+        if hit is None:
+            return None
+        c, score = hit
+
+    viterbi_forward(score, c + 1, emission, trans, via, back, vias, breaks, finals)
+    return {
+        "exact_from": start + c + (start > 0),
+        "cand_edge": cand_edge,
+        "cand_off": cand_off,
+        "back": back,
+        "vias": vias,
+        "breaks": [start + t for t in breaks],
+        "finals": {start + t: s for t, s in finals.items()},
+    }
+
+
+def match_points_chunked(G, points, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP,
+                         workers=1) -> MatchResult:
+    """
+    MapMatcher.match over overlapping windows in workers processes; see
+    the module docstring. Equal to match_points(G, points).
+    """
+    matcher = get_map_matcher(G)
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(pts)
+    starts = _chunk_starts(n, chunk_size)
+    if len(starts) <= 1:
+        return matcher.match(pts)
+
+    x, y = to_metric(pts[:, 1], pts[:, 0], matcher.index.crs)
+    tasks = []
+    for a, b in zip(starts, starts[1:] + [n]):
+        s = max(a - overlap, 0)
+        tasks.append((s, a, x[s:b], y[s:b]))
+
+    _WORKER.update(matcher=matcher)
+    try:
+        windows = _map(_match_window, tasks, workers)
+    finally:
+        _WORKER.clear()
+
+    if any(w is None for w in windows):
+        print("DEBUG: Map-matching window did not converge, matching sequentially…")
+        return matcher.match(pts)
+
+    # Stitch: window i owns points from its convergence point up to the
+    # next window's convergence point
+    k = windows[0]["cand_edge"].shape[1]
+    cand_edge = np.empty((n, k), dtype=np.int64)
+    cand_off = np.empty((n, k))
+    back = np.zeros((n, k), dtype=np.int64)
+    vias = np.full((n, k), -1, dtype=np.int64)
+    breaks, finals = [], {}
+
+    owners = [w["exact_from"] for w in windows[1:]] + [n]
+    for (s, a, _, _), w, lo, hi in zip(tasks, windows, [0] + owners[:-1], owners):
+        rows = slice(lo - s, hi - s)
+        cand_edge[lo:hi] = w["cand_edge"][rows]
+        cand_off[lo:hi] = w["cand_off"][rows]
+        back[lo:hi] = w["back"][rows]
+        vias[lo:hi] = w["vias"][rows]
+        breaks += [t for t in w["breaks"] if lo <= t < hi]
+        finals.update({t: f for t, f in w["finals"].items() if lo <= t + 1 < hi or t == n - 1})
+
+    chosen = viterbi_backtrack(back, breaks, finals)
+    return matcher._result(pts, x, y, cand_edge, cand_off, chosen, vias, breaks, {})
@@ -0,0 +1,178 @@
+# src/core/edge_geometry.py
+
+"""
+Flat edge-geometry table.
+
+All edge coordinates live in one (M, 2) lon/lat array, and edge i owns rows
+[offsets[i], offsets[i+1]). Bounds and lengths are computed for all edges at
+once with numpy. Shapely LineStrings are only created for the edges a caller
+asks for, via geometry() / geometries().
+"""
+
+from __future__ import annotations
+
+from functools import cached_property
+from typing import List
+
+import numpy as np
+import shapely
+from shapely.geometry import LineString
+
+from src.core.graph_snapshot import edge_bounds, graph_to_arrays, slice_indices
+from src.core.preprocessing import haversine_m_np
+
+
+def cells_overlapped(bounds, cell_size):
+    """
+    Expand (K, 4) bounds into one row per grid cell each box overlaps.
+    Returns (item, cx, cy) arrays; item indexes rows of bounds.
+    """
+    cx0 = np.floor(bounds[:, 0] / cell_size).astype(np.int64)
+    cy0 = np.floor(bounds[:, 1] / cell_size).astype(np.int64)
+    cx1 = np.floor(bounds[:, 2] / cell_size).astype(np.int64)
+    cy1 = np.floor(bounds[:, 3] / cell_size).astype(np.int64)
+
+    nx_ = cx1 - cx0 + 1
+    per_item = nx_ * (cy1 - cy0 + 1)
+    item = np.repeat(np.arange(len(bounds), dtype=np.int64), per_item)
+    local = np.arange(len(item)) - np.repeat(np.cumsum(per_item) - per_item, per_item)
+
+    return item, cx0[item] + local % nx_[item], cy0[item] + local // nx_[item]
+
+
+def _cell_code(cx, cy):
+    return cx * (1 << 32) + cy
+
+
+class EdgeGeometry:
+    """
+    Read-only table of edge polylines backed by flat coordinate buffers.
+
+    coords  : (M, 2) float64 or float32 lon/lat
+    offsets : (E+1,) int64
+    """
+
+    def __init__(self, coords, offsets, dtype=None, grid_cell_deg=0.001):
+        coords = np.asarray(coords)
+        if dtype is not None and coords.dtype != dtype:
+            coords = coords.astype(dtype)
+        self.coords = coords
+        self.offsets = np.asarray(offsets)
+        self.grid_cell_deg = grid_cell_deg
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_arrays(cls, arrays, dtype=None) -> "EdgeGeometry":
+        """
+        Wrap the geometry buffers of snapshot arrays (a dict or GraphArrays).
+        No copy is made unless a different dtype is requested.
+        """
+        if not isinstance(arrays, dict):
+            arrays = arrays.__dict__
+        return cls(arrays["geom_coords"], arrays["geom_offsets"], dtype=dtype)
+
+    @classmethod
+    def from_graph(cls, G, dtype=None) -> "EdgeGeometry":
+        """Flatten the edge geometries of a networkx graph (snapshot edge order)."""
+        return cls.from_arrays(graph_to_arrays(G), dtype=dtype)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    # ------------------------------------------------------------------
+    # Vectorised accessors
+    # ------------------------------------------------------------------
+
+    @cached_property
+    def bounds(self) -> np.ndarray:
+        """(E, 4) min_lon, min_lat, max_lon, max_lat of every edge."""
+        return edge_bounds({"geom_coords": self.coords, "geom_offsets": self.offsets})
+
+    @cached_property
+    def lengths_m(self) -> np.ndarray:
+        """(E,) polyline length of every edge in metres."""
+        if len(self.coords) < 2:
+            return np.zeros(len(self), dtype=np.float64)
+
+        c = self.coords.astype(np.float64, copy=False)
+        seg = haversine_m_np(c[:-1, 1], c[:-1, 0], c[1:, 1], c[1:, 0])
+
+        # Segments that join the last vertex of one edge to the first of the next
+        seg[self.offsets[1:-1] - 1] = 0.0
+
+        cum = np.concatenate([[0.0], np.cumsum(seg)])
+        first = np.minimum(self.offsets[:-1], len(cum) - 1)
+        last = np.maximum(self.offsets[1:] - 1, first)
+        return cum[last] - cum[first]
+
+    @cached_property
+    def valid(self) -> np.ndarray:
+        """(E,) True for edges with at least two vertices and a positive length."""
+        return (np.diff(self.offsets) >= 2) & (self.lengths_m > 0)
+
+    def coords_of(self, edge: int) -> np.ndarray:
+        """(k, 2) coordinates of one edge (a view, no copy)."""
+        return self.coords[self.offsets[edge]:self.offsets[edge + 1]]
+
+    # ------------------------------------------------------------------
+    # On-demand shapely / pydeck output
+    # ------------------------------------------------------------------
+
+    def geometry(self, edge: int) -> LineString:
+        return LineString(self.coords_of(edge))
+
+    def geometries(self, edges=None) -> np.ndarray:
+        """Shapely LineStrings for the given edges (all by default)."""
+        if edges is None:
+            edges = np.arange(len(self))
+        edges = np.asarray(edges, dtype=np.int64)
+        idx, sizes = slice_indices(self.offsets, edges)
+        return shapely.linestrings(
+            self.coords[idx].astype(np.float64, copy=False),
+            indices=np.repeat(np.arange(len(edges)), sizes),
+        )
+
+    def paths(self, edges=None) -> List[List[List[float]]]:
+        """[[lon, lat], ...] lists per edge, as expected by pydeck's PathLayer."""
+        if edges is None:
+            edges = np.arange(len(self))
+        flat = self.coords.tolist() if len(edges) == len(self) else None
+        out = []
+        for e in np.asarray(edges, dtype=np.int64).tolist():
+            lo, hi = int(self.offsets[e]), int(self.offsets[e + 1])
+            out.append(flat[lo:hi] if flat is not None else self.coords[lo:hi].tolist())
+        return out
+
+    # ------------------------------------------------------------------
+    # Bounding-box queries
+    # ------------------------------------------------------------------
+
+    @cached_property
+    def _grid(self):
+        """Uniform grid over edge bounds: sorted cell codes + edge ids."""
+        item, cx, cy = cells_overlapped(self.bounds, self.grid_cell_deg)
+        code = _cell_code(cx, cy)
+        order = np.argsort(code, kind="stable")
+        return code[order], item[order]
+
+    def query_bbox(self, min_x, min_y, max_x, max_y) -> np.ndarray:
+        """Indices of edges whose bounds intersect a lon/lat box."""
+        codes, items = self._grid
+        size = self.grid_cell_deg
+
+        cx = np.arange(np.floor(min_x / size), np.floor(max_x / size) + 1, dtype=np.int64)
+        cy = np.arange(np.floor(min_y / size), np.floor(max_y / size) + 1, dtype=np.int64)
+        wanted = _cell_code(cx[:, None], cy[None, :]).ravel()
+
+        lo = np.searchsorted(codes, wanted, side="left")
+        hi = np.searchsorted(codes, wanted, side="right")
+        if not np.any(hi > lo):
+            return np.empty(0, dtype=np.int64)
+        cand = np.unique(np.concatenate([items[a:b] for a, b in zip(lo, hi) if b > a]))
+
+        b = self.bounds[cand]
+        hit = (b[:, 0] <= max_x) & (b[:, 2] >= min_x) & (b[:, 1] <= max_y) & (b[:, 3] >= min_y)
+        return cand[hit]
@@ -0,0 +1,377 @@
+# src/core/edge_store.py
+
+"""
+Compact, deduplicated edge store for the walk graph.
+
+OSM ids are remapped to contiguous int32 node indices (node_ids is the side
+table back to OSM ids), and each physical walkway is stored once, with a
+direction flag, instead of as two directed edges sharing one geometry:
+
+    FORWARD           the u -> v edge exists
+    BACKWARD          the v -> u edge exists
+    SAME_ORIENTATION  the v -> u edge reuses the u -> v geometry as-is instead
+                      of reversing it (what repair_graph / add_edge_between_nodes
+                      produce)
+
+Routing walks the store directly: adjacency is a CSR over node indices
+whose entries point at store rows, built from the direction flags, and
+shortest_path / find_row use it without expanding anything.
+
+Snapping indexes the store rows themselves (SnapIndex.from_store), so a
+snapped "edge" is a store row. to_arrays() expands the store back into
+directed snapshot arrays, and to_graph() exports a networkx graph with the
+original OSM ids. The HMM matcher needs directed edges: get_map_matcher
+expands a store once per fingerprint and keeps only the matcher, not a
+second copy on the store.
+
+save() / load() keep a store on disk (memory-mapped by default), next to
+the snapshot it was built from; see graph_loader.load_edge_store.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.core.edge_geometry import EdgeGeometry
+from src.core.graph_arrays import GraphArrays, csr_dijkstra
+from src.core.graph_snapshot import (
+    arrays_from_edge_list,
+    arrays_to_graph,
+    graph_to_arrays,
+    slice_indices,
+)
+
+FORWARD = 1
+BACKWARD = 2
+SAME_ORIENTATION = 4
+
+STORE_FORMAT = "edge-store"
+STORE_VERSION = 1
+
+STORE_ARRAYS = (
+    "node_ids", "node_x", "node_y", "edge_u", "edge_v", "edge_key",
+    "direction", "lengths", "has_geometry", "geom_coords", "geom_offsets",
+)
+
+
+def arrays_fingerprint(fingerprint):
+    """
+    Fingerprint of the GraphArrays flattened from a graph version of another
+    form (EdgeStore, networkx); edge positions differ between forms, so
+    their indexes must not be shared.
+    """
+    return hashlib.sha256(f"{fingerprint}:arrays".encode()).hexdigest()[:20]
+
+
+def _reversed_slice_indices(offsets, selected):
+    """Like slice_indices, but each slice is walked back to front."""
+    idx, sizes = slice_indices(offsets, selected)
+    starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+    local = np.arange(len(idx)) - starts
+    rev_local = np.repeat(sizes, sizes) - 1 - local
+    return idx - local + rev_local, sizes
+
+
+@dataclass(frozen=True)
+class EdgeStore:
+    """One row per physical edge; see module docstring."""
+    node_ids: np.ndarray      # int64 (N,)  OSM ids, sorted
+    node_x: np.ndarray        # float64 (N,)
+    node_y: np.ndarray        # float64 (N,)
+    edge_u: np.ndarray        # int32 (K,)
+    edge_v: np.ndarray        # int32 (K,)
+    edge_key: np.ndarray      # int32 (K,)
+    direction: np.ndarray     # uint8 (K,)  FORWARD | BACKWARD | SAME_ORIENTATION
+    lengths: np.ndarray       # float64 (K,)
+    has_geometry: np.ndarray  # bool (K,)
+    geometry: EdgeGeometry    # u -> v polylines
+    meta: Dict = field(default_factory=dict, compare=False)
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "EdgeStore":
+        """Deduplicate directed snapshot arrays (a dict or GraphArrays)."""
+        if isinstance(arrays, GraphArrays):
+            arrays = arrays.__dict__
+
+        indptr = np.asarray(arrays["indptr"])
+        targets = np.asarray(arrays["targets"]).astype(np.int64)
+        keys = np.asarray(arrays["edge_keys"])
+        lengths = np.asarray(arrays["lengths"])
+        has_geom = np.asarray(arrays["has_geometry"])
+        offsets = np.asarray(arrays["geom_offsets"])
+        coords = np.asarray(arrays["geom_coords"])
+
+        num_edges = len(targets)
+        sources = np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr))
+        sizes = np.diff(offsets)
+
+        lo = np.minimum(sources, targets)
+        hi = np.maximum(sources, targets)
+        is_fwd = sources < targets
+
+        # Candidate twins share (lo, hi, key, length, has_geometry, #coords);
+        # within a group forward edges sort before backward ones.
+        order = np.lexsort((~is_fwd, sizes, has_geom, lengths, keys, hi, lo))
+        a, b = order[:-1], order[1:]
+        cand = (
+            (lo[a] == lo[b]) & (hi[a] == hi[b]) & (keys[a] == keys[b])
+            & (lengths[a] == lengths[b]) & (has_geom[a] == has_geom[b])
+            & (sizes[a] == sizes[b]) & is_fwd[a] & ~is_fwd[b]
+        )
+        fa, fb = a[cand], b[cand]
+
+        # Geometry check: the backward edge is either the reversed or the
+        # identical polyline of the forward one.
+        ia, seg_sizes = slice_indices(offsets, fa)
+        ib_rev, _ = _reversed_slice_indices(offsets, fb)
+        ib_same, _ = slice_indices(offsets, fb)
+        seg = np.repeat(np.arange(len(fa)), seg_sizes)
+
+        def _all_equal(ib):
+            eq = np.all(coords[ia] == coords[ib], axis=1)
+            return np.bincount(seg, weights=~eq, minlength=len(fa)) == 0
+
+        reversed_ok = _all_equal(ib_rev)
+        same_ok = _all_equal(ib_same) & ~reversed_ok
+        paired = reversed_ok | same_ok
+        fa, fb, same_ok = fa[paired], fb[paired], same_ok[paired]
+
+        # Unpaired edges are kept as single-direction forward rows
+        single = np.ones(num_edges, dtype=bool)
+        single[fa] = False
+        single[fb] = False
+        single = np.flatnonzero(single)
+
+        rows = np.concatenate([fa, single])
+        direction = np.concatenate([
+            np.where(same_ok, FORWARD | BACKWARD | SAME_ORIENTATION, FORWARD | BACKWARD),
+            np.full(len(single), FORWARD),
+        ]).astype(np.uint8)
+        rows_order = np.argsort(rows, kind="stable")
+        rows, direction = rows[rows_order], direction[rows_order]
+
+        idx, row_sizes = slice_indices(offsets, rows)
+        geom_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(row_sizes, out=geom_offsets[1:])
+
+        return cls(
+            node_ids=np.asarray(arrays["node_ids"]),
+            node_x=np.asarray(arrays["node_x"]),
+            node_y=np.asarray(arrays["node_y"]),
+            edge_u=sources[rows].astype(np.int32),
+            edge_v=targets[rows].astype(np.int32),
+            edge_key=keys[rows].astype(np.int32),
+            direction=direction,
+            lengths=lengths[rows],
+            has_geometry=has_geom[rows],
+            geometry=EdgeGeometry(coords[idx], geom_offsets),
+        )
+
+    @classmethod
+    def from_graph(cls, G) -> "EdgeStore":
+        return cls.from_arrays(graph_to_arrays(G))
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path: str, **meta) -> str:
+        """
+        Write the store as one .npy file per array; extra keyword arguments
+        go to meta.json, which is written last.
+        """
+        os.makedirs(path, exist_ok=True)
+        arrays = dict(self.__dict__, geom_coords=self.geometry.coords,
+                      geom_offsets=self.geometry.offsets)
+        for name in STORE_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+
+        info = {"format": STORE_FORMAT, "version": STORE_VERSION,
+                "num_nodes": self.num_nodes, "num_edges": self.num_edges}
+        info.update(meta)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(info, f, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "EdgeStore":
+        """
+        Open a store written by save(), memory-mapped by default. Raises
+        FileNotFoundError if it is missing, ValueError if it is outdated.
+        """
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"Edge store not found at: {path}")
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta.get("format") != STORE_FORMAT or meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Edge store at {path} is outdated.")
+
+        a = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in STORE_ARRAYS
+        }
+        geometry = EdgeGeometry(a.pop("geom_coords"), a.pop("geom_offsets"))
+        return cls(geometry=geometry, meta=meta, **a)
+
+    # ------------------------------------------------------------------
+    # Accessors
+    # ------------------------------------------------------------------
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        """Physical edges (each stored once)."""
+        return len(self.edge_u)
+
+    @property
+    def num_directed_edges(self) -> int:
+        return int(
+            np.count_nonzero(self.direction & FORWARD)
+            + np.count_nonzero(self.direction & BACKWARD)
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            a.nbytes for a in (
+                self.node_ids, self.node_x, self.node_y, self.edge_u, self.edge_v,
+                self.edge_key, self.direction, self.lengths, self.has_geometry,
+                self.geometry.coords, self.geometry.offsets,
+            )
+        )
+
+    def osm_ids(self, node_indices):
+        """Map node indices back to OSM ids (for export)."""
+        return self.node_ids[np.asarray(node_indices)]
+
+    def node_index(self, osm_ids):
+        """Map OSM node id(s) to node indices. Raises KeyError for unknown ids."""
+        ids = np.asarray(osm_ids, dtype=np.int64)
+        idx = np.minimum(np.searchsorted(self.node_ids, ids), self.num_nodes - 1)
+        if np.any(self.node_ids[idx] != ids):
+            raise KeyError(f"Unknown node id(s): {osm_ids}")
+        return int(idx) if idx.ndim == 0 else idx
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """
+        Identity of the store (see snap_index.graph_fingerprint):
+        meta["fingerprint"] if the loader set one, else a content hash.
+        """
+        if "fingerprint" in self.meta:
+            return self.meta["fingerprint"]
+        h = hashlib.sha256()
+        for a in (self.node_ids, self.node_x, self.node_y, self.edge_u, self.edge_v,
+                  self.edge_key, self.direction, self.geometry.coords, self.geometry.offsets):
+            h.update(np.ascontiguousarray(a).tobytes())
+        return h.hexdigest()[:20]
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    @cached_property
+    def adjacency(self):
+        """
+        (indptr, targets, rows): CSR over node indices of every traversable
+        direction, pointing at the store row that carries it. int32 entries,
+        two per bidirectional row; no geometry is touched.
+        """
+        fwd = np.flatnonzero(self.direction & FORWARD)
+        bwd = np.flatnonzero(self.direction & BACKWARD)
+        src = np.concatenate([self.edge_u[fwd], self.edge_v[bwd]])
+        dst = np.concatenate([self.edge_v[fwd], self.edge_u[bwd]])
+        rows = np.concatenate([fwd, bwd])
+
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=self.num_nodes), out=indptr[1:])
+        return indptr, dst[order].astype(np.int32), rows[order].astype(np.int32)
+
+    def find_row(self, u_index: int, v_index: int) -> Optional[int]:
+        """Store row of the first u -> v direction, or None."""
+        indptr, targets, rows = self.adjacency
+        lo, hi = indptr[u_index], indptr[u_index + 1]
+        hits = np.flatnonzero(targets[lo:hi] == v_index)
+        if len(hits) == 0:
+            return None
+        return int(rows[lo + hits[0]])
+
+    def shortest_path(self, start_node: int, end_node: int) -> Optional[List[int]]:
+        """
+        Length-weighted shortest path between two OSM node ids, as in
+        GraphArrays.shortest_path. Returns OSM ids, or None if unreachable.
+        """
+        s = self.node_index(start_node)
+        t = self.node_index(end_node)
+        indptr, targets, rows = self.adjacency
+
+        dist, pred = csr_dijkstra(indptr, targets, self.lengths[rows], s, target=t)
+        if t not in dist:
+            return None
+
+        path = [t]
+        while path[-1] != s:
+            path.append(pred[path[-1]])
+        path.reverse()
+        return [int(self.node_ids[i]) for i in path]
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def to_arrays(self):
+        """Expand into directed snapshot arrays (one row per direction)."""
+        fwd = np.flatnonzero(self.direction & FORWARD)
+        bwd = np.flatnonzero(self.direction & BACKWARD)
+        bwd_same = (self.direction[bwd] & SAME_ORIENTATION) != 0
+
+        offsets, coords = self.geometry.offsets, self.geometry.coords
+        i_fwd, s_fwd = slice_indices(offsets, fwd)
+        i_rev, s_bwd = _reversed_slice_indices(offsets, bwd)
+        i_same, _ = slice_indices(offsets, bwd)
+        i_bwd = np.where(np.repeat(bwd_same, s_bwd), i_same, i_rev)
+
+        sizes = np.concatenate([s_fwd, s_bwd])
+        geom_offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=geom_offsets[1:])
+
+        edges = {
+            "src": self.node_ids[np.concatenate([self.edge_u[fwd], self.edge_v[bwd]])],
+            "dst": self.node_ids[np.concatenate([self.edge_v[fwd], self.edge_u[bwd]])],
+            "keys": np.concatenate([self.edge_key[fwd], self.edge_key[bwd]]).astype(np.int64),
+            "lengths": np.concatenate([self.lengths[fwd], self.lengths[bwd]]),
+            "has_geometry": np.concatenate([self.has_geometry[fwd], self.has_geometry[bwd]]),
+            "geom_offsets": geom_offsets,
+            "geom_coords": coords[np.concatenate([i_fwd, i_bwd])],
+        }
+        return arrays_from_edge_list(self.node_ids, self.node_x, self.node_y, edges)
+
+    def to_graph_arrays(self) -> GraphArrays:
+        """
+        Expanded GraphArrays. Its fingerprint differs from the store's: edge
+        positions of the two forms differ, so their indexes must not mix.
+        """
+        return GraphArrays(
+            meta={"fingerprint": arrays_fingerprint(self.fingerprint)}, **self.to_arrays()
+        )
+
+    def to_graph(self):
+        """Export as an osmnx-compatible networkx graph keyed by OSM ids."""
+        return arrays_to_graph(self.to_arrays())
+
@@ -0,0 +1,90 @@
+# src/core/geometry_sanitise.py
+
+"""
+Edge geometry sanitising, done once when a graph table is built.
+
+OSM / osmnx edges occasionally carry MultiLineStrings, GeometryCollections
+or LinearRings instead of a plain LineString. Snapshots (graph_to_arrays)
+and snap indexes store the sanitised LineString plus a validity mask, so
+snapping, matching and the UI pages never dispatch on geometry types.
+"""
+
+import numpy as np
+import shapely
+from shapely.geometry import (
+    LineString,
+    MultiLineString,
+    GeometryCollection,
+    LinearRing
+)
+from shapely.ops import linemerge
+
+
+def force_linestring(geom):
+    """
+    Convert arbitrary Shapely geometry to a LineString if possible.
+
+    Supported inputs:
+      - LineString             -> returned unchanged
+      - MultiLineString        -> merged or use longest segment
+      - GeometryCollection     -> longest contained LineString
+      - LinearRing             -> convert to LineString
+      - Unsupported            -> return None
+    """
+    if geom is None:
+        return None
+
+    # LinearRing subclasses LineString, so it is checked first
+    if isinstance(geom, LinearRing):
+        return LineString(list(geom.coords))
+
+    # Already valid
+    if isinstance(geom, LineString):
+        return geom
+
+    # MultiLineString → merge or pick longest
+    if isinstance(geom, MultiLineString):
+        merged = linemerge(geom)
+        if isinstance(merged, LineString):
+            return merged
+        if isinstance(merged, MultiLineString):
+            if len(merged.geoms) == 0:
+                return None
+            return max(merged.geoms, key=lambda g: g.length)
+        return None
+
+    # GeometryCollection → choose longest LineString
+    if isinstance(geom, GeometryCollection):
+        line_parts = [g for g in geom.geoms if isinstance(g, LineString)]
+        if not line_parts:
+            return None
+        return max(line_parts, key=lambda g: g.length)
+
+    # Unsupported: Polygon, Point, None
+    return None
+
+
+def usable_mask(lines):
+    """True where a sanitised geometry can be snapped to (present, length > 0)."""
+    lines = np.asarray(lines, dtype=object)
+    valid = ~shapely.is_missing(lines)
+    valid[valid] = shapely.length(lines[valid]) > 0
+    return valid
+
+
+def sanitise_geometries(geoms):
+    """
+    Sanitise an array of geometries (None allowed) in one pass.
+    Returns (lines, valid): LineStrings or None, and usable_mask(lines).
+    Plain LineStrings are passed through without a Python-level call.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    lines = geoms.copy()
+
+    other = np.flatnonzero(
+        ~shapely.is_missing(geoms) & (shapely.get_type_id(geoms) != shapely.GeometryType.LINESTRING)
+    )
+    for i in other.tolist():
+        lines[i] = force_linestring(geoms[i])
+
+    return lines, usable_mask(lines)
@@ -0,0 +1,190 @@
+# src/core/graph_arrays.py
+
+"""
+Read-only array view of a walk graph, backed by a graph snapshot.
+
+GraphArrays holds the snapshot arrays (see graph_snapshot.py) directly. When
+loaded with mmap=True every array is a read-only memory map, so any number of
+processes opening the same snapshot share one physical copy through the OS
+page cache. Nothing here builds a networkx graph or a GeoDataFrame.
+"""
+
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from shapely.geometry import LineString
+
+from src.core.edge_geometry import EdgeGeometry
+from src.core.graph_snapshot import (
+    arrays_to_graph,
+    graph_to_arrays,
+    load_snapshot_arrays,
+)
+
+
+def csr_dijkstra(
+    indptr,
+    targets,
+    weights,
+    source: int,
+    target: Optional[int] = None,
+    cutoff: Optional[float] = None,
+) -> Tuple[Dict[int, float], Dict[int, int]]:
+    """
+    Dijkstra over a CSR adjacency. Stops early once target is settled or
+    every remaining node is farther than cutoff.
+    Returns (dist, pred) dicts keyed by node index.
+    """
+    dist = {source: 0.0}
+    pred: Dict[int, int] = {}
+    done = set()
+    heap = [(0.0, source)]
+
+    while heap:
+        d, n = heapq.heappop(heap)
+        if n in done:
+            continue
+        done.add(n)
+        if n == target:
+            break
+
+        for e in range(indptr[n], indptr[n + 1]):
+            m = int(targets[e])
+            nd = d + float(weights[e])
+            if cutoff is not None and nd > cutoff:
+                continue
+            if nd < dist.get(m, float("inf")):
+                dist[m] = nd
+                pred[m] = n
+                heapq.heappush(heap, (nd, m))
+
+    return dist, pred
+
+
+@dataclass(frozen=True)
+class GraphArrays:
+    """
+    Contiguous, integer-indexed walk graph.
+
+    Nodes are addressed by index into node_ids (sorted OSM ids); edges by
+    position in the CSR arrays. See graph_snapshot.py for the layout.
+    """
+    node_ids: np.ndarray
+    node_x: np.ndarray
+    node_y: np.ndarray
+    indptr: np.ndarray
+    targets: np.ndarray
+    edge_keys: np.ndarray
+    lengths: np.ndarray
+    has_geometry: np.ndarray
+    geom_offsets: np.ndarray
+    geom_coords: np.ndarray
+    meta: Dict = field(default_factory=dict, compare=False)
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "GraphArrays":
+        """Open a snapshot directory, memory-mapped by default."""
+        arrays, meta = load_snapshot_arrays(path, mmap_mode="r" if mmap else None)
+        return cls(meta=meta, **arrays)
+
+    @classmethod
+    def from_graph(cls, G) -> "GraphArrays":
+        """Flatten an in-memory networkx graph (no memory mapping)."""
+        return cls(**graph_to_arrays(G))
+
+    def to_graph(self):
+        """Materialise an osmnx-compatible networkx MultiDiGraph."""
+        return arrays_to_graph(self.__dict__, crs=self.meta.get("crs", "epsg:4326"))
+
+    # ------------------------------------------------------------------
+    # Basic accessors
+    # ------------------------------------------------------------------
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.targets)
+
+    @cached_property
+    def sources(self) -> np.ndarray:
+        """Source node index of every edge."""
+        return np.repeat(
+            np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr)
+        )
+
+    def node_index(self, osm_ids):
+        """
+        Map OSM node id(s) to node indices. Raises KeyError for unknown ids.
+        """
+        ids = np.asarray(osm_ids, dtype=np.int64)
+        idx = np.searchsorted(self.node_ids, ids)
+        idx_clipped = np.minimum(idx, self.num_nodes - 1)
+        if np.any(self.node_ids[idx_clipped] != ids):
+            raise KeyError(f"Unknown node id(s): {osm_ids}")
+        return int(idx_clipped) if idx_clipped.ndim == 0 else idx_clipped
+
+    def node_latlon(self, index: int) -> Tuple[float, float]:
+        return float(self.node_y[index]), float(self.node_x[index])
+
+    def find_edge(self, u_index: int, v_index: int) -> Optional[int]:
+        """Index of the first u -> v edge, or None."""
+        lo, hi = self.indptr[u_index], self.indptr[u_index + 1]
+        hits = np.flatnonzero(self.targets[lo:hi] == v_index)
+        if len(hits) == 0:
+            return None
+        return int(lo + hits[0])
+
+    # ------------------------------------------------------------------
+    # Geometry
+    # ------------------------------------------------------------------
+
+    @cached_property
+    def geometry(self) -> EdgeGeometry:
+        """Flat edge-geometry table over geom_coords / geom_offsets (no copy)."""
+        return EdgeGeometry.from_arrays(self)
+
+    def edge_coords(self, edge: int) -> np.ndarray:
+        """(k, 2) lon/lat coordinates of one edge (a view, no copy)."""
+        return self.geometry.coords_of(edge)
+
+    def edge_geometry(self, edge: int) -> LineString:
+        return self.geometry.geometry(edge)
+
+    def edge_geometries(self, edges=None) -> np.ndarray:
+        """Shapely LineStrings for the given edges (all edges by default)."""
+        return self.geometry.geometries(edges)
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def shortest_path(self, start_node: int, end_node: int) -> Optional[List[int]]:
+        """
+        Length-weighted shortest path between two OSM node ids.
+        Returns a list of OSM node ids, or None if unreachable.
+        """
+        s = self.node_index(start_node)
+        t = self.node_index(end_node)
+
+        dist, pred = csr_dijkstra(self.indptr, self.targets, self.lengths, s, target=t)
+        if t not in dist:
+            return None
+
+        path = [t]
+        while path[-1] != s:
+            path.append(pred[path[-1]])
+        path.reverse()
+
+        return [int(self.node_ids[i]) for i in path]
@@ -1,7 +1,22 @@
+import hashlib
+import json
 import os
 import osmnx as ox
 import numpy as np
-from src.core.graph_repair import repair_graph
+from src.core.edge_store import EdgeStore
+from src.core.graph_arrays import GraphArrays
+from src.core.graph_patch import apply_patches, apply_patches_arrays, read_patches, repaired_patches
+from src.core.graph_repair import DETOUR_FACTOR, REPAIR_VERSION, repair_graph
+from src.core.graph_tiles import build_tiles, load_tiles_for_track, read_tiles_index
+from src.core.graph_snapshot import (
+    SNAPSHOT_VERSION,
+    convert_graphml,
+    graph_to_arrays,
+    load_snapshot,
+    read_snapshot_meta,
+    save_snapshot,
+    snapshot_is_current,
+)
 
 # Compute absolute project root
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
@@ -11,6 +26,98 @@ MASTER_GRAPH_PATH = os.path.join(
     "data/osm_cache/amsterdam_east_master_dense_repaired.graphml"
 )
 
+# Binary snapshot converted from MASTER_GRAPH_PATH (see graph_snapshot.py)
+MASTER_SNAPSHOT_PATH = os.path.join(
+    PROJECT_ROOT,
+    "data/osm_cache/amsterdam_east_master_dense_repaired.snapshot"
+)
+
+# Content-addressed cache of repaired graphs (see repaired_cache_key)
+REPAIRED_CACHE_DIR = os.path.join(PROJECT_ROOT, "data/osm_cache/repaired")
+
+# Recorded source hashes (see source_sha256), keyed by absolute path
+SOURCE_HASHES_PATH = os.path.join(REPAIRED_CACHE_DIR, "source_hashes.json")
+
+_SOURCE_HASHES = {}
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_source_hashes():
+    try:
+        with open(SOURCE_HASHES_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def source_sha256(path):
+    """
+    file_sha256 of path, memoised by (size, mtime) in memory and in
+    SOURCE_HASHES_PATH, so an unchanged file is hashed once, not per load.
+    If path no longer exists the last recorded hash is returned (None if
+    it was never hashed), so cached entries stay usable without it.
+    """
+    path = os.path.abspath(path)
+    entry = _SOURCE_HASHES.get(path)
+    if entry is None:
+        entry = _read_source_hashes().get(path)
+
+    if not os.path.exists(path):
+        return entry["sha256"] if entry else None
+
+    stat = os.stat(path)
+    if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+        _SOURCE_HASHES[path] = entry
+        return entry["sha256"]
+
+    entry = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": file_sha256(path)}
+    _SOURCE_HASHES[path] = entry
+
+    hashes = _read_source_hashes()
+    hashes[path] = entry
+    os.makedirs(os.path.dirname(SOURCE_HASHES_PATH), exist_ok=True)
+    tmp = SOURCE_HASHES_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(hashes, f, indent=2)
+    os.replace(tmp, SOURCE_HASHES_PATH)
+    return entry["sha256"]
+
+
+def repaired_cache_key(input_hash, max_gap_m, detour_factor=DETOUR_FACTOR):
+    """
+    Cache key for a repaired graph: changes whenever the input file, the
+    repair parameters or the repair code version change.
+    """
+    raw = (
+        f"{input_hash}:max_gap_m={float(max_gap_m)}:detour_factor={float(detour_factor)}"
+        f":repair_v{REPAIR_VERSION}"
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()[:20]
+
+
+def _load_master_from_snapshot():
+    """
+    Load the master graph from its binary snapshot, converting the GraphML
+    first if the snapshot is missing or older than the GraphML.
+    """
+    if not snapshot_is_current(MASTER_SNAPSHOT_PATH, MASTER_GRAPH_PATH):
+        if not os.path.exists(MASTER_GRAPH_PATH):
+            raise FileNotFoundError(
+                f"Master graph not found at: {MASTER_GRAPH_PATH}"
+            )
+        print("DEBUG: Converting graphml to snapshot…")
+        convert_graphml(MASTER_GRAPH_PATH, MASTER_SNAPSHOT_PATH)
+
+    return load_snapshot(MASTER_SNAPSHOT_PATH)
+
 
 def load_master_graph():
     """
@@ -22,19 +129,72 @@ def load_master_graph():
     print(f"DEBUG: MASTER_GRAPH_PATH = {MASTER_GRAPH_PATH}")
     print(f"DEBUG: Path exists?      = {os.path.exists(MASTER_GRAPH_PATH)}")
 
-    if not os.path.exists(MASTER_GRAPH_PATH):
-        raise FileNotFoundError(
-            f"Master graph not found at: {MASTER_GRAPH_PATH}"
-        )
-
-    print("DEBUG: Loading graphml…")
-    G = ox.load_graphml(MASTER_GRAPH_PATH)
+    print("DEBUG: Loading snapshot…")
+    G = _load_master_from_snapshot()
     print("DEBUG: Graph loaded successfully.")
 
     # Note: NO repair here
     return G
 
 
+def master_tiles_dir(max_gap_m=30, rebuild=False):
+    """
+    Tile directory for the repaired master graph, built next to the cached
+    repaired snapshot the first time it is needed.
+    """
+    snapshot_path = repaired_master_snapshot(max_gap_m, rebuild)
+    tiles_dir = snapshot_path[:-len(".snapshot")] + ".tiles"
+
+    try:
+        if rebuild:
+            raise FileNotFoundError(tiles_dir)
+        if read_tiles_index(tiles_dir).get("snapshot_version") != SNAPSHOT_VERSION:
+            raise FileNotFoundError(tiles_dir)
+    except FileNotFoundError:
+        print("DEBUG: Building graph tiles…")
+        build_tiles(GraphArrays.load(snapshot_path), tiles_dir, source=snapshot_path)
+
+    return tiles_dir
+
+
+def load_graph_around(latlng, margin_deg=0.002, max_gap_m=30, as_arrays=False):
+    """
+    Load only the master-graph tiles covering a run (list of (lat, lon))
+    plus margin_deg, so load time scales with the run instead of the region.
+    Tiles hold geometry and lengths only: unlike load_graph, the graph has
+    no OSM attributes (highway, name, ...). Patches are repaired around
+    within the loaded tiles (see graph_patch.repaired_patches).
+    """
+    G = load_tiles_for_track(
+        master_tiles_dir(max_gap_m), latlng, margin_deg=margin_deg, as_arrays=as_arrays
+    )
+    patches = read_patches()
+    if not patches:
+        return G
+    patches = repaired_patches(
+        G if as_arrays else graph_to_arrays(G), patches, max_gap_m=max_gap_m
+    )
+    if as_arrays:
+        return GraphArrays(meta=G.meta, **apply_patches_arrays(G, patches))
+    return apply_patches(G, patches)
+
+
+def region_build_dir(region_name):
+    """Output directory of src/core/build_graph.py for a region."""
+    return os.path.join(PROJECT_ROOT, "data/osm_cache", region_name)
+
+
+def load_region_graph(region_name, as_arrays=False):
+    """
+    Load the repaired graph produced by the offline build pipeline
+    (python -m src.core.build_graph <region>).
+    """
+    path = os.path.join(region_build_dir(region_name), "repaired.snapshot")
+    if as_arrays:
+        return GraphArrays.load(path)
+    return load_snapshot(path)
+
+
 def load_graph_legacy(latitudes, longitudes, dist_m=1500):
     ox.settings.use_cache = True
     ox.settings.cache_folder = os.path.join(PROJECT_ROOT, "data/osm_cache")
@@ -50,18 +210,157 @@ def load_graph_legacy(latitudes, longitudes, dist_m=1500):
     )
 
 
-def load_graph(use_master=True):
+def repaired_master_snapshot(max_gap_m=30, rebuild=False, detour_factor=DETOUR_FACTOR):
+    """
+    Return the path of the repaired master graph in the content-addressed
+    cache, running repair_graph and writing the entry on a miss.
+    Pass rebuild=True to ignore an existing entry and repair again.
+    The GraphML is only hashed when it changed (see source_sha256).
+    """
+    input_hash = source_sha256(MASTER_GRAPH_PATH)
+    if input_hash is None:
+        raise FileNotFoundError(
+            f"Master graph not found at: {MASTER_GRAPH_PATH}"
+        )
+
+    key = repaired_cache_key(input_hash, max_gap_m, detour_factor)
+    cache_path = os.path.join(REPAIRED_CACHE_DIR, f"{key}.snapshot")
+
+    if not rebuild:
+        try:
+            read_snapshot_meta(cache_path)
+            print(f"DEBUG: Repaired graph cache hit ({key}).")
+            return cache_path
+        except (FileNotFoundError, ValueError):
+            pass
+
+    reason = "forced rebuild" if rebuild else "miss"
+    print(f"DEBUG: Repaired graph cache {reason} ({key}), repairing…")
+
+    G = _load_master_from_snapshot()
+    G = repair_graph(G, max_gap_m=max_gap_m, detour_factor=detour_factor)
+    save_snapshot(
+        G,
+        cache_path,
+        source=MASTER_GRAPH_PATH,
+        source_sha256=input_hash,
+        max_gap_m=float(max_gap_m),
+        detour_factor=float(detour_factor),
+        repair_version=REPAIR_VERSION,
+    )
+    print("DEBUG: Graph repaired successfully.")
+
+    return cache_path
+
+
+def _read_repaired_patches(arrays, max_gap_m, detour_factor=DETOUR_FACTOR):
+    """
+    (records, patches): the patch file, and the records to apply, i.e. plus
+    the connectors gap repair adds around its edits on arrays (see
+    graph_patch.repaired_patches). Both empty without a patch file.
+    """
+    records = read_patches()
+    if not records:
+        return [], []
+    return records, repaired_patches(
+        arrays, records, max_gap_m=max_gap_m, detour_factor=detour_factor
+    )
+
+
+def _stamp_version(meta, snapshot_path, records, form):
+    """
+    Store the graph version in meta, and under "derived_from" the versions
+    of every earlier state of the append-only patch file (newest first), so
+    indexes of those are patched instead of rebuilt (see snap_index.py).
+    """
+    meta["fingerprint"] = graph_version(snapshot_path, records, form)
+    meta["derived_from"] = [
+        graph_version(snapshot_path, records[:i], form) for i in range(len(records) - 1, -1, -1)
+    ]
+
+
+def graph_version(snapshot_path, patches, form):
+    """
+    Fingerprint of a loaded graph (see snap_index.graph_fingerprint): the
+    cache entry, the patch file records and the in-memory form ("nx" /
+    "arrays" / "store", whose edge orders differ). The repairs around the
+    patches follow from those.
+    """
+    raw = json.dumps([os.path.basename(snapshot_path), patches, form], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()[:20]
+
+
+def load_repaired_master_graph(max_gap_m=30, rebuild=False, detour_factor=DETOUR_FACTOR):
+    """
+    Load the repaired master graph (see repaired_master_snapshot) as networkx,
+    with the manual-repair patch file (see graph_patch.py) and the gap
+    repairs around its edits applied on top.
+    """
+    path = repaired_master_snapshot(max_gap_m, rebuild, detour_factor)
+    records, patches = _read_repaired_patches(GraphArrays.load(path), max_gap_m, detour_factor)
+    G = apply_patches(load_snapshot(path), patches)
+    _stamp_version(G.graph, path, records, "nx")
+    return G
+
+
+def load_graph_arrays(max_gap_m=30, rebuild=False, mmap=True, detour_factor=DETOUR_FACTOR):
+    """
+    Load the repaired master graph as a read-only GraphArrays. With mmap=True
+    the arrays are memory-mapped, so every process shares one physical copy.
+    If the patch file has entries, the patched arrays are an in-memory copy.
+    """
+    path = repaired_master_snapshot(max_gap_m, rebuild, detour_factor)
+    ga = GraphArrays.load(path, mmap=mmap)
+    records, patches = _read_repaired_patches(ga, max_gap_m, detour_factor)
+    if patches:
+        ga = GraphArrays(meta=dict(ga.meta), **apply_patches_arrays(ga, patches))
+    _stamp_version(ga.meta, path, records, "arrays")
+    return ga
+
+
+def load_edge_store(max_gap_m=30, rebuild=False, mmap=True, detour_factor=DETOUR_FACTOR):
+    """
+    Load the repaired master graph as an EdgeStore (one row per physical
+    edge, about half the edge memory of load_graph_arrays). The store is
+    built once next to the cached repaired snapshot and memory-mapped from
+    there. If the patch file has entries, the patched store is an in-memory
+    copy.
+    """
+    path = repaired_master_snapshot(max_gap_m, rebuild, detour_factor)
+    ga = GraphArrays.load(path, mmap=mmap)
+    records, patches = _read_repaired_patches(ga, max_gap_m, detour_factor)
+    if patches:
+        store = EdgeStore.from_arrays(apply_patches_arrays(ga, patches))
+    else:
+        store_path = path[:-len(".snapshot")] + ".edges"
+        try:
+            if rebuild:
+                raise FileNotFoundError(store_path)
+            store = EdgeStore.load(store_path, mmap=mmap)
+        except (FileNotFoundError, ValueError):
+            print("DEBUG: Building edge store…")
+            EdgeStore.from_arrays(ga).save(store_path, source=path)
+            store = EdgeStore.load(store_path, mmap=mmap)
+
+    _stamp_version(store.meta, path, records, "store")
+    return store
+
+
+def load_graph(use_master=True, max_gap_m=30, rebuild=False, detour_factor=DETOUR_FACTOR):
     """
     Main entry point for loading a graph.
-    Repairs missing connectors automatically.
+    Repairs missing connectors automatically. For the master graph the
+    repaired result is cached on disk; rebuild=True forces a fresh repair.
     """
     if use_master:
-        G = ox.load_graphml(MASTER_GRAPH_PATH)
-    else:
-        G = ox.graph_from_place("Amsterdam, NL", network_type="walk")
+        return load_repaired_master_graph(
+            max_gap_m=max_gap_m, rebuild=rebuild, detour_factor=detour_factor
+        )
+
+    G = ox.graph_from_place("Amsterdam, NL", network_type="walk")
 
     # Single place where repair happens
-    G = repair_graph(G, max_gap_m=30)
+    G = repair_graph(G, max_gap_m=max_gap_m, detour_factor=detour_factor)
     print("DEBUG: Graph repaired successfully.")
 
     return G
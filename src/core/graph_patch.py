@@ -0,0 +1,273 @@
+# src/core/graph_patch.py
+
+"""
+Append-only patch file for manual graph repairs.
+
+Instead of re-saving the whole master GraphML to add one connector, repair
+tools append one JSON line per change to PATCH_PATH:
+
+    {"op": "add", "u": 123, "v": 456, "source": "repair_one_gap", "ts": "..."}
+    {"op": "remove", "u": 123, "v": 456, "source": "debug_osm_graph_repair", ...}
+
+graph_loader applies the patch file on top of the (cached) base graph at load
+time, together with the connectors gap repair adds around the patched pairs
+(repaired_patches), so an edit is repaired like repair_graph would without
+repairing the whole graph again. Interactive pages keep a per-session GraphDelta over one shared,
+read-only base graph and only write to the patch file on commit.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+from shapely.geometry import LineString
+
+from src.core.graph_repair import DETOUR_FACTOR
+from src.core.graph_snapshot import (
+    ARRAY_NAMES,
+    arrays_from_edge_list,
+    concat_edge_lists,
+    edge_list,
+)
+from src.core.incremental_repair import repair_around
+from src.core.preprocessing import haversine_m
+from src.core.snap_index import drop_fingerprint
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+
+PATCH_PATH = os.path.join(PROJECT_ROOT, "data/osm_cache/graph_patches.jsonl")
+
+
+# -------------------------------------------------------------------
+# Patch file
+# -------------------------------------------------------------------
+
+def append_patch(op, u, v, source, path=PATCH_PATH, **extra):
+    """Append one add/remove record to the patch file."""
+    if op not in ("add", "remove"):
+        raise ValueError(f"Unknown patch op: {op}")
+
+    record = {
+        "op": op,
+        "u": int(u),
+        "v": int(v),
+        "source": source,
+        "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    record.update(extra)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    return record
+
+
+def read_patches(path=PATCH_PATH):
+    """All patch records in file order (empty if there is no patch file)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def net_patches(patches):
+    """
+    Collapse records into the final state per undirected pair:
+    {(min(u, v), max(u, v)): "add" | "remove"}, in first-seen order.
+    """
+    state = {}
+    for p in patches:
+        pair = (min(p["u"], p["v"]), max(p["u"], p["v"]))
+        state[pair] = p["op"]
+    return state
+
+
+# -------------------------------------------------------------------
+# Applying patches
+# -------------------------------------------------------------------
+
+def straight_edge_attrs(x_u, y_u, x_v, y_v):
+    """Geometry and length of a straight connector between two nodes."""
+    return {
+        "geometry": LineString([(x_u, y_u), (x_v, y_v)]),
+        "length": haversine_m(y_u, x_u, y_v, x_v),
+    }
+
+
+def apply_patches(G, patches):
+    """
+    Apply patch records to a networkx graph in place. Added connectors are
+    straight and bidirectional, like add_edge_between_nodes. Returns G.
+    """
+    if patches:
+        # The graph changes, so any stored version fingerprint is stale
+        drop_fingerprint(G)
+
+    for (u, v), op in net_patches(patches).items():
+        if u not in G.nodes or v not in G.nodes:
+            continue
+
+        if op == "add":
+            if G.has_edge(u, v) or G.has_edge(v, u):
+                continue
+            attrs = straight_edge_attrs(
+                G.nodes[u]["x"], G.nodes[u]["y"], G.nodes[v]["x"], G.nodes[v]["y"]
+            )
+            G.add_edge(u, v, **attrs)
+            G.add_edge(v, u, **attrs)
+        else:
+            for a, b in ((u, v), (v, u)):
+                if G.has_edge(a, b):
+                    G.remove_edges_from([(a, b, k) for k in list(G[a][b])])
+
+    return G
+
+
+def apply_patches_arrays(arrays, patches):
+    """
+    Apply patch records to snapshot arrays (a dict or GraphArrays) and return
+    new, in-memory arrays. The input (possibly memory-mapped) is untouched.
+    """
+    if not isinstance(arrays, dict):
+        arrays = arrays.__dict__
+
+    state = net_patches(patches)
+    if not state:
+        return {name: arrays[name] for name in ARRAY_NAMES}
+
+    node_ids = np.asarray(arrays["node_ids"])
+    node_x = np.asarray(arrays["node_x"])
+    node_y = np.asarray(arrays["node_y"])
+    base = edge_list(arrays)
+
+    lo = np.minimum(base["src"], base["dst"])
+    hi = np.maximum(base["src"], base["dst"])
+    existing = set(zip(lo.tolist(), hi.tolist()))
+
+    removed = {pair for pair, op in state.items() if op == "remove"}
+    keep = np.array(
+        [pair not in removed for pair in zip(lo.tolist(), hi.tolist())], dtype=bool
+    )
+    base_kept = edge_list(arrays, np.flatnonzero(keep))
+
+    added = [
+        pair for pair, op in state.items()
+        if op == "add" and pair not in existing and np.isin(pair, node_ids).all()
+    ]
+    parts = [base_kept]
+    if added:
+        src, dst, coords, lengths = [], [], [], []
+        for u, v in added:
+            iu, iv = np.searchsorted(node_ids, [u, v])
+            attrs = straight_edge_attrs(node_x[iu], node_y[iu], node_x[iv], node_y[iv])
+            line = np.asarray(attrs["geometry"].coords)
+            for a, b in ((u, v), (v, u)):
+                src.append(a)
+                dst.append(b)
+                coords.append(line)
+                lengths.append(attrs["length"])
+        parts.append({
+            "src": np.array(src, dtype=np.int64),
+            "dst": np.array(dst, dtype=np.int64),
+            "keys": np.zeros(len(src), dtype=np.int64),
+            "lengths": np.array(lengths),
+            "has_geometry": np.ones(len(src), dtype=bool),
+            "geom_offsets": np.arange(0, 2 * len(src) + 1, 2, dtype=np.int64),
+            "geom_coords": np.concatenate(coords),
+        })
+
+    return arrays_from_edge_list(node_ids, node_x, node_y, concat_edge_lists(parts))
+
+
+def repaired_patches(arrays, patches, max_gap_m=30, detour_factor=DETOUR_FACTOR):
+    """
+    patches plus an "add" record for every connector gap repair finds within
+    max_gap_m of a patched pair, on arrays (the unpatched graph) with the
+    patches applied. Pairs removed by a patch are never reconnected. Only
+    the neighbourhood of the patches is searched (see repair_around).
+    """
+    state = net_patches(patches)
+    if not state:
+        return list(patches)
+
+    patched = apply_patches_arrays(arrays, patches)
+    removed = [pair for pair, op in state.items() if op == "remove"]
+    added = repair_around(
+        patched, [n for pair in state for n in pair], max_gap_m=max_gap_m,
+        detour_factor=detour_factor, blocked=removed,
+    )
+    return list(patches) + [
+        {"op": "add", "u": int(u), "v": int(v), "source": "repair_around"} for u, v in added
+    ]
+
+
+# -------------------------------------------------------------------
+# Per-session copy-on-write delta
+# -------------------------------------------------------------------
+
+class GraphDelta:
+    """
+    Uncommitted edits on top of a shared base graph that is never mutated.
+    Only the added/removed pairs are held per session.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.added = {}       # (u, v) -> attrs, u < v
+        self.removed = set()  # (u, v), u < v
+
+    @staticmethod
+    def _pair(u, v):
+        return (min(u, v), max(u, v))
+
+    def has_edge(self, u, v):
+        pair = self._pair(u, v)
+        if pair in self.added:
+            return True
+        if pair in self.removed:
+            return False
+        return self.base.has_edge(u, v) or self.base.has_edge(v, u)
+
+    def add_edge(self, u, v):
+        pair = self._pair(u, v)
+        self.removed.discard(pair)
+        if self.base.has_edge(u, v) or self.base.has_edge(v, u):
+            return
+        nu, nv = self.base.nodes[pair[0]], self.base.nodes[pair[1]]
+        self.added[pair] = straight_edge_attrs(nu["x"], nu["y"], nv["x"], nv["y"])
+
+    def remove_edge(self, u, v):
+        pair = self._pair(u, v)
+        if self.added.pop(pair, None) is None:
+            self.removed.add(pair)
+
+    def __len__(self):
+        return len(self.added) + len(self.removed)
+
+    def added_paths(self):
+        """[[lon, lat], ...] paths of added connectors, for a pydeck layer."""
+        return [
+            [list(c) for c in attrs["geometry"].coords] for attrs in self.added.values()
+        ]
+
+    def records(self):
+        return (
+            [{"op": "add", "u": u, "v": v} for u, v in self.added]
+            + [{"op": "remove", "u": u, "v": v} for u, v in self.removed]
+        )
+
+    def materialize(self):
+        """A private copy of the base graph with this delta applied."""
+        G = self.base.copy()
+        drop_fingerprint(G)
+        return apply_patches(G, self.records())
+
+    def commit(self, source, path=PATCH_PATH):
+        """Append every pending edit to the patch file and clear the delta."""
+        written = [
+            append_patch(r["op"], r["u"], r["v"], source, path=path) for r in self.records()
+        ]
+        self.added.clear()
+        self.removed.clear()
+        return written
@@ -1,29 +1,360 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import numpy as np
+import shapely
 from shapely.geometry import LineString
 from shapely.strtree import STRtree
 from pyproj import Transformer
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
 from scipy.spatial import KDTree
 import osmnx as ox
-from src.core.preprocessing import haversine_m
+from src.core.edge_geometry import EdgeGeometry, cells_overlapped
+from src.core.graph_snapshot import graph_to_arrays, slice_indices
+from src.core.preprocessing import haversine_m, haversine_m_np
+from src.core.snap_index import drop_fingerprint
 
+# Bump whenever repair_graph's output changes, so cached repaired graphs
+# (see graph_loader.load_graph) are rebuilt.
+REPAIR_VERSION = 2
 
-def repair_graph(G, max_gap_m=30):
 
-    gdf_nodes, gdf_edges = ox.convert.graph_to_gdfs(G, nodes=True, edges=True)
+# Side length of the spatial cells repair_graph partitions nodes into
+CELL_SIZE_M = 2000.0
 
-    # Filter strictly valid geometries
-    valid_geoms = []
-    for g in gdf_edges.geometry:
-        if g is None:
-            continue
-        if not hasattr(g, "geom_type"):
-            continue
-        if g.is_empty:
-            continue
-        valid_geoms.append(g)
+# Pruning: a pair of nodes is only a gap if one end is a dead end (degree
+# <= DEAD_END_DEGREE), the ends are in different components, or the network
+# path between them is longer than DETOUR_FACTOR x their straight distance
+# (the default of repair_graph's detour_factor)
+DEAD_END_DEGREE = 1
+DETOUR_FACTOR = 3.0
+
+# Sources per bounded Dijkstra batch (bounds the (batch, nodes) matrix)
+DIJKSTRA_BATCH = 256
+
+
+# -------------------------------------------------------------------
+# Per-cell candidate search (runs in worker processes)
+# -------------------------------------------------------------------
+
+def _network_distances(task, li, lj, cutoff):
+    """
+    Length-weighted network distance li -> lj (local indices) over the
+    task's edges, searching at most max(cutoff) from each source. Pairs
+    farther than that come back as inf.
+    """
+    dist = np.full(len(li), np.inf)
+    if len(li) == 0:
+        return dist
+
+    # Shortest of any parallel edges (csr_matrix would sum duplicates)
+    n = len(task["nodes"])
+    e_src, e_dst, e_len = task["edge_src"], task["edge_dst"], task["edge_len"]
+    order = np.lexsort((e_len, e_dst, e_src))
+    code = e_src[order] * n + e_dst[order]
+    first = order[np.concatenate([[True], code[1:] != code[:-1]])] if len(order) else order
+    adj = csr_matrix((e_len[first], (e_src[first], e_dst[first])), shape=(n, n))
+    sources, inverse = np.unique(li, return_inverse=True)
+
+    for lo in range(0, len(sources), DIJKSTRA_BATCH):
+        batch = sources[lo:lo + DIJKSTRA_BATCH]
+        in_batch = (inverse >= lo) & (inverse < lo + len(batch))
+        limit = float(cutoff[in_batch].max())
+        d = dijkstra(adj, directed=True, indices=batch, limit=limit)
+        dist[in_batch] = d[inverse[in_batch] - lo, lj[in_batch]]
+
+    return dist
+
+
+def _cell_repairs(task):
+    """
+    Connectors owned by one cell. task holds only the nodes around the cell
+    (core, max_gap_m halo and the detour search area), the edges among them
+    and the edge geometries near the cell, so a worker's memory is bounded by
+    the cell, not the graph.
+
+    A pair is owned by the cell of its lower-index node, so every pair is
+    found by exactly one cell. Returns ((k, 2) global node indices, counts).
+    """
+    nodes = task["nodes"]
+    pair_nodes = np.flatnonzero(task["in_halo"])
+    kd = KDTree(task["coords_m"][pair_nodes])
+    local = kd.query_pairs(r=task["max_gap_m"], output_type="ndarray")
+    gi = nodes[pair_nodes[local[:, 0]]]
+    gj = nodes[pair_nodes[local[:, 1]]]
+    i, j = np.minimum(gi, gj), np.maximum(gi, gj)
+
+    owned = task["owner"][np.searchsorted(nodes, i)]
+    i, j = i[owned], j[owned]
+    counts = {"close": len(i)}
+
+    # Drop pairs that already share an edge in either direction
+    keep = ~np.isin(i * task["num_nodes"] + j, task["linked"])
+    i, j = i[keep], j[keep]
+    counts["unlinked"] = len(i)
+
+    li, lj = np.searchsorted(nodes, i), np.searchsorted(nodes, j)
+    xs, ys = task["xs"], task["ys"]
+
+    # Keep only actual gaps: dead ends, separate components, long detours
+    if task["prune"]:
+        degree, component = task["degree"], task["component"]
+        gap = (
+            (degree[li] <= task["dead_end_degree"])
+            | (degree[lj] <= task["dead_end_degree"])
+            | (component[li] != component[lj])
+        )
+        rest = np.flatnonzero(~gap)
+        cutoff = task["detour_factor"] * haversine_m_np(
+            ys[li[rest]], xs[li[rest]], ys[lj[rest]], xs[lj[rest]]
+        )
+        gap[rest] = _network_distances(task, li[rest], lj[rest], cutoff) > cutoff
+
+        i, j, li, lj = i[gap], j[gap], li[gap], lj[gap]
+    counts["gaps"] = len(i)
+
+    # Drop connectors that cross an existing edge
+    seg = np.empty((len(i), 2, 2), dtype=np.float64)
+    seg[:, 0, 0], seg[:, 0, 1] = xs[li], ys[li]
+    seg[:, 1, 0], seg[:, 1, 1] = xs[lj], ys[lj]
+    cands = shapely.linestrings(seg) if len(i) else np.empty(0, dtype=object)
+
+    edges = EdgeGeometry(task["edge_coords"], task["edge_offsets"])
+    hit_cand, _ = STRtree(edges.geometries()).query(cands, predicate="intersects")
+    free = np.ones(len(i), dtype=bool)
+    free[hit_cand] = False
+    counts["added"] = int(free.sum())
+
+    return np.column_stack([i[free], j[free]]), counts
+
+
+def _cell_code(cx, cy):
+    return cx * (1 << 32) + cy
+
+
+def _grouped(codes):
+    """Sort order of codes plus the sorted codes, for _gather."""
+    order = np.argsort(codes, kind="stable")
+    return codes[order], order
+
+
+def _gather(grouped, wanted):
+    """Items whose code is in wanted, given _grouped(codes)."""
+    codes, order = grouped
+    lo = np.searchsorted(codes, wanted, side="left")
+    hi = np.searchsorted(codes, wanted, side="right")
+    parts = [order[a:b] for a, b in zip(lo, hi) if b > a]
+    return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+
+def _cell_tasks(arrays, to_graph, xs, ys, coords_m, max_gap_m, cell_size_m, prune,
+                detour_factor=DETOUR_FACTOR):
+    """Yield one _cell_repairs task per non-empty cell."""
+    if max_gap_m > cell_size_m:
+        raise ValueError("cell_size_m must be at least max_gap_m")
+
+    n = len(xs)
+    px, py = coords_m[:, 0], coords_m[:, 1]
+
+    # Nodes by cell
+    cx = np.floor(px / cell_size_m).astype(np.int64)
+    cy = np.floor(py / cell_size_m).astype(np.int64)
+    cell = _cell_code(cx, cy)
+    nodes_by_cell = _grouped(cell)
+
+    # Directed edges (G's node order) by cell of their source
+    src = to_graph[np.repeat(np.arange(n), np.diff(arrays["indptr"]))]
+    dst = to_graph[arrays["targets"]]
+    edges_by_src_cell = _grouped(cell[src])
+
+    edge_geom = EdgeGeometry.from_arrays(arrays)
+    lengths = np.asarray(arrays["lengths"], dtype=np.float64)
+    lengths = np.where(np.isnan(lengths), edge_geom.lengths_m, lengths)
+
+    # Topology for pruning: undirected degree and weak components
+    lo, hi = np.minimum(src, dst), np.maximum(src, dst)
+    simple = np.unique(lo[lo != hi] * n + hi[lo != hi])
+    degree = np.bincount(np.concatenate([simple // n, simple % n]), minlength=n)
+    _, component = connected_components(
+        csr_matrix((np.ones(len(src)), (src, dst)), shape=(n, n)), directed=True, connection="weak"
+    )
+
+    # Edge geometries by every cell their projected bounds overlap
+    transformer = Transformer.from_crs("epsg:4326", "epsg:3857", always_xy=True)
+    b = edge_geom.bounds
+    bounds_m = np.column_stack([
+        *transformer.transform(b[:, 0], b[:, 1]),
+        *transformer.transform(b[:, 2], b[:, 3]),
+    ])
+    item, ecx, ecy = cells_overlapped(bounds_m, cell_size_m)
+    item_codes, item_order = _grouped(_cell_code(ecx, ecy))
+    geoms_by_cell = (item_codes, item[item_order])
+
+    # A detour path stays within detour_factor x max_gap_m of its source
+    search_m = max_gap_m * (1.0 + detour_factor * 1.01) if prune else max_gap_m
+    reach = int(np.ceil(search_m / cell_size_m))
+    ring = np.arange(-reach, reach + 1)
+    ring_x, ring_y = np.repeat(ring, len(ring)), np.tile(ring, len(ring))
+
+    for code, ccx, ccy in zip(*np.unique(np.column_stack([cell, cx, cy]), axis=0).T):
+        x0, y0 = ccx * cell_size_m, ccy * cell_size_m
+        x1, y1 = x0 + cell_size_m, y0 + cell_size_m
+
+        block = np.sort(_cell_code(ccx + ring_x, ccy + ring_y))
+
+        nodes = _gather(nodes_by_cell, block)
+        nx_, ny_ = px[nodes], py[nodes]
+        nodes = nodes[(nx_ >= x0 - search_m) & (nx_ <= x1 + search_m)
+                      & (ny_ >= y0 - search_m) & (ny_ <= y1 + search_m)]
+        nx_, ny_ = px[nodes], py[nodes]
+        in_halo = ((nx_ >= x0 - max_gap_m) & (nx_ <= x1 + max_gap_m)
+                   & (ny_ >= y0 - max_gap_m) & (ny_ <= y1 + max_gap_m))
+
+        local = _gather(edges_by_src_cell, block)
+        local = local[np.isin(src[local], nodes) & np.isin(dst[local], nodes)]
+        links = np.unique(lo[local] * n + hi[local])
+
+        near = np.unique(_gather(geoms_by_cell, block))
+        eb = bounds_m[near]
+        near = near[(eb[:, 0] <= x1 + max_gap_m) & (eb[:, 2] >= x0 - max_gap_m)
+                    & (eb[:, 1] <= y1 + max_gap_m) & (eb[:, 3] >= y0 - max_gap_m)]
+        idx, sizes = slice_indices(edge_geom.offsets, near)
+        offsets = np.zeros(len(near) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+
+        yield {
+            "nodes": nodes,
+            "in_halo": in_halo,
+            "coords_m": coords_m[nodes],
+            "xs": xs[nodes],
+            "ys": ys[nodes],
+            "owner": cell[nodes] == code,
+            "num_nodes": n,
+            "linked": links,
+            "prune": prune,
+            "degree": degree[nodes],
+            "component": component[nodes],
+            "dead_end_degree": DEAD_END_DEGREE,
+            "detour_factor": detour_factor,
+            "edge_src": np.searchsorted(nodes, src[local]),
+            "edge_dst": np.searchsorted(nodes, dst[local]),
+            "edge_len": lengths[local],
+            "edge_coords": edge_geom.coords[idx],
+            "edge_offsets": offsets,
+            "max_gap_m": max_gap_m,
+        }
+
+
+def _run_tasks(tasks, workers):
+    """Run _cell_repairs over tasks, at most 2 * workers tasks in flight."""
+    if workers <= 1:
+        return [_cell_repairs(t) for t in tasks]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for task in tasks:
+            pending.add(pool.submit(_cell_repairs, task))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(f.result() for f in done)
+        results.extend(f.result() for f in pending)
+    return results
+
+
+# -------------------------------------------------------------------
+# Repair
+# -------------------------------------------------------------------
+
+def repair_candidates(G, max_gap_m=30, workers=1, cell_size_m=CELL_SIZE_M, prune=True,
+                      detour_factor=DETOUR_FACTOR):
+    """
+    Connectors repair_graph would add, without modifying G.
+
+    Returns (pairs, counts): pairs are (u, v) OSM node ids in sorted order,
+    counts the number of candidate pairs left after each stage
+    (close, unlinked, gaps, added).
+    """
+    arrays = graph_to_arrays(G)
+    node_ids = arrays["node_ids"]
+
+    # Nodes in G's own order, so edge orientation matches the per-pair
+    # implementation (lower G index first)
+    nodes = np.fromiter(G.nodes, dtype=np.int64, count=G.number_of_nodes())
+    to_sorted = np.searchsorted(node_ids, nodes)
+    to_graph = np.empty_like(to_sorted)
+    to_graph[to_sorted] = np.arange(len(nodes))
+
+    xs = arrays["node_x"][to_sorted]
+    ys = arrays["node_y"][to_sorted]
+
+    # Projection
+    transformer = Transformer.from_crs("epsg:4326", "epsg:3857", always_xy=True)
+    px, py = transformer.transform(xs, ys)
+    coords_m = np.column_stack([px, py])
+
+    tasks = _cell_tasks(
+        arrays, to_graph, xs, ys, coords_m, max_gap_m, cell_size_m, prune, detour_factor
+    )
+    results = _run_tasks(tasks, workers)
+
+    counts = {"close": 0, "unlinked": 0, "gaps": 0, "added": 0}
+    for _, c in results:
+        for k in counts:
+            counts[k] += c[k]
+
+    found = [r for r, _ in results if len(r)]
+    pairs = np.concatenate(found) if found else np.empty((0, 2), dtype=np.int64)
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+    return nodes[pairs], counts
+
+
+def repair_graph(G, max_gap_m=30, workers=1, cell_size_m=CELL_SIZE_M, prune=True,
+                 detour_factor=DETOUR_FACTOR):
+    """
+    Connect node pairs closer than max_gap_m (EPSG:3857 metres) that are
+    actual gaps (see DEAD_END_DEGREE; a network path longer than
+    detour_factor x their distance counts as a gap; prune=False keeps every
+    unlinked pair), unless the straight connector would cross an existing
+    edge.
+
+    Nodes are partitioned into cell_size_m cells with a halo and each cell is
+    searched in bulk (KDTree pairs, numpy adjacency and topology checks, one
+    STRtree intersects query). With workers > 1 the cells run in a process
+    pool. Connectors are merged in sorted node order, so the result does not
+    depend on workers or cell_size_m.
+    """
+    pairs, counts = repair_candidates(G, max_gap_m, workers, cell_size_m, prune, detour_factor)
+    print(
+        f"DEBUG: repair candidates: {counts['close']} close, {counts['unlinked']} unlinked, "
+        f"{counts['gaps']} gaps, {counts['added']} added"
+    )
+
+    # Add edges
+    if len(pairs):
+        drop_fingerprint(G)
+    for u, v in pairs.tolist():
+        x_u, y_u = G.nodes[u]["x"], G.nodes[u]["y"]
+        x_v, y_v = G.nodes[v]["x"], G.nodes[v]["y"]
+        geom = LineString([(x_u, y_u), (x_v, y_v)])
+        length = haversine_m(y_u, x_u, y_v, x_v)
+
+        G.add_edge(u, v, geometry=geom, length=length)
+        G.add_edge(v, u, geometry=geom, length=length)
+
+    return G
+
+
+def _repair_graph_loop(G, max_gap_m=30):
+    """
+    Original per-pair implementation of repair_graph. Kept as the reference
+    for tests and src/benchmarks/bench_graph_repair.py.
+    """
+    gdf_nodes = ox.convert.graph_to_gdfs(G, nodes=True, edges=False)
 
-    # Build spatial index
-    tree_edges = STRtree(valid_geoms)
+    # Flat edge geometries; LineStrings are only built for bbox hits below
+    edge_geom = EdgeGeometry.from_graph(G)
 
     # Projection
     transformer = Transformer.from_crs("epsg:4326", "epsg:3857", always_xy=True)
@@ -47,23 +378,11 @@ def repair_graph(G, max_gap_m=30):
 
         cand = LineString([(xs[i], ys[i]), (xs[j], ys[j])])
 
-        hits = tree_edges.query(cand)
+        hits = edge_geom.query_bbox(*cand.bounds)
 
         intersects = False
         for h in hits:
-            if isinstance(h, (int, np.integer)):
-                geom = valid_geoms[int(h)]
-            else:
-                geom = h
-
-            if geom is None:
-                continue
-            if not hasattr(geom, "geom_type"):
-                continue
-            if geom.is_empty:
-                continue
-
-            if cand.intersects(geom):
+            if cand.intersects(edge_geom.geometry(h)):
                 intersects = True
                 break
 
@@ -73,6 +392,8 @@ def repair_graph(G, max_gap_m=30):
         to_add.append((node_u, node_v, cand))
 
     # Add edges
+    if to_add:
+        drop_fingerprint(G)
     for u, v, geom in to_add:
         lat_u = float(gdf_nodes.loc[u].y)
         lon_u = float(gdf_nodes.loc[u].x)
@@ -0,0 +1,499 @@
+# src/core/graph_snapshot.py
+
+"""
+Versioned binary snapshot of an OSM walk graph.
+
+A snapshot is a directory of plain .npy files plus a small meta.json:
+
+    node_ids.npy        int64   (N,)    OSM node ids, sorted ascending
+    node_x.npy          float64 (N,)    longitude
+    node_y.npy          float64 (N,)    latitude
+    indptr.npy          int64   (N+1,)  CSR offsets into the edge arrays
+    targets.npy         int32   (E,)    target node index for each edge
+    edge_keys.npy       int64   (E,)    MultiDiGraph edge key
+    lengths.npy         float64 (E,)    edge length in metres
+    has_geometry.npy    bool    (E,)    edge carried an explicit geometry
+    geom_offsets.npy    int64   (E+1,)  offsets into geom_coords
+    geom_coords.npy     float64 (M, 2)  flat (lon, lat) coordinate buffer
+
+Edges are grouped by source node, so the source of edge i is the node whose
+[indptr[n], indptr[n+1]) range contains i. Every edge has a coordinate slice:
+its geometry sanitised to a LineString (see geometry_sanitise.py), or the
+straight u -> v segment if it has none or it is unusable.
+
+Plain .npy files (rather than a single .npz) keep every array memory-mappable.
+
+Snapshots written from a networkx graph (save_snapshot) also hold every
+other graph, node and edge attribute (highway, name, osmid, oneway,
+street_count, ...) in attributes.json, which load_snapshot puts back.
+Snapshots built from arrays alone (OSM extracts, tiles) have none.
+"""
+
+import json
+import os
+
+import networkx as nx
+import numpy as np
+import shapely
+
+from src.core.geometry_sanitise import force_linestring
+from src.core.preprocessing import haversine_m
+
+SNAPSHOT_FORMAT = "runningapp-graph-snapshot"
+SNAPSHOT_VERSION = 2
+
+# Non-array attributes of a snapshot written from a networkx graph
+ATTRIBUTES_FILE = "attributes.json"
+
+ARRAY_NAMES = (
+    "node_ids",
+    "node_x",
+    "node_y",
+    "indptr",
+    "targets",
+    "edge_keys",
+    "lengths",
+    "has_geometry",
+    "geom_offsets",
+    "geom_coords",
+)
+
+
+def slice_indices(offsets, selected):
+    """
+    Flat indices of the concatenated slices [offsets[i], offsets[i+1]) for every
+    i in selected. Returns (indices, sizes).
+    """
+    starts = offsets[selected]
+    sizes = offsets[np.asarray(selected) + 1] - starts
+    total = int(sizes.sum())
+    shift = np.repeat(starts - (np.cumsum(sizes) - sizes), sizes)
+    return np.arange(total, dtype=np.int64) + shift, sizes
+
+
+# -------------------------------------------------------------------
+# networkx -> arrays
+# -------------------------------------------------------------------
+
+def graph_to_arrays(G):
+    """
+    Flatten an osmnx MultiDiGraph into the snapshot array layout.
+    Only node coordinates, edge lengths and edge geometries are kept; see
+    graph_attributes for the rest.
+    """
+    node_ids = np.fromiter(G.nodes, dtype=np.int64, count=G.number_of_nodes())
+    node_ids.sort()
+
+    node_x = np.empty(len(node_ids), dtype=np.float64)
+    node_y = np.empty(len(node_ids), dtype=np.float64)
+    for i, nid in enumerate(node_ids):
+        data = G.nodes[int(nid)]
+        node_x[i] = data["x"]
+        node_y[i] = data["y"]
+
+    num_edges = G.number_of_edges()
+    src = np.empty(num_edges, dtype=np.int64)
+    dst = np.empty(num_edges, dtype=np.int64)
+    keys = np.empty(num_edges, dtype=np.int64)
+    lengths = np.empty(num_edges, dtype=np.float64)
+    has_geometry = np.zeros(num_edges, dtype=bool)
+    coord_parts = []
+
+    for i, (u, v, k, data) in enumerate(G.edges(keys=True, data=True)):
+        src[i] = u
+        dst[i] = v
+        keys[i] = k
+
+        # Sanitised once here, so snapshot consumers only see LineStrings
+        geom = force_linestring(data.get("geometry"))
+        if geom is not None and not geom.is_empty:
+            coords = np.asarray(geom.coords, dtype=np.float64)[:, :2]
+            has_geometry[i] = True
+        else:
+            coords = None
+        coord_parts.append(coords)
+
+        length = data.get("length")
+        lengths[i] = float(length) if length is not None else np.nan
+
+    src_idx = np.searchsorted(node_ids, src)
+    dst_idx = np.searchsorted(node_ids, dst)
+
+    # Straight segments (and missing lengths) for edges without geometry
+    for i, coords in enumerate(coord_parts):
+        if coords is None:
+            coord_parts[i] = np.array(
+                [[node_x[src_idx[i]], node_y[src_idx[i]]],
+                 [node_x[dst_idx[i]], node_y[dst_idx[i]]]],
+                dtype=np.float64,
+            )
+        if np.isnan(lengths[i]):
+            lengths[i] = haversine_m(
+                node_y[src_idx[i]], node_x[src_idx[i]],
+                node_y[dst_idx[i]], node_x[dst_idx[i]],
+            )
+
+    # Group edges by source node (stable, so key order is preserved)
+    order = np.argsort(src_idx, kind="stable")
+    counts = np.bincount(src_idx, minlength=len(node_ids))
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    coord_parts = [coord_parts[i] for i in order]
+    sizes = np.fromiter((len(c) for c in coord_parts), dtype=np.int64, count=num_edges)
+    geom_offsets = np.zeros(num_edges + 1, dtype=np.int64)
+    np.cumsum(sizes, out=geom_offsets[1:])
+    if coord_parts:
+        geom_coords = np.concatenate(coord_parts)
+    else:
+        geom_coords = np.empty((0, 2), dtype=np.float64)
+
+    return {
+        "node_ids": node_ids,
+        "node_x": node_x,
+        "node_y": node_y,
+        "indptr": indptr,
+        "targets": dst_idx[order].astype(np.int32),
+        "edge_keys": keys[order],
+        "lengths": lengths[order],
+        "has_geometry": has_geometry[order],
+        "geom_offsets": geom_offsets,
+        "geom_coords": geom_coords,
+    }
+
+
+# -------------------------------------------------------------------
+# arrays -> networkx
+# -------------------------------------------------------------------
+
+def arrays_to_graph(arrays, crs="epsg:4326"):
+    """
+    Rebuild an osmnx-compatible MultiDiGraph from snapshot arrays.
+    """
+    node_ids = np.asarray(arrays["node_ids"])
+    node_x = np.asarray(arrays["node_x"])
+    node_y = np.asarray(arrays["node_y"])
+    indptr = np.asarray(arrays["indptr"])
+    targets = np.asarray(arrays["targets"])
+    edge_keys = np.asarray(arrays["edge_keys"])
+    lengths = np.asarray(arrays["lengths"])
+    has_geometry = np.asarray(arrays["has_geometry"])
+    geom_offsets = np.asarray(arrays["geom_offsets"])
+    geom_coords = np.asarray(arrays["geom_coords"])
+
+    G = nx.MultiDiGraph(crs=crs)
+    G.add_nodes_from(
+        (nid, {"x": x, "y": y})
+        for nid, x, y in zip(node_ids.tolist(), node_x.tolist(), node_y.tolist())
+    )
+
+    sources = np.repeat(node_ids, np.diff(indptr))
+    dests = node_ids[targets]
+
+    # Materialise explicit geometries in one vectorised call
+    geom_edges = np.flatnonzero(has_geometry)
+    geoms = [None] * len(targets)
+    if len(geom_edges):
+        idx, sizes = slice_indices(geom_offsets, geom_edges)
+        lines = shapely.linestrings(
+            geom_coords[idx], indices=np.repeat(np.arange(len(geom_edges)), sizes)
+        )
+        for e, line in zip(geom_edges.tolist(), lines):
+            geoms[e] = line
+
+    def _edges():
+        for u, v, k, length, geom in zip(
+            sources.tolist(), dests.tolist(), edge_keys.tolist(), lengths.tolist(), geoms
+        ):
+            data = {"length": length}
+            if geom is not None:
+                data["geometry"] = geom
+            yield u, v, k, data
+
+    G.add_edges_from(_edges())
+    return G
+
+
+# -------------------------------------------------------------------
+# Attributes
+# -------------------------------------------------------------------
+
+def graph_attributes(G):
+    """
+    The graph, node and edge attributes graph_to_arrays does not keep, as a
+    JSON-ready dict. Edges are keyed by (u, v, key), not by array position.
+    """
+    nodes = []
+    for n, data in G.nodes(data=True):
+        extra = {k: v for k, v in data.items() if k not in ("x", "y")}
+        if extra:
+            nodes.append([n, extra])
+
+    edges = []
+    for u, v, k, data in G.edges(keys=True, data=True):
+        extra = {a: b for a, b in data.items() if a not in ("length", "geometry")}
+        if extra:
+            edges.append([u, v, k, extra])
+
+    graph = {k: v for k, v in G.graph.items() if k not in ("crs", "fingerprint")}
+    return {"graph": graph, "nodes": nodes, "edges": edges}
+
+
+def apply_graph_attributes(G, attributes):
+    """Put graph_attributes output back on a graph rebuilt from arrays."""
+    G.graph.update(attributes.get("graph", {}))
+    for n, extra in attributes.get("nodes", []):
+        if n in G:
+            G.nodes[n].update(extra)
+    for u, v, k, extra in attributes.get("edges", []):
+        if G.has_edge(u, v, k):
+            G.edges[u, v, k].update(extra)
+    return G
+
+
+# -------------------------------------------------------------------
+# Edge lists <-> arrays
+# -------------------------------------------------------------------
+
+def edge_list(arrays, edges=None):
+    """
+    Edge-list form of (a subset of) snapshot arrays, keyed by OSM node ids:
+    dict with src, dst, keys, lengths, has_geometry, geom_offsets, geom_coords.
+    """
+    indptr = np.asarray(arrays["indptr"])
+    if edges is None:
+        edges = np.arange(len(arrays["targets"]), dtype=np.int64)
+    edges = np.asarray(edges, dtype=np.int64)
+
+    node_ids = np.asarray(arrays["node_ids"])
+    src_idx = np.searchsorted(indptr, edges, side="right") - 1
+
+    idx, sizes = slice_indices(np.asarray(arrays["geom_offsets"]), edges)
+    geom_offsets = np.zeros(len(edges) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=geom_offsets[1:])
+
+    return {
+        "src": node_ids[src_idx],
+        "dst": node_ids[np.asarray(arrays["targets"])[edges]],
+        "keys": np.asarray(arrays["edge_keys"])[edges],
+        "lengths": np.asarray(arrays["lengths"])[edges],
+        "has_geometry": np.asarray(arrays["has_geometry"])[edges],
+        "geom_offsets": geom_offsets,
+        "geom_coords": np.asarray(arrays["geom_coords"])[idx],
+    }
+
+
+def arrays_from_edge_list(node_ids, node_x, node_y, edges):
+    """
+    Build snapshot arrays from node coordinates and an edge list as returned
+    by edge_list. Node ids need not be sorted; every edge endpoint must be
+    among them.
+    """
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    order = np.argsort(node_ids, kind="stable")
+    node_ids = node_ids[order]
+    node_x = np.asarray(node_x, dtype=np.float64)[order]
+    node_y = np.asarray(node_y, dtype=np.float64)[order]
+
+    src_idx = np.searchsorted(node_ids, edges["src"])
+    dst_idx = np.searchsorted(node_ids, edges["dst"])
+
+    # Group by source node, stable so parallel-edge order is preserved
+    edge_order = np.argsort(src_idx, kind="stable")
+    counts = np.bincount(src_idx, minlength=len(node_ids))
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    idx, sizes = slice_indices(np.asarray(edges["geom_offsets"]), edge_order)
+    geom_offsets = np.zeros(len(edge_order) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=geom_offsets[1:])
+
+    return {
+        "node_ids": node_ids,
+        "node_x": node_x,
+        "node_y": node_y,
+        "indptr": indptr,
+        "targets": dst_idx[edge_order].astype(np.int32),
+        "edge_keys": np.asarray(edges["keys"], dtype=np.int64)[edge_order],
+        "lengths": np.asarray(edges["lengths"], dtype=np.float64)[edge_order],
+        "has_geometry": np.asarray(edges["has_geometry"], dtype=bool)[edge_order],
+        "geom_offsets": geom_offsets,
+        "geom_coords": np.asarray(edges["geom_coords"], dtype=np.float64)[idx].reshape(-1, 2),
+    }
+
+
+def concat_edge_lists(parts):
+    """Concatenate several edge lists (see edge_list) into one."""
+    offsets = [np.zeros(1, dtype=np.int64)]
+    base = 0
+    for p in parts:
+        offsets.append(np.asarray(p["geom_offsets"][1:]) + base)
+        base += int(p["geom_offsets"][-1])
+
+    out = {
+        name: np.concatenate([p[name] for p in parts])
+        for name in ("src", "dst", "keys", "lengths", "has_geometry")
+    }
+    out["geom_offsets"] = np.concatenate(offsets)
+    out["geom_coords"] = np.concatenate([p["geom_coords"] for p in parts]).reshape(-1, 2)
+    return out
+
+
+def edge_bounds(arrays):
+    """
+    Vectorised (E, 4) array of edge bounds: min_lon, min_lat, max_lon, max_lat.
+    """
+    coords = np.asarray(arrays["geom_coords"])
+    starts = np.asarray(arrays["geom_offsets"])[:-1]
+    if len(starts) == 0:
+        return np.empty((0, 4), dtype=np.float64)
+    return np.column_stack([
+        np.minimum.reduceat(coords[:, 0], starts),
+        np.minimum.reduceat(coords[:, 1], starts),
+        np.maximum.reduceat(coords[:, 0], starts),
+        np.maximum.reduceat(coords[:, 1], starts),
+    ])
+
+
+# -------------------------------------------------------------------
+# Disk I/O
+# -------------------------------------------------------------------
+
+def write_snapshot_arrays(arrays, path, attributes=None, **meta):
+    """
+    Write snapshot arrays to a directory. Extra keyword arguments are stored
+    in meta.json next to the format version and basic counts; attributes
+    (see graph_attributes) in attributes.json.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    attributes_path = os.path.join(path, ATTRIBUTES_FILE)
+    if attributes is not None:
+        with open(attributes_path, "w") as f:
+            json.dump(attributes, f, default=str)
+    elif os.path.exists(attributes_path):
+        os.remove(attributes_path)
+
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+
+    info = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "crs": "epsg:4326",
+        "num_nodes": int(len(arrays["node_ids"])),
+        "num_edges": int(len(arrays["targets"])),
+    }
+    info.update(meta)
+
+    # meta.json is written last: its presence marks a complete snapshot
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(info, f, indent=2)
+
+    return info
+
+
+def read_snapshot_meta(path):
+    """
+    Read and validate meta.json. Raises ValueError on an unknown format/version.
+    """
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"Graph snapshot not found at: {path}")
+
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+
+    if meta.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} is not a graph snapshot.")
+    if meta.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(
+            f"Snapshot version {meta.get('version')} at {path} is not supported "
+            f"(expected {SNAPSHOT_VERSION}). Rebuild it from GraphML."
+        )
+    return meta
+
+
+def load_snapshot_arrays(path, mmap_mode=None):
+    """
+    Load the raw snapshot arrays. Returns (arrays, meta).
+    Pass mmap_mode="r" to memory-map the files instead of reading them.
+    """
+    meta = read_snapshot_meta(path)
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+        for name in ARRAY_NAMES
+    }
+    return arrays, meta
+
+
+def load_snapshot(path):
+    """
+    Load a snapshot as an osmnx-compatible networkx MultiDiGraph, with the
+    attributes save_snapshot stored.
+    """
+    arrays, meta = load_snapshot_arrays(path)
+    G = arrays_to_graph(arrays, crs=meta.get("crs", "epsg:4326"))
+
+    attributes_path = os.path.join(path, ATTRIBUTES_FILE)
+    if os.path.exists(attributes_path):
+        with open(attributes_path, "r") as f:
+            apply_graph_attributes(G, json.load(f))
+    return G
+
+
+def save_snapshot(G, path, **meta):
+    """
+    Write a networkx graph as a snapshot directory, attributes included.
+    """
+    return write_snapshot_arrays(
+        graph_to_arrays(G), path, attributes=graph_attributes(G), **meta
+    )
+
+
+def convert_graphml(graphml_path, snapshot_path):
+    """
+    Convert an existing GraphML file to a snapshot. The source file's size
+    and mtime are recorded so loaders can detect a stale snapshot.
+    """
+    import osmnx as ox
+
+    G = ox.load_graphml(graphml_path)
+    stat = os.stat(graphml_path)
+    return save_snapshot(
+        G,
+        snapshot_path,
+        source=os.path.abspath(graphml_path),
+        source_size=stat.st_size,
+        source_mtime=stat.st_mtime,
+    )
+
+
+def snapshot_is_current(snapshot_path, graphml_path):
+    """
+    True if snapshot_path exists and was converted from the current graphml_path.
+    """
+    try:
+        meta = read_snapshot_meta(snapshot_path)
+    except (FileNotFoundError, ValueError):
+        return False
+
+    if not os.path.exists(graphml_path):
+        return True
+
+    stat = os.stat(graphml_path)
+    return (
+        meta.get("source_size") == stat.st_size
+        and meta.get("source_mtime") == stat.st_mtime
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python -m src.core.graph_snapshot <in.graphml> <out_snapshot_dir>")
+        sys.exit(1)
+
+    info = convert_graphml(sys.argv[1], sys.argv[2])
+    print("DONE:", info["num_nodes"], "nodes,", info["num_edges"], "edges")
@@ -0,0 +1,212 @@
+# src/core/graph_tiles.py
+
+"""
+Spatially tiled master graph.
+
+The graph is cut into a fixed lon/lat grid (tile (tx, ty) covers
+[tx * size, (tx + 1) * size) x [ty * size, (ty + 1) * size) in degrees).
+Each tile is stored as its own graph snapshot (arrays only, without the
+attributes.json of graph_snapshot.save_snapshot) and holds every edge whose
+geometry bounds overlap the tile, together with both endpoint nodes. An edge
+crossing a tile border is therefore present in every tile it touches, and
+stitching tiles back together deduplicates edges on (u, v, key).
+
+    tiles_dir/
+        tiles.json          grid size, source info and per-tile counts
+        tile_<tx>_<ty>/     graph snapshot (see graph_snapshot.py)
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+
+from src.core.edge_geometry import cells_overlapped
+from src.core.graph_arrays import GraphArrays
+from src.core.graph_cropper import track_bbox
+from src.core.graph_snapshot import (
+    arrays_from_edge_list,
+    arrays_to_graph,
+    concat_edge_lists,
+    edge_bounds,
+    edge_list,
+    SNAPSHOT_VERSION,
+    load_snapshot_arrays,
+    slice_indices,
+    write_snapshot_arrays,
+)
+
+TILE_SIZE_DEG = 0.01   # ~1.1 km north-south, ~0.7 km east-west at 52°N
+TILES_INDEX = "tiles.json"
+
+
+def tile_name(tx, ty):
+    return f"tile_{tx}_{ty}"
+
+
+def tile_range(min_lat, max_lat, min_lon, max_lon, tile_size_deg=TILE_SIZE_DEG):
+    """Inclusive (tx0, tx1, ty0, ty1) grid range overlapping a lat/lon bbox."""
+    return (
+        math.floor(min_lon / tile_size_deg),
+        math.floor(max_lon / tile_size_deg),
+        math.floor(min_lat / tile_size_deg),
+        math.floor(max_lat / tile_size_deg),
+    )
+
+
+# -------------------------------------------------------------------
+# Building
+# -------------------------------------------------------------------
+
+def build_tiles(arrays, tiles_dir, tile_size_deg=TILE_SIZE_DEG, **meta):
+    """
+    Split snapshot arrays (a dict or GraphArrays) into tile snapshots under
+    tiles_dir. Returns the tile index written to tiles.json.
+    """
+    if isinstance(arrays, GraphArrays):
+        arrays = arrays.__dict__
+
+    node_ids = np.asarray(arrays["node_ids"])
+    node_x = np.asarray(arrays["node_x"])
+    node_y = np.asarray(arrays["node_y"])
+    indptr = np.asarray(arrays["indptr"])
+    targets = np.asarray(arrays["targets"])
+
+    # One (edge, tx, ty) row per tile each edge's bounds overlap
+    edge_rep, tile_x, tile_y = cells_overlapped(edge_bounds(arrays), tile_size_deg)
+
+    # Isolated nodes still belong to the tile they sit in
+    degree = np.diff(indptr) + np.bincount(targets, minlength=len(node_ids))
+    isolated = np.flatnonzero(degree == 0)
+    iso_tx = np.floor(node_x[isolated] / tile_size_deg).astype(np.int64)
+    iso_ty = np.floor(node_y[isolated] / tile_size_deg).astype(np.int64)
+
+    tile_keys = set(zip(tile_x.tolist(), tile_y.tolist()))
+    tile_keys.update(zip(iso_tx.tolist(), iso_ty.tolist()))
+
+    order = np.lexsort((edge_rep, tile_y, tile_x))
+    edge_rep = edge_rep[order]
+    tile_code = tile_x[order] * (1 << 32) + tile_y[order]
+    src_all = np.searchsorted(indptr, np.arange(len(targets)), side="right") - 1
+
+    os.makedirs(tiles_dir, exist_ok=True)
+    index = {
+        "tile_size_deg": tile_size_deg,
+        "snapshot_version": SNAPSHOT_VERSION,
+        "num_nodes": int(len(node_ids)),
+        "num_edges": int(len(targets)),
+        "tiles": {},
+    }
+    index.update(meta)
+
+    for tx, ty in sorted(tile_keys):
+        code = tx * (1 << 32) + ty
+        lo = np.searchsorted(tile_code, code, side="left")
+        hi = np.searchsorted(tile_code, code, side="right")
+        edges = edge_rep[lo:hi]
+
+        nodes = np.concatenate([
+            src_all[edges],
+            targets[edges].astype(np.int64),
+            isolated[(iso_tx == tx) & (iso_ty == ty)],
+        ])
+        nodes = np.unique(nodes)
+
+        tile_arrays = arrays_from_edge_list(
+            node_ids[nodes], node_x[nodes], node_y[nodes], edge_list(arrays, edges)
+        )
+        name = tile_name(tx, ty)
+        write_snapshot_arrays(tile_arrays, os.path.join(tiles_dir, name), tile=[tx, ty])
+        index["tiles"][name] = {
+            "tx": tx,
+            "ty": ty,
+            "num_nodes": int(len(tile_arrays["node_ids"])),
+            "num_edges": int(len(tile_arrays["targets"])),
+        }
+
+    # Index is written last: its presence marks a complete tile set
+    with open(os.path.join(tiles_dir, TILES_INDEX), "w") as f:
+        json.dump(index, f, indent=2)
+
+    return index
+
+
+def read_tiles_index(tiles_dir):
+    path = os.path.join(tiles_dir, TILES_INDEX)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Tile index not found at: {path}")
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+# -------------------------------------------------------------------
+# Loading
+# -------------------------------------------------------------------
+
+def stitch_tiles(tiles_dir, tile_keys):
+    """
+    Merge the given tiles into one set of snapshot arrays, deduplicating
+    nodes by id and edges by (u, v, key). Missing tiles are skipped.
+    """
+    node_parts, x_parts, y_parts, edge_parts = [], [], [], []
+
+    for tx, ty in tile_keys:
+        path = os.path.join(tiles_dir, tile_name(tx, ty))
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            continue
+        arrays, _ = load_snapshot_arrays(path)
+        node_parts.append(arrays["node_ids"])
+        x_parts.append(arrays["node_x"])
+        y_parts.append(arrays["node_y"])
+        edge_parts.append(edge_list(arrays))
+
+    if not node_parts:
+        raise ValueError("No graph tiles cover the requested area.")
+
+    node_ids, first = np.unique(np.concatenate(node_parts), return_index=True)
+    node_x = np.concatenate(x_parts)[first]
+    node_y = np.concatenate(y_parts)[first]
+
+    edges = concat_edge_lists(edge_parts)
+    triples = np.column_stack([edges["src"], edges["dst"], edges["keys"]])
+    _, keep = np.unique(triples, axis=0, return_index=True)
+    keep.sort()
+
+    idx, sizes = slice_indices(edges["geom_offsets"], keep)
+    deduped = {
+        name: edges[name][keep]
+        for name in ("src", "dst", "keys", "lengths", "has_geometry")
+    }
+    deduped["geom_offsets"] = np.zeros(len(keep) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=deduped["geom_offsets"][1:])
+    deduped["geom_coords"] = edges["geom_coords"][idx]
+
+    return arrays_from_edge_list(node_ids, node_x, node_y, deduped)
+
+
+def load_tiles_for_bbox(tiles_dir, min_lat, max_lat, min_lon, max_lon, as_arrays=False):
+    """
+    Load only the tiles overlapping a bounding box, stitched together.
+    Returns a networkx MultiDiGraph, or a GraphArrays with as_arrays=True.
+    """
+    index = read_tiles_index(tiles_dir)
+    tx0, tx1, ty0, ty1 = tile_range(min_lat, max_lat, min_lon, max_lon, index["tile_size_deg"])
+    keys = sorted(
+        (t["tx"], t["ty"]) for t in index["tiles"].values()
+        if tx0 <= t["tx"] <= tx1 and ty0 <= t["ty"] <= ty1
+    )
+
+    arrays = stitch_tiles(tiles_dir, keys)
+    if as_arrays:
+        return GraphArrays(meta={"tiles": [tile_name(*k) for k in keys]}, **arrays)
+    return arrays_to_graph(arrays)
+
+
+def load_tiles_for_track(tiles_dir, latlng, margin_deg=0.002, as_arrays=False):
+    """
+    Load the tiles covering a GPS track (list of (lat, lon)) plus a margin,
+    using the same bounding box as graph_cropper.crop_graph_edges.
+    """
+    min_lat, max_lat, min_lon, max_lon = track_bbox(latlng, margin_deg)
+    return load_tiles_for_bbox(tiles_dir, min_lat, max_lat, min_lon, max_lon, as_arrays)
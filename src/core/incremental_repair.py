@@ -0,0 +1,354 @@
+# src/core/incremental_repair.py
+
+"""
+Incremental graph repair.
+
+repair_graph (graph_repair.py) always scans the whole graph. RepairIndex
+keeps a mutable uniform grid of nodes and edge bounds (EPSG:3857 metres, like
+repair_graph) next to a networkx graph, so after an edit only the area
+within max_gap_m of the change is searched again:
+
+    index = RepairIndex(G, max_gap_m=30)        # O(graph), once
+    G.add_node(n, x=..., y=...)
+    index.add_node(n)
+    added = index.repair(nodes=[n])             # O(edit)
+
+repair() also takes changed edges (their endpoints are searched again; an
+edge still in G is indexed if it was not yet) or a changed bbox. Pairs in
+index.blocked are never connected.
+
+repair_around() does the same for a few changed nodes of a large graph
+without indexing all of it: only the edges and nodes that gap detection
+around the change can reach are copied into a local graph. graph_patch
+uses it after applying patches.
+
+Gap detection follows repair_graph: close, unlinked pairs that are gaps
+(dead end, unreachable, or a network detour longer than DETOUR_FACTOR x the
+straight distance) and whose straight connector crosses no existing edge.
+Connectors are added to G and to the index in place.
+"""
+
+from collections import defaultdict
+
+import networkx as nx
+import numpy as np
+import shapely
+from pyproj import Transformer
+from scipy.spatial import cKDTree
+from shapely.geometry import LineString
+from shapely.strtree import STRtree
+
+from src.core.edge_geometry import cells_overlapped
+from src.core.graph_repair import DEAD_END_DEGREE, DETOUR_FACTOR
+from src.core.graph_snapshot import (
+    arrays_from_edge_list,
+    arrays_to_graph,
+    edge_bounds,
+    edge_list,
+    graph_to_arrays,
+)
+from src.core.preprocessing import haversine_m
+from src.core.snap_index import drop_fingerprint
+
+_TO_3857 = Transformer.from_crs("epsg:4326", "epsg:3857", always_xy=True)
+
+
+def _edge_length(G, u, v, data):
+    """Shortest parallel u -> v edge; haversine if a length is missing."""
+    best = float("inf")
+    for d in data.values():
+        length = d.get("length")
+        if length is None or length != length:
+            nu, nv = G.nodes[u], G.nodes[v]
+            length = haversine_m(nu["y"], nu["x"], nv["y"], nv["x"])
+        best = min(best, float(length))
+    return best
+
+
+class RepairIndex:
+    """Mutable node / edge grid over a networkx graph; see module docstring."""
+
+    def __init__(self, G, max_gap_m=30, cell_size_m=250.0, detour_factor=DETOUR_FACTOR):
+        if max_gap_m > cell_size_m:
+            raise ValueError("cell_size_m must be at least max_gap_m")
+
+        self.G = G
+        self.max_gap_m = max_gap_m
+        self.cell_size_m = cell_size_m
+        self.detour_factor = detour_factor
+
+        # Position in G's node order decides connector orientation, as in
+        # repair_graph
+        self.order = {n: i for i, n in enumerate(G.nodes)}
+
+        self.node_xy = {}                 # node -> (x_m, y_m)
+        self.node_cells = defaultdict(set)
+        self.edge_boxes = {}              # (u, v, k) -> (x0, y0, x1, y1) metres
+        self.edge_cells = defaultdict(set)
+        self.blocked = set()              # (u, v), u < v: never connected
+
+        arrays = graph_to_arrays(G)
+        px, py = _TO_3857.transform(arrays["node_x"], arrays["node_y"])
+        for n, x, y in zip(arrays["node_ids"].tolist(), px.tolist(), py.tolist()):
+            self.node_xy[n] = (x, y)
+            self.node_cells[self._cell(x, y)].add(n)
+
+        edges = edge_list(arrays)
+        b = edge_bounds(arrays)
+        x0, y0 = _TO_3857.transform(b[:, 0], b[:, 1])
+        x1, y1 = _TO_3857.transform(b[:, 2], b[:, 3])
+        boxes = np.column_stack([x0, y0, x1, y1])
+        keys = list(zip(edges["src"].tolist(), edges["dst"].tolist(), edges["keys"].tolist()))
+        for key, box in zip(keys, boxes.tolist()):
+            self.edge_boxes[key] = tuple(box)
+
+        item, cx, cy = cells_overlapped(boxes, cell_size_m)
+        for e, c in zip(item.tolist(), zip(cx.tolist(), cy.tolist())):
+            self.edge_cells[c].add(keys[e])
+
+    # ------------------------------------------------------------------
+    # Grid helpers
+    # ------------------------------------------------------------------
+
+    def _cell(self, x, y):
+        return (int(np.floor(x / self.cell_size_m)), int(np.floor(y / self.cell_size_m)))
+
+    def _cells_in(self, x0, y0, x1, y1):
+        (cx0, cy0), (cx1, cy1) = self._cell(x0, y0), self._cell(x1, y1)
+        return [(cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)]
+
+    def nodes_in_box(self, x0, y0, x1, y1):
+        """Nodes whose projected position lies in the box (metres)."""
+        out = []
+        for c in self._cells_in(x0, y0, x1, y1):
+            for n in self.node_cells.get(c, ()):
+                x, y = self.node_xy[n]
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    out.append(n)
+        return out
+
+    def edges_in_box(self, x0, y0, x1, y1):
+        """(u, v, k) of edges whose bounds intersect the box (metres)."""
+        out = set()
+        for c in self._cells_in(x0, y0, x1, y1):
+            for key in self.edge_cells.get(c, ()):
+                bx0, by0, bx1, by1 = self.edge_boxes[key]
+                if bx0 <= x1 and bx1 >= x0 and by0 <= y1 and by1 >= y0:
+                    out.add(key)
+        return out
+
+    def _edge_geometry(self, key):
+        u, v, k = key
+        geom = self.G.edges[u, v, k].get("geometry")
+        if geom is None:
+            nu, nv = self.G.nodes[u], self.G.nodes[v]
+            geom = LineString([(nu["x"], nu["y"]), (nv["x"], nv["y"])])
+        return geom
+
+    # ------------------------------------------------------------------
+    # In-place updates
+    # ------------------------------------------------------------------
+
+    def add_node(self, n):
+        """Index a node that was added to G."""
+        if n in self.node_xy:
+            self.remove_node(n)
+        data = self.G.nodes[n]
+        x, y = _TO_3857.transform(data["x"], data["y"])
+        self.node_xy[n] = (x, y)
+        self.node_cells[self._cell(x, y)].add(n)
+        self.order.setdefault(n, len(self.order))
+
+    def remove_node(self, n):
+        x, y = self.node_xy.pop(n)
+        self.node_cells[self._cell(x, y)].discard(n)
+
+    def add_edge(self, u, v, k=0):
+        """Index an edge that was added to G."""
+        geom = self._edge_geometry((u, v, k))
+        lon0, lat0, lon1, lat1 = geom.bounds
+        x0, y0 = _TO_3857.transform(lon0, lat0)
+        x1, y1 = _TO_3857.transform(lon1, lat1)
+        self.edge_boxes[(u, v, k)] = (x0, y0, x1, y1)
+        for c in self._cells_in(x0, y0, x1, y1):
+            self.edge_cells[c].add((u, v, k))
+
+    def remove_edge(self, u, v, k=0):
+        """Drop an edge that was (or is about to be) removed from G."""
+        box = self.edge_boxes.pop((u, v, k), None)
+        if box is not None:
+            for c in self._cells_in(*box):
+                self.edge_cells[c].discard((u, v, k))
+
+    def _sync_edges(self, u, v, key=()):
+        """Index u -> v edges added to G and unindex removed ones."""
+        keys = set(key)
+        if not keys:
+            if self.G.has_edge(u, v):
+                keys.update(self.G[u][v])
+            # An indexed u -> v edge's box covers u, so it is listed in u's cell
+            if u in self.node_xy:
+                cell = self._cell(*self.node_xy[u])
+                keys.update(e[2] for e in self.edge_cells.get(cell, ()) if e[:2] == (u, v))
+
+        for k in keys:
+            indexed = (u, v, k) in self.edge_boxes
+            if self.G.has_edge(u, v, k) and not indexed:
+                self.add_edge(u, v, k)
+            elif not self.G.has_edge(u, v, k) and indexed:
+                self.remove_edge(u, v, k)
+
+    # ------------------------------------------------------------------
+    # Gap detection
+    # ------------------------------------------------------------------
+
+    def _is_gap(self, u, v):
+        G = self.G
+        for n in (u, v):
+            neighbours = (set(G.successors(n)) | set(G.predecessors(n))) - {n}
+            if len(neighbours) <= DEAD_END_DEGREE:
+                return True
+
+        nu, nv = G.nodes[u], G.nodes[v]
+        cutoff = self.detour_factor * haversine_m(nu["y"], nu["x"], nv["y"], nv["x"])
+        reach = nx.single_source_dijkstra_path_length(
+            G, u, cutoff=cutoff, weight=lambda a, b, d: _edge_length(G, a, b, d)
+        )
+        # Different components are unreachable too
+        return v not in reach
+
+    def repair(self, nodes=None, edges=None, bbox=None):
+        """
+        Re-run gap detection for pairs with at least one end among nodes,
+        among the endpoints of edges ((u, v) or (u, v, k), added or removed)
+        or inside bbox (min_lat, max_lat, min_lon, max_lon). Adds the
+        connectors to G and the index and returns them as (u, v) pairs.
+        """
+        changed = set()
+        boxes = []
+        seeds = list(nodes) if nodes is not None else []
+        for edge in edges or ():
+            u, v = edge[0], edge[1]
+            self._sync_edges(u, v, edge[2:])
+            seeds += [u, v]
+        if seeds:
+            for n in seeds:
+                if n not in self.node_xy:
+                    self.add_node(n)
+                changed.add(n)
+                x, y = self.node_xy[n]
+                boxes.append((x, y, x, y))
+        if bbox is not None:
+            min_lat, max_lat, min_lon, max_lon = bbox
+            x0, y0 = _TO_3857.transform(min_lon, min_lat)
+            x1, y1 = _TO_3857.transform(max_lon, max_lat)
+            changed.update(self.nodes_in_box(x0, y0, x1, y1))
+            boxes.append((x0, y0, x1, y1))
+        if not changed:
+            return []
+
+        # Every node within max_gap_m of the change
+        r = self.max_gap_m
+        local = set()
+        for x0, y0, x1, y1 in boxes:
+            local.update(self.nodes_in_box(x0 - r, y0 - r, x1 + r, y1 + r))
+        local = sorted(local, key=self.order.__getitem__)
+
+        xy = np.array([self.node_xy[n] for n in local]).reshape(-1, 2)
+        pairs = cKDTree(xy).query_pairs(r=r, output_type="ndarray")
+
+        # Lower G index first; at least one end changed; not already linked
+        candidates = []
+        for a, b in pairs.tolist():
+            u, v = local[min(a, b)], local[max(a, b)]
+            if u not in changed and v not in changed:
+                continue
+            if self.G.has_edge(u, v) or self.G.has_edge(v, u):
+                continue
+            if (min(u, v), max(u, v)) in self.blocked:
+                continue
+            if self._is_gap(u, v):
+                candidates.append((u, v))
+        if not candidates:
+            return []
+
+        # Connectors that cross an existing edge
+        G = self.G
+        seg = np.array([
+            [(G.nodes[u]["x"], G.nodes[u]["y"]), (G.nodes[v]["x"], G.nodes[v]["y"])]
+            for u, v in candidates
+        ])
+        cands = shapely.linestrings(seg)
+
+        x0, y0 = xy.min(axis=0)
+        x1, y1 = xy.max(axis=0)
+        near = sorted(self.edges_in_box(x0, y0, x1, y1))
+        geoms = [self._edge_geometry(key) for key in near]
+        hit, _ = STRtree(geoms).query(cands, predicate="intersects")
+        free = np.ones(len(candidates), dtype=bool)
+        free[hit] = False
+
+        # Add in place, in the same order repair_graph uses
+        added = sorted(
+            (c for c, ok in zip(candidates, free) if ok),
+            key=lambda p: (self.order[p[0]], self.order[p[1]]),
+        )
+        if added:
+            # G changed in place: its stored fingerprint no longer holds
+            drop_fingerprint(G)
+        for u, v in added:
+            nu, nv = G.nodes[u], G.nodes[v]
+            geom = LineString([(nu["x"], nu["y"]), (nv["x"], nv["y"])])
+            length = haversine_m(nu["y"], nu["x"], nv["y"], nv["x"])
+            for a, b in ((u, v), (v, u)):
+                k = G.add_edge(a, b, geometry=geom, length=length)
+                self.add_edge(a, b, k)
+
+        return added
+
+
+def repair_around(arrays, nodes, max_gap_m=30, detour_factor=DETOUR_FACTOR, blocked=()):
+    """
+    Connectors RepairIndex.repair(nodes=nodes) would add to the graph of
+    snapshot arrays (a dict or GraphArrays), as (u, v) pairs; the arrays are
+    not changed. blocked pairs are never connected.
+
+    Gap detection reaches at most max_gap_m to a partner plus a detour of
+    detour_factor x max_gap_m from it, so only the edges whose bounds come
+    within that distance of a changed node, and the nodes there, are indexed.
+    """
+    if not isinstance(arrays, dict):
+        arrays = arrays.__dict__
+
+    node_ids = np.asarray(arrays["node_ids"])
+    node_x = np.asarray(arrays["node_x"])
+    node_y = np.asarray(arrays["node_y"])
+
+    seeds = np.unique(np.asarray(list(nodes), dtype=np.int64))
+    seeds = seeds[np.isin(seeds, node_ids)]
+    if len(seeds) == 0:
+        return []
+
+    pos = np.searchsorted(node_ids, seeds)
+    reach_m = (detour_factor + 1.0) * max_gap_m
+    dy = reach_m / 111_320.0
+    dx = dy / np.cos(np.radians(node_y[pos]))
+
+    b = edge_bounds(arrays)
+    keep_edges = np.zeros(len(b), dtype=bool)
+    keep_nodes = np.zeros(len(node_ids), dtype=bool)
+    for x, y, ddx in zip(node_x[pos].tolist(), node_y[pos].tolist(), dx.tolist()):
+        x0, x1, y0, y1 = x - ddx, x + ddx, y - dy, y + dy
+        keep_edges |= (b[:, 0] <= x1) & (b[:, 2] >= x0) & (b[:, 1] <= y1) & (b[:, 3] >= y0)
+        keep_nodes |= (node_x >= x0) & (node_x <= x1) & (node_y >= y0) & (node_y <= y1)
+
+    edges = edge_list(arrays, np.flatnonzero(keep_edges))
+    keep_nodes[np.searchsorted(node_ids, edges["src"])] = True
+    keep_nodes[np.searchsorted(node_ids, edges["dst"])] = True
+    local = arrays_to_graph(arrays_from_edge_list(
+        node_ids[keep_nodes], node_x[keep_nodes], node_y[keep_nodes], edges
+    ))
+
+    index = RepairIndex(local, max_gap_m=max_gap_m, detour_factor=detour_factor)
+    index.blocked.update((min(u, v), max(u, v)) for u, v in blocked)
+    return index.repair(nodes=seeds.tolist())
@@ -0,0 +1,471 @@
+# src/core/map_matching.py
+
+"""
+HMM map matching (Newson & Krumm style) on GraphArrays.
+
+Snapping each point to its own nearest edge jumps between parallel paths
+(canal sides, cycle tracks). The matcher instead scores whole sequences:
+
+    candidates   up to K edges within CANDIDATE_RADIUS_M of every point
+    emission     Gaussian in the point -> edge distance (GPS_SIGMA_M)
+    transition   exponential in |network distance - straight distance|
+                 (TRANSITION_BETA_M); routes longer than the straight
+                 distance x DETOUR_FACTOR + 2 x CANDIDATE_RADIUS_M are cut
+
+and decodes the most likely candidate per point with Viterbi. Route lookups
+are bounded Dijkstra runs on the CSR arrays, cached per source node within a
+match, so consecutive points on the same streets reuse them. If no
+transition is possible the chain is broken and restarted at that point;
+the node path still joins the chains by a route of up to BRIDGE_CUTOFF_M,
+and otherwise records where it jumps (MatchResult.path_breaks).
+
+All distances are in metres, in the snap index's metric CRS.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+import shapely
+
+from src.core.edge_store import EdgeStore, arrays_fingerprint
+from src.core.graph_arrays import GraphArrays, csr_dijkstra
+from src.core.preprocessing import haversine_m
+from src.core.projection import from_metric, to_metric
+from src.core.snap_index import MEMO_SIZE, get_snap_index, graph_fingerprint
+
+CANDIDATE_RADIUS_M = 50.0
+MAX_CANDIDATES = 5
+GPS_SIGMA_M = 5.0
+TRANSITION_BETA_M = 3.0
+DETOUR_FACTOR = 2.0
+
+# Longest route that joins the node paths of two chains (GPS gaps, tunnels)
+BRIDGE_CUTOFF_M = 1000.0
+
+# Route cutoffs are rounded up to this step so lookups can be shared
+ROUTE_CUTOFF_STEP_M = 50.0
+
+# matcher per graph fingerprint, the MEMO_SIZE most recently used
+_MATCHERS = OrderedDict()
+
+
+@dataclass
+class MatchResult:
+    """Output of MapMatcher.match, per point and for the whole path."""
+    snapped_lat: np.ndarray   # (N,)
+    snapped_lon: np.ndarray   # (N,)
+    edge: np.ndarray          # (N,) matched edge index per point
+    offset: np.ndarray        # (N,) normalised position along that edge
+    error_meters: np.ndarray  # (N,) point -> matched position
+    node_path: List[int]      # OSM ids, consecutive nodes share an edge
+                              # except at path_breaks
+    edge_path: List[int]      # edge index for every hop of node_path that
+                              # is not a path break
+    breaks: List[int]         # point indices where the chain restarted
+    path_breaks: List[int]    # node_path indices starting a piece that no
+                              # route joins to the previous node
+
+    @property
+    def node_paths(self) -> List[List[int]]:
+        """node_path split into its connected pieces."""
+        cuts = [0] + list(self.path_breaks) + [len(self.node_path)]
+        return [self.node_path[a:b] for a, b in zip(cuts[:-1], cuts[1:]) if b > a]
+
+
+class MapMatcher:
+    """HMM map matcher over one GraphArrays graph; see module docstring."""
+
+    def __init__(self, ga: GraphArrays, index=None):
+        self.ga = ga
+        self.index = index if index is not None else get_snap_index(ga)
+
+        # Python lists: csr_dijkstra indexes them element by element
+        self._indptr = np.asarray(ga.indptr).tolist()
+        self._targets = np.asarray(ga.targets).tolist()
+        self._lengths = np.asarray(ga.lengths, dtype=np.float64).tolist()
+
+        self._edge_len_m = shapely.length(self.index.geoms_m)
+
+    # ------------------------------------------------------------------
+    # Candidates
+    # ------------------------------------------------------------------
+
+    def candidates(self, x, y, k=MAX_CANDIDATES, radius_m=CANDIDATE_RADIUS_M):
+        """
+        (N, k) edge index, distance and offset of the k nearest usable edges
+        within radius_m of each projected point (edge -1 = no candidate).
+        Points with nothing in range keep their single nearest edge.
+        """
+        index = self.index
+        n = len(x)
+        pts = shapely.points(x, y)
+
+        p, item = index.tree.query(pts, predicate="dwithin", distance=radius_m)
+        near_p, near_item = index.tree.query_nearest(pts, all_matches=False)
+        lonely = np.setdiff1d(near_p, p)
+        p = np.concatenate([p, lonely])
+        item = np.concatenate([item, near_item[np.searchsorted(near_p, lonely)]])
+
+        edge = index.tree_rows[item]
+        usable = index.valid[edge]
+        p, edge = p[usable], edge[usable]
+        dist = shapely.distance(pts[p], index.geoms_m[edge])
+
+        # Keep the k closest per point, then order them by edge index so
+        # consecutive points with the same candidates give the same rows
+        order = np.lexsort((dist, p))
+        p, edge, dist = p[order], edge[order], dist[order]
+        rank = np.arange(len(p)) - np.searchsorted(p, p, side="left")
+        keep = rank < k
+        p, edge, dist = p[keep], edge[keep], dist[keep]
+        order = np.lexsort((edge, p))
+        p, edge, dist = p[order], edge[order], dist[order]
+        rank = np.arange(len(p)) - np.searchsorted(p, p, side="left")
+
+        cand_edge = np.full((n, k), -1, dtype=np.int64)
+        cand_dist = np.full((n, k), np.inf)
+        cand_off = np.full((n, k), np.nan)
+        cand_edge[p, rank] = edge
+        cand_dist[p, rank] = dist
+        cand_off[p, rank] = shapely.line_locate_point(
+            index.geoms_m[edge], pts[p], normalized=True
+        )
+        return cand_edge, cand_dist, cand_off
+
+    # ------------------------------------------------------------------
+    # Routes
+    # ------------------------------------------------------------------
+
+    def _routes_from(self, node, cutoff, cache):
+        """(dist, pred) from node, reusing a cached run with a large enough cutoff."""
+        hit = cache.get(node)
+        if hit is not None and hit[0] >= cutoff:
+            return hit[1], hit[2]
+        dist, pred = csr_dijkstra(self._indptr, self._targets, self._lengths, node, cutoff=cutoff)
+        cache[node] = (cutoff, dist, pred)
+        return dist, pred
+
+    def _end_nodes(self, edges):
+        """(K, 2) source / target node index of candidate edges (-1 padding kept)."""
+        ends = np.full((len(edges), 2), -1, dtype=np.int64)
+        ok = edges >= 0
+        ends[ok, 0] = self.ga.sources[edges[ok]]
+        ends[ok, 1] = self.ga.targets[edges[ok]]
+        return ends
+
+    def _node_distances(self, ends_i, ends_j, cutoff, cache):
+        """(Ki, 2, Kj, 2) network distance between candidate end nodes."""
+        from_nodes, from_inv = np.unique(ends_i, return_inverse=True)
+        to_nodes, to_inv = np.unique(ends_j, return_inverse=True)
+        targets = to_nodes.tolist()
+
+        sp = np.full((len(from_nodes), len(to_nodes)), np.inf)
+        for a, node_a in enumerate(from_nodes.tolist()):
+            if node_a < 0:
+                continue
+            dist, _ = self._routes_from(node_a, cutoff, cache)
+            sp[a] = [dist.get(node_b, np.inf) for node_b in targets]
+
+        # Padding (-1) never reaches anything
+        if targets[0] < 0:
+            sp[:, 0] = np.inf
+        rows = from_inv.reshape(ends_i.shape)[:, :, None, None]
+        cols = to_inv.reshape(ends_j.shape)[None, None]
+        return sp[rows, cols]
+
+    def _step_distances(self, cand_edge, cutoff, cache, cut=None):
+        """
+        (N-1, K, K, 4) network distance between the end nodes of the
+        candidates of every pair of consecutive points; the last axis is
+        2 x from_side + to_side (0 = edge source, 1 = edge target).
+        Steps marked in cut are not looked up (inf).
+
+        Candidate rows rarely change between consecutive points, so the
+        lookups are memoised per (rows, rounded-up cutoff).
+        """
+        n, k = cand_edge.shape
+        bound = _route_bounds(cutoff)
+        ends = self._end_nodes(cand_edge.ravel()).reshape(n, k, 2)
+        sp = np.empty((n - 1, k, k, 4))
+        memo = {}
+        for t in range(1, n):
+            if cut is not None and cut[t - 1]:
+                sp[t - 1] = np.inf
+                continue
+            key = (cand_edge[t - 1].tobytes(), cand_edge[t].tobytes(), bound[t - 1])
+            hit = memo.get(key)
+            if hit is None:
+                d = self._node_distances(ends[t - 1], ends[t], bound[t - 1], cache)
+                hit = memo[key] = d.transpose(0, 2, 1, 3).reshape(k, k, 4)
+            sp[t - 1] = hit
+        return sp
+
+    def _transitions(self, cand_edge, cand_off, straight, cache, cut=None):
+        """
+        (N-1, K, K) route lengths between the candidates of consecutive
+        points (inf beyond the cutoff, for padding or for steps in cut) and,
+        per pair, the end nodes the route leaves / enters by (see
+        _step_distances; -1 for moves along a single edge).
+        """
+        cutoff = straight * DETOUR_FACTOR + 2 * CANDIDATE_RADIUS_M
+        sp = self._step_distances(cand_edge, cutoff, cache, cut)
+
+        length = np.where(cand_edge >= 0, self._edge_len_m[cand_edge], np.nan)
+        to_source = cand_off * length
+        to_target = (1 - cand_off) * length
+        leave = np.stack([to_source, to_source, to_target, to_target], axis=2)
+        enter = np.stack([to_source, to_target, to_source, to_target], axis=2)
+
+        total = sp + leave[:-1, :, None, :] + enter[1:, None, :, :]
+        total = np.where(np.isnan(total), np.inf, total)
+        via = np.argmin(total, axis=3)
+        routes = np.take_along_axis(total, via[..., None], axis=3)[..., 0]
+
+        ei, ej = cand_edge[:-1, :, None], cand_edge[1:, None, :]
+        along = np.abs(cand_off[1:, None, :] - cand_off[:-1, :, None]) * length[:-1, :, None]
+        use_edge = (ei == ej) & (ei >= 0) & (along <= routes)
+        routes = np.where(use_edge, along, routes)
+        via = np.where(use_edge, -1, via)
+
+        routes[~(routes <= cutoff[:, None, None])] = np.inf
+        if cut is not None:
+            routes[cut] = np.inf
+        return routes, via
+
+    # ------------------------------------------------------------------
+    # Matching
+    # ------------------------------------------------------------------
+
+    def lattice(self, x, y, cache=None, cut=None):
+        """
+        Candidates, emission and transition scores for projected points:
+        (cand_edge, cand_off, emission, trans, via, cache). Pass a route
+        cache to share Dijkstra runs between calls on nearby points. Steps
+        t - 1 -> t marked in cut ((N-1,) bool) get no transition, so the
+        chain restarts at t (several tracks in one lattice).
+        """
+        cand_edge, cand_dist, cand_off = self.candidates(x, y)
+        emission = -0.5 * (cand_dist / GPS_SIGMA_M) ** 2
+        straight = np.hypot(np.diff(x), np.diff(y))
+
+        if cache is None:
+            cache: Dict[int, Tuple[float, dict, dict]] = {}
+        routes, via = self._transitions(cand_edge, cand_off, straight, cache, cut)
+        trans = -np.abs(routes - straight[:, None, None]) / TRANSITION_BETA_M
+        return cand_edge, cand_off, emission, trans, via, cache
+
+    def match(self, points) -> MatchResult:
+        """Map-match an (N, 2) array of (lat, lon) points."""
+        index = self.index
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        n = len(pts)
+        if n == 0:
+            raise ValueError("match() requires at least one point.")
+
+        x, y = to_metric(pts[:, 1], pts[:, 0], index.crs)
+        cand_edge, cand_off, emission, trans, via, cache = self.lattice(x, y)
+
+        back = np.zeros(cand_edge.shape, dtype=np.int64)
+        vias = np.full(cand_edge.shape, -1, dtype=np.int64)
+        breaks = [0]
+        finals = {}   # last point of each chain -> its Viterbi scores
+
+        viterbi_forward(emission[0], 1, emission, trans, via, back, vias, breaks, finals)
+        chosen = viterbi_backtrack(back, breaks, finals)
+
+        return self._result(pts, x, y, cand_edge, cand_off, chosen, vias, breaks, cache)
+
+    def _hop_nodes(self, node_a, node_b, cache, cutoff):
+        """
+        Node indices of the shortest route node_a -> node_b, from the
+        cache, or from a fresh bounded run if the route was scored elsewhere.
+        """
+        hit = cache.get(node_a)
+        if hit is None or (node_b != node_a and node_b not in hit[2]):
+            self._routes_from(node_a, cutoff, cache)
+        _, _, pred = cache[node_a]
+        path = [node_b]
+        while path[-1] != node_a:
+            path.append(pred[path[-1]])
+        return path[::-1]
+
+    def _result(self, pts, x, y, cand_edge, cand_off, chosen, vias, breaks, cache):
+        ga, index = self.ga, self.index
+        n = len(pts)
+        rows = np.arange(n)
+        edge = cand_edge[rows, chosen]
+        offset = cand_off[rows, chosen]
+
+        # Points without any usable candidate stay unmatched (NaN)
+        xy = np.full((n, 2), np.nan)
+        ok = edge >= 0
+        proj = shapely.line_interpolate_point(index.geoms_m[edge[ok]], offset[ok], normalized=True)
+        xy[ok] = shapely.get_coordinates(proj)
+        snapped_lon, snapped_lat = from_metric(xy[:, 0], xy[:, 1], index.crs)
+
+        # Connected node path: between consecutive matches either stay on
+        # the edge or follow the cached route between the chosen end nodes;
+        # a restarted chain is joined by a bounded route where one exists
+        nodes: List[int] = []
+        path_breaks: List[int] = []
+        restarts = set(breaks)
+
+        def _visit(node):
+            if not nodes or nodes[-1] != node:
+                nodes.append(node)
+
+        def _enter(node):
+            if nodes:
+                route = self.join_nodes(nodes[-1], node, cache, BRIDGE_CUTOFF_M)
+                if route is None:
+                    path_breaks.append(len(nodes))
+                    route = [node]
+                for hop in route:
+                    _visit(hop)
+            else:
+                _visit(node)
+
+        ends = self._end_nodes(edge)
+        via = vias[rows, chosen]
+        bound = _route_bounds(np.hypot(np.diff(x), np.diff(y)) * DETOUR_FACTOR
+                              + 2 * CANDIDATE_RADIUS_M)
+        for t in range(n):
+            if t not in restarts and via[t] >= 0:
+                node_a = int(ends[t - 1, via[t] // 2])
+                node_b = int(ends[t, via[t] % 2])
+                for node in self._hop_nodes(node_a, node_b, cache, bound[t - 1]):
+                    _visit(node)
+            if (not nodes or t in restarts) and edge[t] >= 0:
+                _enter(int(ends[t, 0] if offset[t] <= 0.5 else ends[t, 1]))
+
+        edge_path = path_edges(ga, nodes, path_breaks)
+
+        return MatchResult(
+            snapped_lat=snapped_lat,
+            snapped_lon=snapped_lon,
+            edge=edge,
+            offset=offset,
+            error_meters=np.hypot(xy[:, 0] - x, xy[:, 1] - y),
+            node_path=[int(i) for i in ga.node_ids[nodes]],
+            edge_path=edge_path,
+            breaks=breaks,
+            path_breaks=path_breaks,
+        )
+
+    def join_nodes(self, node_a, node_b, cache, cutoff=None):
+        """
+        Node indices of a route node_a -> node_b of at most cutoff, else
+        None. cutoff defaults to the bound a transition over the straight
+        distance between the nodes gets.
+        """
+        if node_a == node_b:
+            return [node_b]
+        if cutoff is None:
+            ga = self.ga
+            straight = haversine_m(ga.node_y[node_a], ga.node_x[node_a],
+                                   ga.node_y[node_b], ga.node_x[node_b])
+            cutoff = float(_route_bounds(straight * DETOUR_FACTOR + 2 * CANDIDATE_RADIUS_M))
+        dist, _ = self._routes_from(node_a, cutoff, cache)
+        if node_b not in dist:
+            return None
+        return self._hop_nodes(node_a, node_b, cache, cutoff)
+
+
+def path_edges(ga: GraphArrays, nodes, path_breaks=()) -> List[int]:
+    """Edge index of every hop between node indices, skipping path breaks."""
+    jumps = set(path_breaks)
+    edge_path = []
+    for i, (u, v) in enumerate(zip(nodes[:-1], nodes[1:]), start=1):
+        if i in jumps:
+            continue
+        e = ga.find_edge(u, v)
+        edge_path.append(e if e is not None else ga.find_edge(v, u))
+    return edge_path
+
+
+# -------------------------------------------------------------------
+# Viterbi
+# -------------------------------------------------------------------
+
+def _route_bounds(cutoff):
+    """Route cutoffs rounded up to ROUTE_CUTOFF_STEP_M."""
+    return np.ceil(cutoff / ROUTE_CUTOFF_STEP_M) * ROUTE_CUTOFF_STEP_M
+
+
+def viterbi_forward(score, start, emission, trans, via, back, vias, breaks, finals):
+    """
+    Viterbi recursion from point start (score: normalised scores at
+    start - 1) to the end of emission. Fills back / vias rows, appends chain
+    restarts to breaks and stores the final scores of every chain in finals.
+    trans / via rows are indexed by point - 1, like MapMatcher.lattice.
+    """
+    n = len(emission)
+    cols = np.arange(emission.shape[1])
+    for t in range(start, n):
+        total = score[:, None] + trans[t - 1]
+        best = np.argmax(total, axis=0)
+        best_total = total[best, cols]
+
+        if np.isfinite(best_total).any():
+            back[t] = best
+            vias[t] = via[t - 1, best, cols]
+            score = best_total + emission[t]
+        else:
+            # No route from any previous candidate: restart the chain
+            finals[t - 1] = score
+            breaks.append(t)
+            score = emission[t]
+
+        top = score.max()
+        if np.isfinite(top):
+            score = score - top
+    finals[n - 1] = score
+    return score
+
+
+def viterbi_backtrack(back, breaks, finals):
+    """Chosen candidate column per point, backtracking every chain."""
+    n = len(back)
+    chosen = np.zeros(n, dtype=np.int64)
+    for start, end in zip(breaks, breaks[1:] + [n]):
+        chosen[end - 1] = int(np.argmax(finals[end - 1]))
+        for t in range(end - 1, start, -1):
+            chosen[t - 1] = back[t, chosen[t]]
+    return chosen
+
+
+# -------------------------------------------------------------------
+# Memoised access
+# -------------------------------------------------------------------
+
+def get_map_matcher(G) -> MapMatcher:
+    """
+    MapMatcher for G (GraphArrays, EdgeStore or networkx), one per graph
+    fingerprint. A networkx graph or EdgeStore is only expanded into
+    GraphArrays the first time its version is seen; the matcher keeps the
+    only copy.
+    """
+    fp = graph_fingerprint(G)
+    matcher = _MATCHERS.get(fp)
+    if matcher is not None:
+        _MATCHERS.move_to_end(fp)
+        return matcher
+
+    if isinstance(G, EdgeStore):
+        G = G.to_graph_arrays()
+    elif not isinstance(G, GraphArrays):
+        G = GraphArrays.from_graph(G)
+        G.meta["fingerprint"] = arrays_fingerprint(fp)
+    matcher = _MATCHERS[fp] = MapMatcher(G, index=get_snap_index(G))
+    while len(_MATCHERS) > MEMO_SIZE:
+        _MATCHERS.popitem(last=False)
+    return matcher
+
+
+def match_points(G, points) -> MatchResult:
+    """Map-match (lat, lon) points on G; see MapMatcher."""
+    return get_map_matcher(G).match(points)
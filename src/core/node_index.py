@@ -0,0 +1,106 @@
+# src/core/node_index.py
+
+"""
+Nearest-node index over projected node coordinates.
+
+A cKDTree over the nodes in the graph's local metric CRS (see
+projection.py), so k-nearest and radius queries are in metres and cost
+microseconds per point. Built once per graph version: every SnapIndex
+carries one (SnapIndex.nodes), and snap_index.get_node_index() returns it,
+or a standalone index for tools that never snap.
+
+Queries take (N, 2) arrays of (lat, lon) points, like snap_points_fast;
+the *_xy variants take points already projected into crs and return index
+positions instead of OSM ids.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from src.core.projection import metric_crs, to_metric
+
+
+@dataclass
+class NodeIndex:
+    fingerprint: str
+    crs: str
+    node_ids: np.ndarray
+    node_x: np.ndarray        # lon
+    node_y: np.ndarray        # lat
+    xy_m: np.ndarray          # (n, 2) projected into crs
+    tree: cKDTree
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_parts(cls, fingerprint, node_ids, node_x, node_y, crs=None) -> "NodeIndex":
+        """Index nodes given as lon/lat arrays; crs defaults to the bbox UTM zone."""
+        if crs is None:
+            crs = metric_crs(
+                (node_x.min() + node_x.max()) / 2, (node_y.min() + node_y.max()) / 2
+            )
+        px, py = to_metric(node_x, node_y, crs)
+        xy_m = np.column_stack([px, py])
+        return cls(
+            fingerprint=fingerprint,
+            crs=crs,
+            node_ids=node_ids,
+            node_x=node_x,
+            node_y=node_y,
+            xy_m=xy_m,
+            tree=cKDTree(xy_m),
+        )
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def project(self, points):
+        """(N, 2) (lat, lon) points -> (N, 2) metric coordinates."""
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        x, y = to_metric(pts[:, 1], pts[:, 0], self.crs)
+        return np.column_stack([x, y])
+
+    def nearest_xy(self, xy, k=1):
+        """
+        (dist_m, positions) of the k nearest nodes to each projected point;
+        shapes (N,) for k=1, else (N, k) ordered by distance.
+        """
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        k = min(k, len(self))
+        if len(xy) == 0:
+            shape = (0,) if k == 1 else (0, k)
+            return np.empty(shape), np.empty(shape, dtype=np.int64)
+        dist, pos = self.tree.query(xy, k=k)
+        return dist, pos.astype(np.int64)
+
+    def nearest(self, points, k=1):
+        """(dist_m, OSM node ids) of the k nearest nodes to each (lat, lon)."""
+        dist, pos = self.nearest_xy(self.project(points), k=k)
+        return dist, self.node_ids[pos]
+
+    def within_xy(self, xy, radius_m):
+        """Per projected point, positions of all nodes within radius_m, nearest first."""
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        if len(xy) == 0:
+            return []
+        hits = self.tree.query_ball_point(xy, r=radius_m)
+        out = []
+        for p, rows in zip(xy, hits):
+            rows = np.asarray(rows, dtype=np.int64)
+            d = np.hypot(*(self.xy_m[rows] - p).T)
+            out.append(rows[np.argsort(d, kind="stable")])
+        return out
+
+    def within(self, points, radius_m):
+        """Per (lat, lon) point, OSM ids of all nodes within radius_m, nearest first."""
+        return [self.node_ids[rows] for rows in self.within_xy(self.project(points), radius_m)]
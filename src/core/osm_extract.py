@@ -0,0 +1,264 @@
+# src/core/osm_extract.py
+
+"""
+Offline graph builder for local OSM extracts (.osm / .osm.gz XML or .osm.pbf).
+
+The extract is streamed twice:
+
+    pass 1  ways   -> keep walkable ways, store their node refs in a flat array
+    pass 2  nodes  -> look up coordinates for referenced nodes only
+
+Node refs and coordinates live in numpy / array.array buffers, never in
+per-element Python objects, and no networkx graph is built: the result goes
+straight into graph snapshot arrays (see graph_snapshot.py). The topology is
+kept dense (one edge per consecutive node pair, like simplify=False), and
+every segment is stored in both directions, as osmnx does for walk networks.
+
+PBF input needs the optional `osmium` package (pip install osmium).
+"""
+
+import gzip
+import re
+import time
+import xml.etree.ElementTree as ET
+from array import array
+
+import numpy as np
+
+from src.core.graph_snapshot import arrays_from_edge_list, write_snapshot_arrays
+from src.core.preprocessing import haversine_m_np
+
+# Bump whenever the filter or edge construction changes
+EXTRACT_VERSION = 1
+
+# Same exclusions as osmnx's "walk" network_type filter
+_EXCLUDED = {
+    "highway": re.compile(
+        "abandoned|bus_guideway|construction|cycleway|motor|no|planned|platform|"
+        "proposed|raceway|razed|rest_area|services"
+    ),
+    "area": re.compile("yes"),
+    "access": re.compile("private"),
+    "foot": re.compile("no"),
+    "service": re.compile("private"),
+    "sidewalk": re.compile("separate"),
+    "sidewalk:both": re.compile("separate"),
+    "sidewalk:left": re.compile("separate"),
+    "sidewalk:right": re.compile("separate"),
+}
+
+
+def is_walkable(tags):
+    """True if a way's tags pass the walk network filter."""
+    if "highway" not in tags:
+        return False
+    for key, pattern in _EXCLUDED.items():
+        value = tags.get(key)
+        if value is not None and pattern.search(value):
+            return False
+    return True
+
+
+# -------------------------------------------------------------------
+# Streaming readers
+# -------------------------------------------------------------------
+
+class _WayBuffer:
+    """Flat, append-only storage of way node refs."""
+
+    def __init__(self):
+        self.refs = array("q")
+        self.offsets = array("q", [0])
+        self.num_seen = 0
+
+    def add(self, refs):
+        self.refs.extend(refs)
+        self.offsets.append(len(self.refs))
+
+
+def _open_xml(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def _iter_xml(path, tag):
+    """Yield fully parsed <tag> elements, clearing parsed elements as we go."""
+    with _open_xml(path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end":
+                continue
+            if elem.tag == tag:
+                yield elem
+            if elem.tag in ("node", "way", "relation"):
+                root.clear()
+
+
+def _read_ways_xml(path, ways):
+    for elem in _iter_xml(path, "way"):
+        ways.num_seen += 1
+        tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+        if is_walkable(tags):
+            ways.add(int(nd.get("ref")) for nd in elem.iter("nd"))
+
+
+def _read_nodes_xml(path, wanted, lon, lat):
+    for elem in _iter_xml(path, "node"):
+        nid = int(elem.get("id"))
+        i = np.searchsorted(wanted, nid)
+        if i < len(wanted) and wanted[i] == nid:
+            lon[i] = float(elem.get("lon"))
+            lat[i] = float(elem.get("lat"))
+
+
+def _alloc_nodes(ways):
+    """Sorted ids of every referenced node plus NaN-filled lon/lat buffers."""
+    wanted = np.unique(np.frombuffer(ways.refs, dtype=np.int64))
+    return wanted, np.full(len(wanted), np.nan), np.full(len(wanted), np.nan)
+
+
+def _read_pbf(path, ways):
+    try:
+        import osmium
+    except ImportError as e:
+        raise ImportError(
+            "Reading .pbf extracts requires the 'osmium' package (pip install osmium)."
+        ) from e
+
+    class WayHandler(osmium.SimpleHandler):
+        def way(self, w):
+            ways.num_seen += 1
+            if is_walkable({t.k: t.v for t in w.tags}):
+                ways.add(n.ref for n in w.nodes)
+
+    WayHandler().apply_file(path, locations=False)
+    wanted, lon, lat = _alloc_nodes(ways)
+
+    class NodeHandler(osmium.SimpleHandler):
+        def node(self, n):
+            i = np.searchsorted(wanted, n.id)
+            if i < len(wanted) and wanted[i] == n.id:
+                lon[i] = n.location.lon
+                lat[i] = n.location.lat
+
+    NodeHandler().apply_file(path, locations=False)
+    return wanted, lon, lat
+
+
+def _read_xml(path, ways):
+    _read_ways_xml(path, ways)
+    wanted, lon, lat = _alloc_nodes(ways)
+    _read_nodes_xml(path, wanted, lon, lat)
+    return wanted, lon, lat
+
+
+# -------------------------------------------------------------------
+# Arrays
+# -------------------------------------------------------------------
+
+def _segments(ways):
+    """(u, v) OSM-id pairs for consecutive refs within each way."""
+    refs = np.frombuffer(ways.refs, dtype=np.int64)
+    offsets = np.frombuffer(ways.offsets, dtype=np.int64)
+
+    # Pair i -> i+1 is a segment unless i is the last ref of its way
+    is_last = np.zeros(len(refs), dtype=bool)
+    is_last[offsets[1:] - 1] = True
+    starts = np.flatnonzero(~is_last[:-1]) if len(refs) > 1 else np.empty(0, np.int64)
+    return refs[starts], refs[starts + 1]
+
+
+def extract_to_arrays(path, bbox=None, report=True):
+    """
+    Stream an OSM extract into snapshot arrays.
+
+    bbox : optional (min_lat, max_lat, min_lon, max_lon); segments with an
+           endpoint outside it are dropped.
+    Returns (arrays, stats).
+    """
+    t0 = time.perf_counter()
+    ways = _WayBuffer()
+    reader = _read_pbf if path.endswith(".pbf") else _read_xml
+    wanted, lon, lat = reader(path, ways)
+
+    t_parse = time.perf_counter() - t0
+
+    # Segments, restricted to nodes with coordinates (and inside bbox)
+    u, v = _segments(ways)
+    ui = np.searchsorted(wanted, u)
+    vi = np.searchsorted(wanted, v)
+    keep = (u != v) & ~np.isnan(lon[ui]) & ~np.isnan(lon[vi])
+    if bbox is not None:
+        min_lat, max_lat, min_lon, max_lon = bbox
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        keep &= inside[ui] & inside[vi]
+    ui, vi = ui[keep], vi[keep]
+
+    # Both directions
+    src = np.concatenate([ui, vi])
+    dst = np.concatenate([vi, ui])
+
+    # Parallel edges get keys 0, 1, ... in order of appearance
+    order = np.lexsort((np.arange(len(src)), dst, src))
+    pair = src[order] * len(wanted) + dst[order]
+    new_group = np.concatenate([[True], pair[1:] != pair[:-1]]) if len(pair) else pair.astype(bool)
+    group_start = np.maximum.accumulate(np.where(new_group, np.arange(len(pair)), 0))
+    keys = np.empty(len(src), dtype=np.int64)
+    keys[order] = np.arange(len(pair)) - group_start
+
+    used = np.unique(np.concatenate([src, dst]))
+    coords = np.empty((2 * len(src), 2), dtype=np.float64)
+    coords[0::2, 0], coords[0::2, 1] = lon[src], lat[src]
+    coords[1::2, 0], coords[1::2, 1] = lon[dst], lat[dst]
+
+    edges = {
+        "src": wanted[src],
+        "dst": wanted[dst],
+        "keys": keys,
+        "lengths": haversine_m_np(lat[src], lon[src], lat[dst], lon[dst]),
+        "has_geometry": np.zeros(len(src), dtype=bool),
+        "geom_offsets": np.arange(0, 2 * len(src) + 1, 2, dtype=np.int64),
+        "geom_coords": coords,
+    }
+    arrays = arrays_from_edge_list(wanted[used], lon[used], lat[used], edges)
+
+    elapsed = time.perf_counter() - t0
+    stats = {
+        "ways_seen": ways.num_seen,
+        "ways_kept": len(ways.offsets) - 1,
+        "num_nodes": int(len(arrays["node_ids"])),
+        "num_edges": int(len(arrays["targets"])),
+        "parse_seconds": round(t_parse, 3),
+        "total_seconds": round(elapsed, 3),
+        "ways_per_second": round(ways.num_seen / t_parse, 1) if t_parse > 0 else None,
+    }
+    if report:
+        print(
+            f"Parsed {stats['ways_seen']} ways ({stats['ways_kept']} walkable) "
+            f"at {stats['ways_per_second']} ways/s; "
+            f"{stats['num_nodes']} nodes, {stats['num_edges']} edges "
+            f"in {elapsed:.2f} s"
+        )
+    return arrays, stats
+
+
+def build_snapshot_from_extract(path, snapshot_path, bbox=None):
+    """Stream an OSM extract and write the walk graph as a snapshot."""
+    arrays, stats = extract_to_arrays(path, bbox=bbox)
+    return write_snapshot_arrays(
+        arrays,
+        snapshot_path,
+        source=path,
+        extract_version=EXTRACT_VERSION,
+        extract_stats=stats,
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python -m src.core.osm_extract <extract.osm|.osm.pbf> <out_snapshot_dir>")
+        sys.exit(1)
+
+    build_snapshot_from_extract(sys.argv[1], sys.argv[2])
@@ -1,6 +1,8 @@
 import math
 from typing import List, Tuple
 
+import numpy as np
+
 Point = Tuple[float, float]
 
 
@@ -16,6 +18,19 @@ def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return R * c
 
 
+def haversine_m_np(lat1, lon1, lat2, lon2):
+    """Vectorised haversine_m over numpy arrays (broadcasting)."""
+    R = 6371000.0
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = np.radians(np.subtract(lat2, lat1))
+    dlambda = np.radians(np.subtract(lon2, lon1))
+
+    a = np.sin(dphi / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2.0) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return R * c
+
+
 def remove_duplicates(points: List[Point]) -> List[Point]:
     if not points:
         return []
@@ -0,0 +1,29 @@
+# src/core/regions.py
+
+"""
+Named graph regions for the offline build pipeline (see build_graph.py).
+Bounding boxes are in degrees, EPSG:4326.
+"""
+
+REGIONS = {
+    "amsterdam_east": {
+        "north": 52.390,
+        "south": 52.340,
+        "east": 4.990,
+        "west": 4.870,
+        "network_type": "walk",
+    },
+}
+
+
+def get_region(name):
+    if name not in REGIONS:
+        raise KeyError(f"Unknown region '{name}'. Known regions: {sorted(REGIONS)}")
+    return dict(REGIONS[name], name=name)
+
+
+def region_polygon(region):
+    """Shapely polygon of a region's bounding box."""
+    from shapely.geometry import box
+
+    return box(region["west"], region["south"], region["east"], region["north"])
@@ -9,11 +9,12 @@ if PROJECT_ROOT not in sys.path:
 import osmnx as ox
 import numpy as np
 from shapely.geometry import LineString
+from src.core.graph_patch import PATCH_PATH, append_patch
 from src.core.preprocessing import haversine_m
+from src.core.snap_index import drop_fingerprint
 
 
 GRAPH_PATH_IN  = os.path.join(PROJECT_ROOT, "data/osm_cache/amsterdam_east_master_dense.graphml")
-GRAPH_PATH_OUT = os.path.join(PROJECT_ROOT, "data/osm_cache/amsterdam_east_master_dense_repaired.graphml")
 
 
 # ---------------------------------------------------------
@@ -24,6 +25,7 @@ def add_edge_between_nodes(G, u, v, x_u, y_u, x_v, y_v):
     geom = LineString([(x_u, y_u), (x_v, y_v)])
     length = haversine_m(y_u, x_u, y_v, x_v)
 
+    drop_fingerprint(G)
     G.add_edge(u, v, geometry=geom, length=length)
     G.add_edge(v, u, geometry=geom, length=length)
     return G
@@ -42,7 +44,7 @@ def main():
     gdf_nodes = ox.graph_to_gdfs(G, nodes=True, edges=False)
 
     print("\nInteractive edge adding mode.")
-    print("Type 'done' to stop and save.")
+    print("Type 'done' to stop and write the patch file.")
     print("Type 'show' to list all edges added so far.")
     print("----------------------------------------------------")
 
@@ -87,9 +89,10 @@ def main():
         print(f"Added edge: {u} <-> {v}")
         print("Total edges now:", len(G.edges()))
 
-    # Save
-    print("\nSaving repaired graph to:", GRAPH_PATH_OUT)
-    ox.save_graphml(G, GRAPH_PATH_OUT)
+    # Append only the new connectors; graph_loader applies them on load
+    print("\nAppending added edges to:", PATCH_PATH)
+    for (u, v) in added_edges:
+        append_patch("add", u, v, source="repair_multiple_gaps")
     print("Done. Added", len(added_edges), "edges.")
 
 
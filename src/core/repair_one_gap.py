@@ -7,16 +7,16 @@ if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
 import osmnx as ox
-import numpy as np
 from shapely.geometry import LineString
+from src.core.graph_patch import PATCH_PATH, append_patch
 from src.core.preprocessing import haversine_m
+from src.core.snap_index import drop_fingerprint, get_node_index
 
 # -------------------------------------------------------------------
 # Paths
 # -------------------------------------------------------------------
 
 GRAPH_PATH_IN  = os.path.join(PROJECT_ROOT, "data/osm_cache/amsterdam_east_master_dense.graphml")
-GRAPH_PATH_OUT = os.path.join(PROJECT_ROOT, "data/osm_cache/amsterdam_east_master_dense_repaired.graphml")
 
 # Target location of the known gap
 TARGET_LAT = 52.368954
@@ -28,13 +28,9 @@ TARGET_LON = 4.9372609
 # -------------------------------------------------------------------
 
 def nearest_nodes_k(G, lon, lat, k=5):
-    gdf_nodes = ox.graph_to_gdfs(G, nodes=True, edges=False)
-    xs = gdf_nodes.x.values
-    ys = gdf_nodes.y.values
-
-    d = (xs - lon)**2 + (ys - lat)**2
-    idxs = np.argsort(d)[:k]
-    return gdf_nodes.iloc[idxs]
+    """(node_ids, distances in metres) of the k nearest nodes, nearest first."""
+    dist, ids = get_node_index(G).nearest([(lat, lon)], k=k)
+    return ids.reshape(-1), dist.reshape(-1)
 
 
 # -------------------------------------------------------------------
@@ -45,6 +41,7 @@ def add_edge_between_nodes(G, u, v, x_u, y_u, x_v, y_v):
     geom = LineString([(x_u, y_u), (x_v, y_v)])
     length = haversine_m(y_u, x_u, y_v, x_v)
 
+    drop_fingerprint(G)
     G.add_edge(u, v, geometry=geom, length=length)
     G.add_edge(v, u, geometry=geom, length=length)
 
@@ -61,26 +58,24 @@ def main():
     print("Graph loaded.")
 
     print("\nNearest nodes to:", TARGET_LAT, TARGET_LON)
-    nearest = nearest_nodes_k(G, TARGET_LON, TARGET_LAT, k=5)
-    print(nearest[["y", "x"]])
+    ids, dists = nearest_nodes_k(G, TARGET_LON, TARGET_LAT, k=5)
+    for nid, d in zip(ids.tolist(), dists.tolist()):
+        node = G.nodes[nid]
+        print(f"  {nid}  y={node['y']:.7f}  x={node['x']:.7f}  ({d:.1f} m)")
     print("\nNode IDs:")
-    print(nearest.index.values)
+    print(ids)
 
     print("\nPick TWO node IDs above that should be connected.")
     u = int(input("Enter first node ID: ").strip())
     v = int(input("Enter second node ID: ").strip())
 
-    gdf_nodes = ox.graph_to_gdfs(G, nodes=True, edges=False)
-
-    x_u = float(gdf_nodes.loc[u].x)
-    y_u = float(gdf_nodes.loc[u].y)
-    x_v = float(gdf_nodes.loc[v].x)
-    y_v = float(gdf_nodes.loc[v].y)
-
-    G = add_edge_between_nodes(G, u, v, x_u, y_u, x_v, y_v)
+    if u not in G.nodes or v not in G.nodes:
+        print("One of the node IDs is not in the graph.")
+        return
 
-    print("\nSaving repaired graph to:", GRAPH_PATH_OUT)
-    ox.save_graphml(G, GRAPH_PATH_OUT)
+    # Only the new connector is recorded; graph_loader applies it on load
+    append_patch("add", u, v, source="repair_one_gap")
+    print("\nAppended edge", u, "<->", v, "to:", PATCH_PATH)
     print("Done.")
 
 
@@ -2,6 +2,8 @@ from typing import List
 
 import osmnx as ox
 
+from src.core.edge_store import EdgeStore
+from src.core.graph_arrays import GraphArrays
 from src.core.preprocessing import haversine_m, Point
 
 
@@ -9,7 +11,11 @@ def shortest_path(G, start_node: int, end_node: int, weight: str = "length") ->
     """
     Thin wrapper around osmnx shortest path.
     Returns a list of node ids from start_node to end_node.
+    GraphArrays graphs are routed on their CSR arrays directly, EdgeStores
+    on their row adjacency.
     """
+    if isinstance(G, (GraphArrays, EdgeStore)):
+        return G.shortest_path(start_node, end_node)
     return ox.shortest_path(G, start_node, end_node, weight=weight)
 
 
@@ -21,6 +27,11 @@ def path_length_m(G, node_path: List[int]) -> float:
     if len(node_path) < 2:
         return 0.0
 
+    if isinstance(G, GraphArrays):
+        return _path_length_arrays(G, node_path)
+    if isinstance(G, EdgeStore):
+        return _path_length_store(G, node_path)
+
     total = 0.0
 
     for u, v in zip(node_path[:-1], node_path[1:]):
@@ -40,6 +51,40 @@ def path_length_m(G, node_path: List[int]) -> float:
     return total
 
 
+def _path_length_arrays(ga: GraphArrays, node_path: List[int]) -> float:
+    """path_length_m for GraphArrays graphs."""
+    idx = ga.node_index(node_path)
+    total = 0.0
+
+    for u, v in zip(idx[:-1], idx[1:]):
+        edge = ga.find_edge(u, v)
+        if edge is not None:
+            total += float(ga.lengths[edge])
+            continue
+
+        lat_u, lon_u = ga.node_latlon(u)
+        lat_v, lon_v = ga.node_latlon(v)
+        total += haversine_m(lat_u, lon_u, lat_v, lon_v)
+
+    return total
+
+
+def _path_length_store(store: EdgeStore, node_path: List[int]) -> float:
+    """path_length_m for EdgeStore graphs."""
+    idx = store.node_index(node_path)
+    total = 0.0
+
+    for u, v in zip(idx[:-1], idx[1:]):
+        row = store.find_row(u, v)
+        if row is not None:
+            total += float(store.lengths[row])
+            continue
+
+        total += haversine_m(store.node_y[u], store.node_x[u], store.node_y[v], store.node_x[v])
+
+    return total
+
+
 def approximate_polyline_length(points: List[Point]) -> float:
     """
     Utility for computing length of a coordinate polyline without graph context.
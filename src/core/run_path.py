@@ -2,13 +2,24 @@
 
 from __future__ import annotations
 
+import time
 from dataclasses import dataclass
 from typing import List, Tuple, Optional, Dict, Any
 
-import osmnx as ox
+import numpy as np
 
+from src.core.chunked_matching import CHUNK_SIZE, match_points_chunked, snap_points_chunked
+from src.core.map_matching import MatchResult, match_points
 from src.core.preprocessing import preprocess_points, haversine_m, Point
-from src.core.snapping_fast import snap_points_fast
+from src.core.snap_index import get_snap_index
+from src.core.snapping_fast import records_from_columns, snap_points_columnar
+from src.core.tiered_matching import match_points_tiered
+
+
+# "nearest": snap every point to its own nearest edge
+# "hmm":     HMM map matching over the whole run (see map_matching.py)
+# "tiered":  nearest edge, HMM only on ambiguous windows (see tiered_matching.py)
+MATCH_MODES = ("nearest", "hmm", "tiered")
 
 
 @dataclass
@@ -29,8 +40,9 @@ class RunPath:
     This wraps:
       - raw GPS points
       - cleaned points (duplicates + speed spikes removed)
-      - snapped points (projected to nearest OSM edges)
-      - corresponding graph nodes (nearest node on each edge)
+      - snapped points (projected to nearest OSM edges, or map-matched)
+      - corresponding graph nodes (nearest node on each edge, or the
+        connected matched path)
       - basic statistics such as total distance
     """
 
@@ -39,19 +51,43 @@ class RunPath:
         G,
         latlng: List[Point],
         times: Optional[List[float]] = None,
+        mode: str = "nearest",
+        workers: int = 1,
+        chunk_size: int = CHUNK_SIZE,
     ) -> None:
         """
         Parameters
         ----------
-        G : networkx.MultiDiGraph
-            OSM graph loaded via graph_loader.load_graph.
+        G : networkx.MultiDiGraph, GraphArrays or EdgeStore
+            OSM graph loaded via graph_loader.load_graph, or its array forms
+            from graph_loader.load_graph_arrays / load_edge_store.
         latlng : list[(lat, lon)]
             Raw GPS coordinates from Strava streams, in (lat, lon) order.
         times : list[float] or None
             Optional time stream (seconds) aligned with latlng, for speed spike removal.
+        mode : str
+            "nearest" (default), "hmm" or "tiered"; see MATCH_MODES.
+        workers, chunk_size : int
+            With workers > 1, tracks longer than chunk_size points are
+            snapped / matched in parallel chunks (see chunked_matching.py);
+            the result is the same. Not supported in tiered mode.
         """
         if not latlng:
             raise ValueError("RunPath requires at least one GPS point.")
+        if mode not in MATCH_MODES:
+            raise ValueError(f"Unknown mode '{mode}'. Expected one of {MATCH_MODES}.")
+        if mode == "tiered" and workers > 1:
+            # Tiered matching only map-matches short windows; there is no
+            # chunked version of it
+            raise ValueError("workers > 1 is not supported in tiered mode.")
+
+        self.mode = mode
+        self.match: Optional[MatchResult] = None
+        self.snapped_columns: Optional[Dict[str, np.ndarray]] = None
+
+        # Seconds spent per stage: clean, snap, nodes, stats
+        self.timings: Dict[str, float] = {}
+        t0 = time.perf_counter()
 
         self.G = G
 
@@ -60,59 +96,101 @@ class RunPath:
 
         # 2. Clean points (remove duplicates, speed spikes)
         self.clean_points: List[Point] = preprocess_points(latlng, times)
-
-        # 3. Snap to OSM edges (using your fast STRtree-based snapping)
-        self.snapped_records: List[Dict[str, Any]] = snap_points_fast(G, self.clean_points)
+        t0 = self._lap("clean", t0)
+
+        # 3. Snap to OSM edges (using your fast STRtree-based snapping), or
+        #    map-match the whole run
+        if mode == "hmm":
+            if workers > 1:
+                self.match = match_points_chunked(
+                    self.G, self.clean_points, chunk_size=chunk_size, workers=workers
+                )
+            else:
+                self.match = match_points(self.G, self.clean_points)
+            self.snapped_records: List[Dict[str, Any]] = self._records_from_match()
+        elif mode == "tiered":
+            self.match = match_points_tiered(self.G, self.clean_points)
+            self.snapped_records = self._records_from_match()
+        else:
+            index = get_snap_index(self.G)
+            if workers > 1:
+                self.snapped_columns = snap_points_chunked(
+                    self.G, self.clean_points, chunk_size=chunk_size, workers=workers
+                )
+            else:
+                self.snapped_columns = snap_points_columnar(self.G, self.clean_points, index=index)
+            self.snapped_records = records_from_columns(index, self.snapped_columns)
 
         # 4. Extract snapped coordinates
         self.snapped_points: List[Point] = [
             (rec["snapped_lat"], rec["snapped_lon"]) for rec in self.snapped_records
         ]
+        t0 = self._lap("snap", t0)
 
         # 5. Map snapped points to nearest graph nodes
         self.node_sequence: List[int] = self._compute_node_sequence()
 
+        # node_sequence indices where a matched path jumps between pieces
+        # that no route joins (e.g. disconnected graph components)
+        self.path_breaks: List[int] = list(self.match.path_breaks) if self.match else []
+        if self.path_breaks:
+            print(f"DEBUG: matched path has {len(self.path_breaks)} unconnected jumps "
+                  f"(node_sequence indices {self.path_breaks})")
+
         if not self.node_sequence:
             raise RuntimeError("Failed to compute a node sequence for this run.")
 
         self.start_node: int = self.node_sequence[0]
         self.end_node: int = self.node_sequence[-1]
+        t0 = self._lap("nodes", t0)
 
         # 6. Basic stats
         self.stats: RunPathStats = self._compute_stats()
+        self._lap("stats", t0)
 
     # ------------------------------------------------------------------
     # Core internal methods
     # ------------------------------------------------------------------
 
+    def _lap(self, stage: str, t0: float) -> float:
+        """Record the time since t0 under stage; returns the new start time."""
+        t1 = time.perf_counter()
+        self.timings[stage] = t1 - t0
+        return t1
+
     def _compute_node_sequence(self) -> List[int]:
         """
-        For each snapped point, find the nearest edge, then pick the closest of its
-        two endpoint nodes (u or v). Returns a deduplicated node sequence.
+        For each snapped point, take the closer endpoint of its snapped edge
+        (u if it lies in the first half of the edge, else v). The snapper
+        already reports both, so no second spatial search is needed.
+        Returns a deduplicated node sequence.
         """
-        G = self.G
-        nodes: List[int] = []
-
-        for lat, lon in self.snapped_points:
-            # ox.distance.nearest_edges expects (x=lon, y=lat)
-            u, v, key = ox.distance.nearest_edges(G, lon, lat)
-
-            node_u = G.nodes[u]
-            node_v = G.nodes[v]
-
-            d_u = haversine_m(lat, lon, node_u["y"], node_u["x"])
-            d_v = haversine_m(lat, lon, node_v["y"], node_v["x"])
-
-            closest_node = u if d_u <= d_v else v
-            nodes.append(closest_node)
-
-        # Remove consecutive duplicates to obtain a simplified node sequence
-        simplified: List[int] = []
-        for nid in nodes:
-            if not simplified or simplified[-1] != nid:
-                simplified.append(nid)
-
-        return simplified
+        if self.match is not None:
+            # Already connected and deduplicated
+            return list(self.match.node_path)
+
+        nodes = self.snapped_columns["node"]
+        keep = np.ones(len(nodes), dtype=bool)
+        keep[1:] = nodes[1:] != nodes[:-1]
+        return nodes[keep].tolist()
+
+    def _records_from_match(self) -> List[Dict[str, Any]]:
+        """snap_points_fast-style records from the map-matching result."""
+        m = self.match
+        return [
+            {
+                "snapped_lat": lat,
+                "snapped_lon": lon,
+                "edge": edge,
+                "error_meters": err,
+            }
+            for lat, lon, edge, err in zip(
+                m.snapped_lat.tolist(),
+                m.snapped_lon.tolist(),
+                m.edge.tolist(),
+                m.error_meters.tolist(),
+            )
+        ]
 
     def _compute_stats(self) -> RunPathStats:
         """Compute simple statistics based on snapped points."""
@@ -153,6 +231,7 @@ class RunPath:
             "start_node": self.start_node,
             "end_node": self.end_node,
             "node_sequence": self.node_sequence,
+            "path_breaks": self.path_breaks,
             "stats": self.stats.__dict__,
         }
 
@@ -183,6 +262,8 @@ class RunPath:
         cls,
         G,
         streams: Dict[str, Any],
+        mode: str = "nearest",
+        workers: int = 1,
     ) -> "RunPath":
         """
         Construct a RunPath directly from Strava streams JSON.
@@ -200,4 +281,4 @@ class RunPath:
         if "time" in streams and "data" in streams["time"]:
             times = streams["time"]["data"]
 
-        return cls(G, latlng, times=times)
+        return cls(G, latlng, times=times, mode=mode, workers=workers)
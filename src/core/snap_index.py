@@ -0,0 +1,754 @@
+# src/core/snap_index.py
+
+"""
+Reusable spatial index for snapping GPS points to graph edges.
+
+A SnapIndex holds everything snap_points_fast needs, built once per graph
+version:
+
+    crs        local metric CRS (see projection.py)
+    tree       STRtree over the projected edge geometries, one per physical edge
+    tree_rows  index position of each tree item (twin u -> v / v -> u edges
+               with the same geometry are only indexed once)
+    geoms      the edges sanitised to LineStrings (None if unusable), lon/lat
+    valid      True where an edge geometry can be snapped to
+    geoms_m    the same, projected into crs
+    edge_u/v/key   (u, v, key) OSM ids of every edge, in index order (for
+               an EdgeStore, one entry per store row, oriented u -> v)
+    node_ids / node_x / node_y   nodes, lon/lat
+    nodes      NodeIndex over the same nodes, in crs (see node_index.py)
+    segments   the tree geometries cut into straight pieces of at most
+               SEGMENT_PIECE_M, with a KD-tree over their midpoints (built
+               on first use; see snap_xy)
+
+get_snap_index() memoises indexes in-process by graph fingerprint (the
+MEMO_SIZE most recent graph versions) and can persist them to disk, so
+snapping a run only costs the queries.
+get_node_index() returns just the nearest-node index, shared with the
+snap index when one has been built.
+
+A graph version can list earlier versions it was edited from under
+"derived_from" (see drop_fingerprint and graph_loader): when one of those
+is memoised, the new index is derived from it (SnapIndex.derive) instead
+of being built from scratch, so after a patch only the changed edges are
+sanitised and projected again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from functools import cached_property
+from typing import Optional
+
+import networkx as nx
+import numpy as np
+import shapely
+from scipy.spatial import cKDTree
+from shapely.strtree import STRtree
+
+from src.core.edge_store import EdgeStore
+from src.core.graph_arrays import GraphArrays
+from src.core.geometry_sanitise import sanitise_geometries, usable_mask
+from src.core.graph_snapshot import graph_to_arrays
+from src.core.node_index import NodeIndex
+from src.core.projection import geoms_to_metric, metric_crs
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+
+SNAP_INDEX_DIR = os.path.join(PROJECT_ROOT, "data/osm_cache/snap_index")
+
+# Bump whenever the index layout or sanitising changes
+# (2: tree over deduplicated tree_rows, TREE_NODE_CAPACITY)
+SNAP_INDEX_VERSION = 2
+
+# Small STRtree nodes make nearest queries about twice as fast on walk
+# graphs (many short, evenly spread edges) for a slightly slower build
+TREE_NODE_CAPACITY = 4
+
+# snap_xy: tree geometries are cut into pieces no longer than this, and
+# the SEGMENT_CANDIDATES pieces with the nearest midpoints are measured.
+# Shorter pieces need fewer second passes, longer ones a smaller KD-tree;
+# 60 m / 6 was fastest on a 90k-edge street grid
+SEGMENT_PIECE_M = 60.0
+SEGMENT_CANDIDATES = 6
+SEGMENT_SORT_M = 500.0
+
+# Graph versions whose indexes are kept in-process (least recently used
+# are dropped first)
+MEMO_SIZE = 4
+
+# fingerprint -> SnapIndex
+_MEMO = OrderedDict()
+
+# fingerprint -> NodeIndex, for graphs without a SnapIndex
+_NODE_MEMO = OrderedDict()
+
+
+# -------------------------------------------------------------------
+# Graph fingerprint
+# -------------------------------------------------------------------
+
+def _arrays_sha256(arrays, form):
+    h = hashlib.sha256(form.encode())
+    for name in ("node_ids", "node_x", "node_y", "indptr", "targets", "edge_keys", "geom_coords"):
+        h.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return h.hexdigest()[:20]
+
+
+def graph_fingerprint(G):
+    """
+    Identity of a graph version. graph_loader stores one in G.graph /
+    GraphArrays.meta under "fingerprint"; otherwise the graph content is
+    hashed once and stored there; the hash includes the form, as networkx
+    and GraphArrays order edges differently. Code that mutates a networkx
+    graph in place must drop the stored value (drop_fingerprint).
+    """
+    if isinstance(G, EdgeStore):
+        return G.fingerprint
+    meta = G.meta if isinstance(G, GraphArrays) else G.graph
+    fp = meta.get("fingerprint")
+    if fp is None:
+        if isinstance(G, GraphArrays):
+            fp = meta["fingerprint"] = _arrays_sha256(G.__dict__, "arrays")
+        else:
+            fp = meta["fingerprint"] = _arrays_sha256(graph_to_arrays(G), "nx")
+    return fp
+
+
+def drop_fingerprint(G):
+    """
+    Forget G's stored fingerprint after changing it in place. The old value
+    goes to the front of G.graph["derived_from"], so indexes of it can be
+    derived from instead of rebuilt.
+    """
+    fp = G.graph.pop("fingerprint", None)
+    if fp is not None:
+        G.graph["derived_from"] = [fp] + G.graph.get("derived_from", [])[:MEMO_SIZE - 1]
+
+
+def _meta(G):
+    if isinstance(G, nx.Graph):
+        return G.graph
+    return G.meta
+
+
+# -------------------------------------------------------------------
+# Index
+# -------------------------------------------------------------------
+
+@dataclass
+class SnapIndex:
+    fingerprint: str
+    crs: str
+    tree: STRtree
+    tree_rows: np.ndarray     # tree item -> edge position
+    raw_geoms: np.ndarray     # geometries the tree was built on
+    geoms: np.ndarray         # sanitised LineStrings, None where unusable
+    geoms_m: np.ndarray       # geoms projected into crs
+    valid: np.ndarray         # bool, usable geometry
+    edge_u: np.ndarray
+    edge_v: np.ndarray
+    edge_key: np.ndarray
+    node_ids: np.ndarray
+    node_x: np.ndarray
+    node_y: np.ndarray
+    nodes: NodeIndex
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.edge_u)
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _from_parts(cls, fingerprint, raw_geoms, geoms, edge_u, edge_v, edge_key,
+                    node_ids, node_x, node_y, nodes=None, geoms_m=None, raw_m=None):
+        """
+        geoms_m / raw_m are already projected geoms / raw_geoms (None where
+        not known yet), reused by derive().
+        """
+        crs = metric_crs(
+            (node_x.min() + node_x.max()) / 2, (node_y.min() + node_y.max()) / 2
+        )
+        # Reuse a NodeIndex built earlier for these nodes instead of a second tree
+        if nodes is None or nodes.crs != crs or not np.array_equal(nodes.node_ids, node_ids):
+            nodes = NodeIndex.from_parts(fingerprint, node_ids, node_x, node_y, crs=crs)
+        tree_rows = _unique_edge_rows(edge_u, edge_v, edge_key, raw_geoms)
+        if raw_m is None:
+            tree_m = geoms_to_metric(raw_geoms[tree_rows], crs)
+        else:
+            tree_m = raw_m[tree_rows]
+            todo = shapely.is_missing(tree_m)
+            tree_m[todo] = geoms_to_metric(raw_geoms[tree_rows[todo]], crs)
+        if geoms_m is None:
+            geoms_m = geoms_to_metric(geoms, crs)
+        return cls(
+            fingerprint=fingerprint,
+            crs=crs,
+            tree=STRtree(tree_m, node_capacity=TREE_NODE_CAPACITY),
+            tree_rows=tree_rows,
+            raw_geoms=raw_geoms,
+            geoms=geoms,
+            geoms_m=geoms_m,
+            valid=usable_mask(geoms),
+            edge_u=edge_u,
+            edge_v=edge_v,
+            edge_key=edge_key,
+            node_ids=node_ids,
+            node_x=node_x,
+            node_y=node_y,
+            nodes=nodes,
+        )
+
+    def nearest_edges(self, geoms):
+        """Index position of the nearest edge to each projected point."""
+        hit_point, hit_item = self.tree.query_nearest(geoms, all_matches=False)
+        edge = np.empty(len(geoms), dtype=np.int64)
+        edge[hit_point] = self.tree_rows[hit_item]
+        return edge
+
+    @cached_property
+    def segments(self) -> "_Segments":
+        return _Segments.build(self.tree.geometries, self.tree_rows)
+
+    def snap_xy(self, x, y):
+        """
+        Nearest edge to each projected point and the closest point on it, as
+        (edge, offset, snapped_x, snapped_y); offset is normalised along the
+        edge. Same result as nearest_edges plus line_locate_point /
+        line_interpolate_point on geoms_m, but measured with numpy on the
+        segment pieces whose midpoints are nearest (see _Segments.nearest),
+        so no GEOS call is made per point. Tree geometries that are not
+        plain LineStrings go through the STRtree.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        seg = self.segments
+        if len(seg.length):
+            piece, t, dist = seg.nearest(np.column_stack([x, y]))
+            edge = seg.row[piece]
+            along = seg.along[piece] + t * seg.length[piece]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                offset = np.where(seg.total[piece] > 0, along / seg.total[piece], 0.0)
+            offset = np.clip(offset, 0.0, 1.0)
+            snapped_x = seg.ax[piece] + t * seg.dx[piece]
+            snapped_y = seg.ay[piece] + t * seg.dy[piece]
+        else:
+            edge = np.zeros(len(x), dtype=np.int64)
+            offset = np.zeros(len(x))
+            snapped_x, snapped_y = x.copy(), y.copy()
+            dist = np.full(len(x), np.inf)
+
+        if len(seg.other_items):
+            # Points where a non-LineString geometry is at least as close
+            pts = shapely.points(x, y)
+            hit_p, hit_i = seg.other_tree.query_nearest(pts, all_matches=False)
+            other_d = shapely.distance(pts[hit_p], seg.other_tree.geometries[hit_i])
+            closer = other_d <= dist[hit_p]
+            p = hit_p[closer]
+            edge[p] = self.tree_rows[seg.other_items[hit_i[closer]]]
+            lines = self.geoms_m[edge[p]]
+            ok = self.valid[edge[p]]
+            offset[p] = np.nan
+            offset[p[ok]] = shapely.line_locate_point(lines[ok], pts[p[ok]], normalized=True)
+            xy = shapely.get_coordinates(
+                shapely.line_interpolate_point(lines[ok], offset[p[ok]], normalized=True)
+            )
+            snapped_x[p[ok]], snapped_y[p[ok]] = xy[:, 0], xy[:, 1]
+
+        return edge, offset, snapped_x, snapped_y
+
+    @classmethod
+    def from_arrays(cls, ga: GraphArrays, fingerprint=None, nodes=None) -> "SnapIndex":
+        """
+        Index a GraphArrays graph; edge i of the index is edge i of ga.
+        nodes is an existing NodeIndex of ga to reuse.
+        """
+        geoms = ga.edge_geometries()
+        return cls._from_parts(
+            fingerprint or graph_fingerprint(ga),
+            geoms,
+            geoms,
+            ga.node_ids[ga.sources],
+            ga.node_ids[np.asarray(ga.targets)],
+            np.asarray(ga.edge_keys),
+            np.asarray(ga.node_ids),
+            np.asarray(ga.node_x),
+            np.asarray(ga.node_y),
+            nodes,
+        )
+
+    @classmethod
+    def from_store(cls, store: EdgeStore, fingerprint=None, nodes=None) -> "SnapIndex":
+        """
+        Index an EdgeStore without expanding it; edge i of the index is
+        store row i. nodes is an existing NodeIndex of the store to reuse.
+        """
+        geoms = store.geometry.geometries()
+        node_ids = np.asarray(store.node_ids)
+        return cls._from_parts(
+            fingerprint or store.fingerprint,
+            geoms,
+            geoms,
+            node_ids[store.edge_u],
+            node_ids[store.edge_v],
+            np.asarray(store.edge_key, dtype=np.int64),
+            node_ids,
+            np.asarray(store.node_x),
+            np.asarray(store.node_y),
+            nodes,
+        )
+
+    @classmethod
+    def from_graph(cls, G, fingerprint=None, nodes=None) -> "SnapIndex":
+        """
+        Index a networkx graph, in G.edges order. Missing geometries are
+        filled with straight lines, like ox.graph_to_gdfs does. nodes is an
+        existing NodeIndex of G to reuse.
+        """
+        n = G.number_of_edges()
+        edge_u = np.empty(n, dtype=np.int64)
+        edge_v = np.empty(n, dtype=np.int64)
+        edge_key = np.empty(n, dtype=np.int64)
+        raw = np.empty(n, dtype=object)
+        straight = []
+
+        for i, (u, v, k, data) in enumerate(G.edges(keys=True, data=True)):
+            edge_u[i], edge_v[i], edge_key[i] = u, v, k
+            geom = data.get("geometry")
+            if geom is None:
+                straight.append(i)
+            raw[i] = geom
+
+        if straight:
+            xy = G.nodes
+            seg = np.array([
+                [(xy[edge_u[i]]["x"], xy[edge_u[i]]["y"]),
+                 (xy[edge_v[i]]["x"], xy[edge_v[i]]["y"])]
+                for i in straight
+            ])
+            raw[straight] = shapely.linestrings(seg)
+
+        geoms, _ = sanitise_geometries(raw)
+
+        return cls._from_parts(
+            fingerprint or graph_fingerprint(G),
+            raw,
+            geoms,
+            edge_u,
+            edge_v,
+            edge_key,
+            *_node_arrays(G),
+            nodes,
+        )
+
+    @classmethod
+    def derive(cls, parent: "SnapIndex", G, fingerprint=None) -> Optional["SnapIndex"]:
+        """
+        Index G, an edited version of the graph parent indexes, in the order
+        build(G) would use. Edges with the same (u, v, key) as in parent keep
+        its sanitised and projected geometries, and parent's NodeIndex is
+        reused, so only new edges are processed. None if the nodes differ
+        (build from scratch then).
+        """
+        if isinstance(G, GraphArrays):
+            node_ids = np.asarray(G.node_ids)
+            node_x, node_y = np.asarray(G.node_x), np.asarray(G.node_y)
+            edge_u = node_ids[G.sources]
+            edge_v = node_ids[np.asarray(G.targets)]
+            edge_key = np.asarray(G.edge_keys)
+        elif isinstance(G, EdgeStore):
+            node_ids = np.asarray(G.node_ids)
+            node_x, node_y = np.asarray(G.node_x), np.asarray(G.node_y)
+            edge_u = node_ids[G.edge_u]
+            edge_v = node_ids[G.edge_v]
+            edge_key = np.asarray(G.edge_key, dtype=np.int64)
+        else:
+            node_ids, node_x, node_y = _node_arrays(G)
+            edges = list(G.edges(keys=True, data="geometry"))
+            edge_u = np.array([e[0] for e in edges], dtype=np.int64)
+            edge_v = np.array([e[1] for e in edges], dtype=np.int64)
+            edge_key = np.array([e[2] for e in edges], dtype=np.int64)
+
+        if not np.array_equal(node_ids, parent.node_ids):
+            return None
+
+        src = _match_edges(
+            (parent.edge_u, parent.edge_v, parent.edge_key), (edge_u, edge_v, edge_key)
+        )
+        hit = np.flatnonzero(src >= 0)
+        new = np.flatnonzero(src < 0)
+
+        raw = np.empty(len(src), dtype=object)
+        geoms = np.empty(len(src), dtype=object)
+        raw[hit] = parent.raw_geoms[src[hit]]
+        geoms[hit] = parent.geoms[src[hit]]
+        if isinstance(G, GraphArrays):
+            raw[new] = geoms[new] = G.edge_geometries(new)
+        elif isinstance(G, EdgeStore):
+            raw[new] = geoms[new] = G.geometry.geometries(new)
+        elif len(new):
+            xy = G.nodes
+            raw[new] = [
+                edges[i][3] if edges[i][3] is not None else shapely.linestrings([
+                    (xy[edge_u[i]]["x"], xy[edge_u[i]]["y"]),
+                    (xy[edge_v[i]]["x"], xy[edge_v[i]]["y"]),
+                ])
+                for i in new.tolist()
+            ]
+            geoms[new], _ = sanitise_geometries(raw[new])
+
+        geoms_m = np.empty(len(src), dtype=object)
+        geoms_m[hit] = parent.geoms_m[src[hit]]
+        geoms_m[new] = geoms_to_metric(geoms[new], parent.crs)
+
+        # The tree holds the projected raw geometry of parent's tree rows
+        parent_raw_m = np.full(parent.num_edges, None, dtype=object)
+        parent_raw_m[parent.tree_rows] = parent.tree.geometries
+        raw_m = parent_raw_m[np.maximum(src, 0)]
+        raw_m[new] = None
+
+        fp = fingerprint or graph_fingerprint(G)
+        return cls._from_parts(
+            fp, raw, geoms, edge_u, edge_v, edge_key, node_ids, node_x, node_y,
+            nodes=replace(parent.nodes, fingerprint=fp), geoms_m=geoms_m, raw_m=raw_m,
+        )
+
+    @classmethod
+    def build(cls, G, nodes=None) -> "SnapIndex":
+        if isinstance(G, GraphArrays):
+            return cls.from_arrays(G, nodes=nodes)
+        if isinstance(G, EdgeStore):
+            return cls.from_store(G, nodes=nodes)
+        return cls.from_graph(G, nodes=nodes)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path: str) -> str:
+        """Write the index as flat WKB buffers; the STRtree is rebuilt on load."""
+        os.makedirs(path, exist_ok=True)
+        np.savez(
+            os.path.join(path, "index.npz"),
+            **_pack_wkb("raw", self.raw_geoms),
+            **_pack_wkb("geoms", self.geoms),
+            edge_u=self.edge_u,
+            edge_v=self.edge_v,
+            edge_key=self.edge_key,
+            node_ids=self.node_ids,
+            node_x=self.node_x,
+            node_y=self.node_y,
+        )
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"fingerprint": self.fingerprint, "version": SNAP_INDEX_VERSION}, f)
+        return path
+
+    @classmethod
+    def load(cls, path: str, nodes=None) -> Optional["SnapIndex"]:
+        """
+        Read an index written by save(); None if missing or outdated. nodes
+        is an existing NodeIndex of the same graph to reuse.
+        """
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta.get("version") != SNAP_INDEX_VERSION:
+            return None
+
+        z = np.load(os.path.join(path, "index.npz"))
+        return cls._from_parts(
+            meta["fingerprint"], _unpack_wkb(z, "raw"), _unpack_wkb(z, "geoms"),
+            z["edge_u"], z["edge_v"], z["edge_key"], z["node_ids"], z["node_x"], z["node_y"],
+            nodes,
+        )
+
+
+@dataclass
+class _Segments:
+    """
+    Straight pieces of the tree's LineStrings (metres), one row each:
+    start (ax, ay), direction (dx, dy) = end - start, 1 / squared length
+    (0 for zero-length pieces), length, the edge position (row), the
+    distance along the edge to the piece start and the edge length.
+    Items that are not LineStrings are kept in their own STRtree.
+    """
+    ax: np.ndarray
+    ay: np.ndarray
+    dx: np.ndarray
+    dy: np.ndarray
+    inv_len2: np.ndarray
+    length: np.ndarray
+    row: np.ndarray
+    along: np.ndarray
+    total: np.ndarray
+    tree: cKDTree              # over piece midpoints
+    half: float                # longest piece / 2
+    other_items: np.ndarray    # tree items that are not LineStrings
+    other_tree: Optional[STRtree]
+
+    @classmethod
+    def build(cls, geoms, tree_rows, piece_m=SEGMENT_PIECE_M):
+        is_line = shapely.get_type_id(geoms) == shapely.GeometryType.LINESTRING
+        is_line &= ~shapely.is_empty(geoms)
+        lines = np.flatnonzero(is_line)
+        coords, item = shapely.get_coordinates(geoms[lines], return_index=True)
+
+        # Consecutive vertices of one line form a segment
+        same = item[1:] == item[:-1]
+        a, b, seg_item = coords[:-1][same], coords[1:][same], item[:-1][same]
+
+        seg_len = np.hypot(*(b - a).T)
+        total = np.bincount(seg_item, weights=seg_len, minlength=len(lines))
+        start = np.cumsum(seg_len) - seg_len
+        first_seg = np.searchsorted(seg_item, np.arange(len(lines)))
+        seg_along = start - start[first_seg][seg_item] if len(start) else start
+
+        # Cut long segments into n equal pieces
+        n = np.maximum(np.ceil(seg_len / piece_m), 1).astype(np.int64)
+        parent = np.repeat(np.arange(len(seg_len)), n)
+        k = np.arange(len(parent)) - np.repeat(np.cumsum(n) - n, n)
+        frac0, frac1 = k / n[parent], (k + 1) / n[parent]
+        d_seg = b - a
+        pa = a[parent] + frac0[:, None] * d_seg[parent]
+        pb = a[parent] + frac1[:, None] * d_seg[parent]
+        length = seg_len[parent] / n[parent]
+        along = seg_along[parent] + frac0 * seg_len[parent]
+
+        others = np.flatnonzero(
+            ~is_line & ~shapely.is_missing(geoms) & ~shapely.is_empty(geoms)
+        )
+        d = pb - pa
+        len2 = np.einsum("ij,ij->i", d, d)
+        return cls(
+            ax=pa[:, 0].copy(),
+            ay=pa[:, 1].copy(),
+            dx=d[:, 0].copy(),
+            dy=d[:, 1].copy(),
+            inv_len2=np.divide(1.0, len2, out=np.zeros_like(len2), where=len2 > 0),
+            length=length,
+            row=np.asarray(tree_rows)[lines[seg_item[parent]]],
+            along=along,
+            total=total[seg_item[parent]],
+            tree=cKDTree((pa + pb) / 2),
+            half=float(length.max() / 2) if len(length) else 0.0,
+            other_items=others,
+            other_tree=STRtree(geoms[others]) if len(others) else None,
+        )
+
+    def _measure(self, x, y, pieces):
+        """
+        (t, squared distance) of the closest point on each piece to each
+        point; x and y broadcast against pieces.
+        """
+        dx, dy = self.dx[pieces], self.dy[pieces]
+        rx, ry = x - self.ax[pieces], y - self.ay[pieces]
+        t = (rx * dx + ry * dy) * self.inv_len2[pieces]
+        np.clip(t, 0.0, 1.0, out=t)
+        rx -= t * dx
+        ry -= t * dy
+        return t, rx * rx + ry * ry
+
+    def nearest(self, xy, k=SEGMENT_CANDIDATES):
+        """
+        (piece, t, dist) of the nearest piece to each (N, 2) point. Exact:
+        a piece closer than the best of the k measured ones has its midpoint
+        within best + half, so where the k-th midpoint is farther than that
+        the answer is final; the other points are measured again with four
+        times as many candidates until none is left.
+        """
+        piece = np.zeros(len(xy), dtype=np.int64)
+        t = np.zeros(len(xy))
+        dist = np.full(len(xy), np.inf)
+        # Neighbouring points query the same tree nodes: visit them in
+        # SEGMENT_SORT_M blocks, which keeps the KD-tree walk in cache
+        block = np.floor(xy / SEGMENT_SORT_M)
+        todo = np.lexsort((block[:, 1], block[:, 0]))
+        while len(todo):
+            k = min(k, len(self.length))
+            mid_d, cand = self.tree.query(xy[todo], k=k, workers=-1)
+            mid_d, cand = mid_d.reshape(len(todo), k), cand.reshape(len(todo), k)
+
+            nt, nd = self._measure(xy[todo, 0, None], xy[todo, 1, None], cand)
+            best = np.argmin(nd, axis=1)
+            rows = np.arange(len(todo))
+            piece[todo] = cand[rows, best]
+            t[todo], dist[todo] = nt[rows, best], np.sqrt(nd[rows, best])
+
+            if k == len(self.length):
+                break
+            todo = todo[mid_d[:, -1] < dist[todo] + self.half]
+            k *= 4
+
+        return piece, t, dist
+
+
+def _node_arrays(G):
+    """(node_ids, node_x, node_y) of a networkx graph, in G.nodes order."""
+    node_ids = np.fromiter(G.nodes, dtype=np.int64, count=G.number_of_nodes())
+    return (
+        node_ids,
+        np.array([G.nodes[nid]["x"] for nid in node_ids.tolist()], dtype=np.float64),
+        np.array([G.nodes[nid]["y"] for nid in node_ids.tolist()], dtype=np.float64),
+    )
+
+
+def _match_edges(old, new):
+    """
+    For each (u, v, key) of new (three arrays), its position in old, or -1.
+    """
+    old = np.column_stack([np.asarray(a, dtype=np.int64) for a in old])
+    new = np.column_stack([np.asarray(a, dtype=np.int64) for a in new])
+    _, inverse = np.unique(np.concatenate([old, new]), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    position = np.full(inverse.max() + 1 if len(inverse) else 0, -1, dtype=np.int64)
+    position[inverse[:len(old)]] = np.arange(len(old))
+    return position[inverse[len(old):]]
+
+
+def _unique_edge_rows(edge_u, edge_v, edge_key, geoms):
+    """
+    Edge positions to put in the tree: of each u -> v / v -> u pair with
+    equal geometry only the first is kept, so queries see physical edges.
+    """
+    lo = np.minimum(edge_u, edge_v)
+    hi = np.maximum(edge_u, edge_v)
+    order = np.lexsort((np.arange(len(lo)), edge_key, hi, lo))
+    a, b = order[:-1], order[1:]
+    cand = (lo[a] == lo[b]) & (hi[a] == hi[b]) & (edge_key[a] == edge_key[b])
+    cand &= edge_u[a] != edge_u[b]
+    twin = np.zeros(len(lo), dtype=bool)
+    twin[b[cand]] = shapely.equals(geoms[a[cand]], geoms[b[cand]])
+    return np.flatnonzero(~twin)
+
+
+def _pack_wkb(name, geoms):
+    """Geometries (None allowed) as one uint8 WKB buffer plus offsets."""
+    wkb = [b"" if g is None else g for g in shapely.to_wkb(geoms).tolist()]
+    offsets = np.zeros(len(wkb) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in wkb], out=offsets[1:])
+    return {
+        f"{name}_wkb": np.frombuffer(b"".join(wkb), dtype=np.uint8),
+        f"{name}_offsets": offsets,
+    }
+
+
+def _unpack_wkb(z, name):
+    buf = z[f"{name}_wkb"].tobytes()
+    offsets = z[f"{name}_offsets"].tolist()
+    out = np.empty(len(offsets) - 1, dtype=object)
+    out[:] = [
+        shapely.from_wkb(buf[a:b]) if b > a else None
+        for a, b in zip(offsets[:-1], offsets[1:])
+    ]
+    return out
+
+
+# -------------------------------------------------------------------
+# Memoised access
+# -------------------------------------------------------------------
+
+def get_snap_index(G, persist=False, cache_dir=SNAP_INDEX_DIR) -> SnapIndex:
+    """
+    SnapIndex for G, built at most once per graph fingerprint and process.
+    With persist=True it is also read from / written to cache_dir.
+    """
+    if isinstance(G, SnapIndex):
+        return G
+
+    fp = graph_fingerprint(G)
+    index = _MEMO.get(fp)
+    if index is not None:
+        _MEMO.move_to_end(fp)
+        return index
+
+    # A node index built earlier for this version is adopted, so there is
+    # one tree
+    nodes = _NODE_MEMO.pop(fp, None)
+
+    path = os.path.join(cache_dir, fp)
+    if persist:
+        index = SnapIndex.load(path, nodes=nodes)
+        if index is not None:
+            print(f"DEBUG: Snap index loaded from disk ({fp})")
+
+    if index is None:
+        # An index of a version G was edited from only needs the changes
+        parent = _memoised_parent(_MEMO, G)
+        if parent is not None:
+            print(f"DEBUG: Deriving snap index ({fp}) from {parent.fingerprint}…")
+            index = SnapIndex.derive(parent, G, fingerprint=fp)
+        if index is None:
+            print(f"DEBUG: Building snap index ({fp})…")
+            index = SnapIndex.build(G, nodes=nodes)
+            index.fingerprint = index.nodes.fingerprint = fp
+        if persist:
+            index.save(path)
+
+    _remember(_MEMO, fp, index)
+    return index
+
+
+def get_node_index(G) -> NodeIndex:
+    """
+    NodeIndex for G, built at most once per graph fingerprint and process.
+    Reuses the nodes of an already built SnapIndex instead of a second tree.
+    """
+    if isinstance(G, SnapIndex):
+        return G.nodes
+    if isinstance(G, NodeIndex):
+        return G
+
+    fp = graph_fingerprint(G)
+    if fp in _MEMO:
+        _MEMO.move_to_end(fp)
+        return _MEMO[fp].nodes
+
+    nodes = _NODE_MEMO.get(fp)
+    if nodes is not None:
+        _NODE_MEMO.move_to_end(fp)
+        return nodes
+
+    if isinstance(G, (GraphArrays, EdgeStore)):
+        parts = (np.asarray(G.node_ids), np.asarray(G.node_x), np.asarray(G.node_y))
+    else:
+        parts = _node_arrays(G)
+
+    # Edits that keep the nodes keep an earlier version's tree
+    parent = _memoised_parent(_MEMO, G) or _memoised_parent(_NODE_MEMO, G)
+    parent = getattr(parent, "nodes", parent)
+    if parent is not None and np.array_equal(parent.node_ids, parts[0]):
+        nodes = replace(parent, fingerprint=fp)
+    else:
+        print(f"DEBUG: Building node index ({fp})…")
+        nodes = NodeIndex.from_parts(fp, *parts)
+    _remember(_NODE_MEMO, fp, nodes)
+    return nodes
+
+
+def _memoised_parent(memo, G):
+    """The most recent version G was derived from that memo holds, or None."""
+    for fp in _meta(G).get("derived_from", ()):
+        if fp in memo:
+            return memo[fp]
+    return None
+
+
+def _remember(memo, fp, value):
+    memo[fp] = value
+    memo.move_to_end(fp)
+    while len(memo) > MEMO_SIZE:
+        memo.popitem(last=False)
+
+
+def clear_snap_index_cache():
+    _MEMO.clear()
+    _NODE_MEMO.clear()
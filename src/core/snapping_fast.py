@@ -1,150 +1,161 @@
 # src/core/snapping_fast.py
 
 import numpy as np
-import osmnx as ox
+import shapely
 
-from shapely.geometry import (
-    Point as ShapelyPoint,
-    LineString,
-    MultiLineString,
-    GeometryCollection,
-    LinearRing
-)
-from shapely.strtree import STRtree
-from shapely.ops import linemerge
+from shapely.geometry import Point as ShapelyPoint
 
-from src.core.preprocessing import haversine_m
+from src.core.projection import WGS84, from_metric, get_transformer, to_metric
+from src.core.snap_index import get_snap_index
 
 
 # -------------------------------------------------------------------
-# STRtree Builder
+# Snapping
 # -------------------------------------------------------------------
 
-def build_strtree(G):
+def snap_points_columnar(G, points, index=None):
     """
-    Build an STRtree index of all OSM edge geometries.
-    Returns (gdf_edges, tree, geoms) where:
-      geoms is a Python list of geometries that the tree references.
-    This avoids the Shapely behaviour where passing a numpy array causes
-    nearest() to return an integer index instead of the geometry.
+    Batched snapping of an (N, 2) array of (lat, lon) points.
+
+    The points are projected in bulk into the index's metric CRS, and
+    SnapIndex.snap_xy finds every nearest edge and the closest point on it
+    with numpy over the index's segment pieces, instead of one GEOS nearest
+    search per point. Points whose nearest edge has no usable geometry fall
+    back to the nearest node, as in snap_points_fast.
+    See bench_snapping.py for the speed-up over _snap_points_loop.
+
+    Returns a dict of (N,) arrays:
+        snapped_lat, snapped_lon
+        edge          position in the SnapIndex (GraphArrays edge index)
+        offset        normalised position along the edge (0 at u, 1 at v;
+                      NaN for node fallbacks)
+        node          OSM id of the nearest edge endpoint (u if offset < 0.5,
+                      else v), or of the fallback node
+        error_meters  distance from the raw point, in the metric CRS
     """
-    gdf_nodes, gdf_edges = ox.graph_to_gdfs(G, nodes=True, edges=True)
+    if index is None:
+        index = get_snap_index(G)
 
-    # MUST be a Python list, not numpy array
-    geoms = list(gdf_edges.geometry)
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(pts)
 
-    tree = STRtree(geoms)
-    return gdf_edges, tree, geoms
+    x, y = to_metric(pts[:, 1], pts[:, 0], index.crs)
+    edge, offset, snapped_x, snapped_y = index.snap_xy(x, y)
+    usable = index.valid[edge]
+    offset[~usable] = np.nan
 
+    # No usable geometry → fallback to nearest node, one batched KD-tree query
+    fallback = np.flatnonzero(~usable)
+    _, nodes = index.nodes.nearest_xy(np.column_stack([x[fallback], y[fallback]]))
+    snapped_x[fallback], snapped_y[fallback] = index.nodes.xy_m[nodes].T
 
-# -------------------------------------------------------------------
-# Geometry Sanitization
-# -------------------------------------------------------------------
+    snapped_lon, snapped_lat = from_metric(snapped_x, snapped_y, index.crs)
+    snapped_lon[fallback], snapped_lat[fallback] = index.node_x[nodes], index.node_y[nodes]
 
-def _force_linestring(geom):
-    """
-    Convert arbitrary Shapely geometry to a LineString if possible.
-
-    Supported inputs:
-      - LineString             -> returned unchanged
-      - MultiLineString        -> merged or use longest segment
-      - GeometryCollection     -> longest contained LineString
-      - LinearRing             -> convert to LineString
-      - Unsupported            -> return None
-    """
-    if geom is None:
-        return None
-
-    # Already valid
-    if isinstance(geom, LineString):
-        return geom
-
-    # MultiLineString → merge or pick longest
-    if isinstance(geom, MultiLineString):
-        merged = linemerge(geom)
-        if isinstance(merged, LineString):
-            return merged
-        if isinstance(merged, MultiLineString):
-            if len(merged.geoms) == 0:
-                return None
-            return max(merged.geoms, key=lambda g: g.length)
-        return None
-
-    # GeometryCollection → choose longest LineString
-    if isinstance(geom, GeometryCollection):
-        line_parts = [g for g in geom.geoms if isinstance(g, LineString)]
-        if not line_parts:
-            return None
-        return max(line_parts, key=lambda g: g.length)
-
-    # LinearRing → convert to LineString
-    if isinstance(geom, LinearRing):
-        return LineString(list(geom.coords))
-
-    # Unsupported: Polygon, Point, None
-    return None
+    node = np.where(offset < 0.5, index.edge_u[edge], index.edge_v[edge])
+    node[fallback] = index.node_ids[nodes]
 
+    return {
+        "snapped_lat": snapped_lat,
+        "snapped_lon": snapped_lon,
+        "edge": edge,
+        "offset": offset,
+        "node": node,
+        "error_meters": np.hypot(snapped_x - x, snapped_y - y),
+    }
 
-# -------------------------------------------------------------------
-# Snapping
-# -------------------------------------------------------------------
 
-def snap_points_fast(G, points):
+def snap_points_fast(G, points, index=None):
     """
     Snap a list of (lat, lon) points to the nearest OSM edge geometry.
 
+    The STRtree and sanitised geometries come from a SnapIndex (see
+    snap_index.py), built once per graph version and memoised, so a call
+    only costs the queries. Pass index to use a specific SnapIndex.
+
     This version is fully robust:
-        - builds STRtree from Python list (correct .nearest() behaviour)
-        - handles MultiLineString, GeometryCollection, LinearRing
+        - geometries were sanitised to LineStrings when the index was built
+          (see geometry_sanitise.py)
         - falls back to nearest node if geometry unusable
         - never crashes on OSM data inconsistencies
+
+    Records carry "edge", the edge's position in the index (for a
+    GraphArrays graph, its edge index; see SnapIndex.edge_u/v/key), plus
+    "offset" and "node" as in snap_points_columnar. Use
+    snap_points_columnar directly to skip building the dicts.
+    """
+    if index is None:
+        index = get_snap_index(G)
+
+    return records_from_columns(index, snap_points_columnar(G, points, index=index))
+
+
+def records_from_columns(index, cols):
+    """snap_points_fast records from a snap_points_columnar result."""
+    geoms = index.geoms[cols["edge"]]
+    fallback = np.isnan(cols["offset"])
+
+    return [
+        {
+            "snapped_lat": lat,
+            "snapped_lon": lon,
+            "geom": None if fb else geom,
+            "edge": edge,
+            "offset": offset,
+            "node": node,
+            "error_meters": err,
+        }
+        for lat, lon, geom, edge, offset, node, err, fb in zip(
+            cols["snapped_lat"].tolist(),
+            cols["snapped_lon"].tolist(),
+            geoms,
+            cols["edge"].tolist(),
+            cols["offset"].tolist(),
+            cols["node"].tolist(),
+            cols["error_meters"].tolist(),
+            fallback.tolist(),
+        )
+    ]
+
+
+def _snap_points_loop(G, points, index=None):
     """
-    gdf_edges, tree, geoms = build_strtree(G)
+    Per-point implementation of snap_points_columnar, in the same metric
+    CRS. Kept as the reference for tests and src/benchmarks/bench_snapping.py.
+    """
+    if index is None:
+        index = get_snap_index(G)
+
+    to_m = get_transformer(WGS84, index.crs)
+    to_deg = get_transformer(index.crs, WGS84)
     snapped = []
 
     for lat, lon in points:
-        p = ShapelyPoint(lon, lat)
-
-        # nearest() should return a geometry, but STRtree quirks exist
-        geom = tree.nearest(p)
+        p = ShapelyPoint(*to_m.transform(lon, lat))
 
-        # If Shapely returns an integer index into geoms (bug in numpy-based trees)
-        if isinstance(geom, (int, np.integer)):
-            geom = geoms[int(geom)]
+        edge = int(index.tree_rows[index.tree.nearest(p)])
 
-        # Convert to a clean LineString
-        ls = _force_linestring(geom)
+        # Sanitised LineString (None if the geometry was unusable)
+        ls = index.geoms_m[edge]
 
         # If no usable geometry → fallback to nearest node
-        if ls is None or ls.length == 0:
-            node = ox.distance.nearest_nodes(G, lon, lat)
-            node_data = G.nodes[node]
-            snapped_lat = node_data["y"]
-            snapped_lon = node_data["x"]
-            err = haversine_m(lat, lon, snapped_lat, snapped_lon)
-
-            snapped.append({
-                "snapped_lat": snapped_lat,
-                "snapped_lon": snapped_lon,
-                "geom": None,
-                "error_meters": float(err),
-            })
-            continue
-
-        # Safe projection
-        proj = ls.project(p)
-        projection = ls.interpolate(proj)
-
-        snapped_lat = projection.y
-        snapped_lon = projection.x
-
-        err = haversine_m(lat, lon, snapped_lat, snapped_lon)
+        if not index.valid[edge]:
+            _, i = index.nodes.tree.query([p.x, p.y])
+            target = ShapelyPoint(index.nodes.xy_m[i])
+            snapped_lon, snapped_lat = float(index.node_x[i]), float(index.node_y[i])
+            geom = None
+        else:
+            # Safe projection
+            target = ls.interpolate(ls.project(p))
+            snapped_lon, snapped_lat = to_deg.transform(target.x, target.y)
+            geom = index.geoms[edge]
 
         snapped.append({
             "snapped_lat": snapped_lat,
             "snapped_lon": snapped_lon,
-            "geom": ls,
-            "error_meters": float(err),
+            "geom": geom,
+            "edge": edge,
+            "error_meters": float(p.distance(target)),
         })
 
     return snapped
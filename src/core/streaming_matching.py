@@ -0,0 +1,313 @@
+# src/core/streaming_matching.py
+
+"""
+Online map matching for live GPS feeds.
+
+RunPath and MapMatcher.match need the whole track up front. A
+StreamingMatcher takes points one at a time (or in small batches) and runs
+the same HMM (see map_matching.py) as a fixed-lag Viterbi decoder:
+
+    - every pushed point extends the lattice by one step
+    - once more than `lag` points are undecided, the oldest one is decided
+      by backtracking from the current best candidate and emitted
+    - the remaining window is then re-scored from the decided candidate,
+      so later decisions always connect to it and the emitted node path
+      stays connected
+    - if no route reaches the new point the chain restarts, like in
+      MapMatcher.match: every buffered point is decided first
+
+Memory is bounded whatever the run length: at most lag + 1 buffered
+points and ROUTE_CACHE_SIZE cached Dijkstra runs. With lag at least the
+run length the output equals MapMatcher.match.
+
+    matcher = StreamingMatcher(G)
+    for lat, lon in feed:
+        for m in matcher.push((lat, lon)):
+            ...
+    for m in matcher.flush():
+        ...
+
+match_stream() wraps the same loop as a generator.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, Iterator, List
+
+import numpy as np
+import shapely
+
+from src.core.map_matching import (
+    CANDIDATE_RADIUS_M,
+    DETOUR_FACTOR,
+    GPS_SIGMA_M,
+    TRANSITION_BETA_M,
+    _route_bounds,
+    get_map_matcher,
+)
+from src.core.projection import WGS84, get_transformer
+
+# Points kept undecided; a decision is emitted lag points after its point
+STREAM_LAG = 10
+
+# Dijkstra runs kept for route lookups (oldest are dropped first)
+ROUTE_CACHE_SIZE = 2000
+
+
+@dataclass
+class StreamMatch:
+    """One decided point of a stream."""
+    index: int              # position of the point in the stream
+    lat: float              # raw point
+    lon: float
+    snapped_lat: float      # NaN if the point had no candidate
+    snapped_lon: float
+    edge: int               # matched edge index (-1 if none)
+    offset: float           # normalised position along the edge
+    error_meters: float
+    restart: bool           # the chain restarted at this point
+    new_nodes: List[int] = field(default_factory=list)   # node path extension, OSM ids
+
+
+@dataclass
+class _Step:
+    """An undecided point and its lattice step from the previous point."""
+    index: int
+    lat: float
+    lon: float
+    x: float
+    y: float
+    cand_edge: np.ndarray     # (K,)
+    cand_off: np.ndarray      # (K,)
+    emission: np.ndarray      # (K,)
+    trans: np.ndarray         # (K, K) from the previous point, None at restarts
+    via: np.ndarray           # (K, K)
+    bound: float              # route cutoff used for this step
+    back: np.ndarray = None   # (K,) best previous candidate
+    vias: np.ndarray = None   # (K,) via code of that move
+    restart: bool = False
+
+
+class StreamingMatcher:
+    """Fixed-lag HMM matcher fed point by point; see module docstring."""
+
+    def __init__(self, G, lag=STREAM_LAG, route_cache_size=ROUTE_CACHE_SIZE):
+        self.matcher = get_map_matcher(G)
+        self.lag = max(int(lag), 0)
+        self.route_cache_size = route_cache_size
+
+        crs = self.matcher.index.crs
+        self._to_m = get_transformer(WGS84, crs)
+        self._to_deg = get_transformer(crs, WGS84)
+
+        self._buf: Deque[_Step] = deque()
+        self._score = None        # normalised scores of the newest point
+        self._last = None         # newest point (buffered or decided)
+        self._decided = None      # (step, candidate) of the last emitted point
+        self._cache: Dict[int, tuple] = {}
+        self._count = 0
+        self._last_node = None
+
+    # ------------------------------------------------------------------
+    # Input
+    # ------------------------------------------------------------------
+
+    def push(self, points) -> List[StreamMatch]:
+        """
+        Add one (lat, lon) point or an (N, 2) batch; returns the points
+        decided by it, oldest first.
+        """
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        out: List[StreamMatch] = []
+        for lat, lon in pts.tolist():
+            out.extend(self._push_one(lat, lon))
+        return out
+
+    def flush(self) -> List[StreamMatch]:
+        """Decide every buffered point (end of the stream)."""
+        out = self._decide_all()
+        self._trim_cache()
+        return out
+
+    def _push_one(self, lat, lon) -> List[StreamMatch]:
+        matcher = self.matcher
+        x, y = self._to_m.transform(lon, lat)
+        cand_edge, cand_dist, cand_off = matcher.candidates(np.array([x]), np.array([y]))
+        emission = -0.5 * (cand_dist[0] / GPS_SIGMA_M) ** 2
+
+        out: List[StreamMatch] = []
+        step = _Step(self._count, lat, lon, x, y, cand_edge[0], cand_off[0], emission,
+                     None, None, 0.0)
+        self._count += 1
+
+        prev = self._last
+        if prev is None:
+            step.restart = True
+            self._score = emission
+        else:
+            straight = float(np.hypot(x - prev.x, y - prev.y))
+            routes, via = matcher._transitions(
+                np.vstack([prev.cand_edge, step.cand_edge]),
+                np.vstack([prev.cand_off, step.cand_off]),
+                np.array([straight]),
+                self._cache,
+            )
+            step.trans = -np.abs(routes[0] - straight) / TRANSITION_BETA_M
+            step.via = via[0]
+            step.bound = float(
+                _route_bounds(straight * DETOUR_FACTOR + 2 * CANDIDATE_RADIUS_M)
+            )
+            score = self._advance(step, self._score)
+            if score is None:
+                # No route from any previous candidate: restart the chain
+                out.extend(self._decide_all())
+                step.restart = True
+                score = emission
+            self._score = score
+
+        self._score = _normalised(self._score)
+        self._buf.append(step)
+        self._last = step
+        while len(self._buf) > self.lag:
+            out.extend(self._decide_oldest())
+
+        self._trim_cache()
+        return out
+
+    def _advance(self, step, score):
+        """
+        One Viterbi step into step from score: sets its back pointers and
+        returns its scores, or None if no candidate is reachable.
+        """
+        cols = np.arange(len(step.emission))
+        total = score[:, None] + step.trans
+        best = np.argmax(total, axis=0)
+        best_total = total[best, cols]
+        if not np.isfinite(best_total).any():
+            return None
+        step.back = best
+        step.vias = step.via[best, cols]
+        return best_total + step.emission
+
+    # ------------------------------------------------------------------
+    # Decisions
+    # ------------------------------------------------------------------
+
+    def _decide(self, count, score) -> List[StreamMatch]:
+        """
+        Decide the oldest count buffered points by backtracking from score
+        (the scores of the last of them). Only the first buffered point can
+        be a restart, so back pointers are followed within one chain.
+        """
+        steps = [self._buf.popleft() for _ in range(count)]
+        if not steps:
+            return []
+        chosen = [int(np.argmax(score))]
+        for step in reversed(steps[1:]):
+            chosen.append(int(step.back[chosen[-1]]))
+        return [self._emit(step, j) for step, j in zip(steps, chosen[::-1])]
+
+    def _decide_all(self) -> List[StreamMatch]:
+        return self._decide(len(self._buf), self._score)
+
+    def _decide_oldest(self) -> List[StreamMatch]:
+        # Best candidate of the oldest point, from the newest scores
+        j = int(np.argmax(self._score))
+        for step in reversed(list(self._buf)[1:]):
+            j = int(step.back[j])
+        step = self._buf.popleft()
+        out = [self._emit(step, j)]
+
+        # Re-score the window from the decided candidate. A point it cannot
+        # reach restarts the chain; the points before it are decided first.
+        score = np.full(len(step.emission), -np.inf)
+        score[j] = 0.0
+        pending = 0
+        for step in list(self._buf):
+            nxt = self._advance(step, score)
+            if nxt is None:
+                out.extend(self._decide(pending, score))
+                pending = 0
+                step.restart = True
+                nxt = step.emission
+            score = _normalised(nxt)
+            pending += 1
+        self._score = score
+        return out
+
+    def _emit(self, step, j) -> StreamMatch:
+        matcher = self.matcher
+        edge = int(step.cand_edge[j])
+        offset = float(step.cand_off[j])
+
+        if edge >= 0:
+            p = shapely.line_interpolate_point(
+                matcher.index.geoms_m[edge], offset, normalized=True
+            )
+            sx, sy = p.x, p.y
+            snapped_lon, snapped_lat = self._to_deg.transform(sx, sy)
+            error = float(np.hypot(sx - step.x, sy - step.y))
+        else:
+            snapped_lat = snapped_lon = error = float("nan")
+
+        # Node path: follow the route from the previous decision, as in
+        # MapMatcher._result
+        new_nodes: List[int] = []
+        ends = matcher._end_nodes(np.array([edge]))[0]
+        via = -1 if step.restart else int(step.vias[j])
+        if via >= 0 and self._decided is not None:
+            prev_step, prev_j = self._decided
+            prev_ends = matcher._end_nodes(np.array([prev_step.cand_edge[prev_j]]))[0]
+            hop = matcher._hop_nodes(
+                int(prev_ends[via // 2]), int(ends[via % 2]), self._cache, step.bound
+            )
+            for node in hop:
+                self._visit(node, new_nodes)
+        if self._last_node is None and edge >= 0:
+            self._visit(int(ends[0] if offset <= 0.5 else ends[1]), new_nodes)
+
+        self._decided = (step, j)
+        return StreamMatch(
+            index=step.index,
+            lat=step.lat,
+            lon=step.lon,
+            snapped_lat=float(snapped_lat),
+            snapped_lon=float(snapped_lon),
+            edge=edge,
+            offset=offset,
+            error_meters=error,
+            restart=step.restart,
+            new_nodes=new_nodes,
+        )
+
+    def _visit(self, node, new_nodes):
+        if self._last_node != node:
+            self._last_node = node
+            new_nodes.append(int(self.matcher.ga.node_ids[node]))
+
+    def _trim_cache(self):
+        cache = self._cache
+        while len(cache) > self.route_cache_size:
+            cache.pop(next(iter(cache)))
+
+
+def _normalised(score):
+    top = score.max()
+    return score - top if np.isfinite(top) else score
+
+
+# -------------------------------------------------------------------
+# Generator API
+# -------------------------------------------------------------------
+
+def match_stream(G, points: Iterable, lag=STREAM_LAG) -> Iterator[StreamMatch]:
+    """
+    Generator over StreamMatch decisions for an iterable of (lat, lon)
+    points or (N, 2) batches, lag points behind the input.
+    """
+    matcher = StreamingMatcher(G, lag=lag)
+    for item in points:
+        yield from matcher.push(item)
+    yield from matcher.flush()
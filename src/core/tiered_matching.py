@@ -0,0 +1,278 @@
+# src/core/tiered_matching.py
+
+"""
+Tiered snapping: nearest-edge everywhere, HMM matching only where needed.
+
+Most of a run along one street is unambiguous; only junctions, bridges,
+parallel paths and GPS drift need the HMM. match_points_tiered runs the
+vectorised nearest-edge pass (snap_points_columnar) first and flags points
+where it is not trustworthy:
+
+    error      snapped more than AMBIGUOUS_ERROR_M from the raw point, or
+               no usable edge at all
+    nearby     an edge not touching the nearest one runs beside the point
+               (it projects onto the edge's interior) within
+               PARALLEL_TOLERANCE_DEG of the nearest edge's direction,
+               and is nearly as likely under the GPS noise model: its
+               emission log-likelihood is at most AMBIGUOUS_LOG_LIKELIHOOD
+               below the snapped edge's (parallel paths, both sides of a
+               canal). Edges meeting it at a junction lead to the same
+               nodes; further segments of the same street and crossing
+               streets are not alternatives (turns are the heading flag's)
+    heading    the track direction over HEADING_SPAN points on either side
+               and the snapped edge differ by more than
+               HEADING_TOLERANCE_DEG (turns at junctions, wrong street)
+
+Flagged points are widened by WINDOW_PAD points on both sides, merged into
+windows and only those windows are map-matched (MapMatcher.match). The
+result reports which tier every point took.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+import shapely
+
+from src.core.map_matching import (
+    GPS_SIGMA_M,
+    MatchResult,
+    get_map_matcher,
+    path_edges,
+    viterbi_backtrack,
+    viterbi_forward,
+)
+from src.core.projection import to_metric
+from src.core.snapping_fast import snap_points_columnar
+
+AMBIGUOUS_ERROR_M = 3 * GPS_SIGMA_M
+AMBIGUOUS_LOG_LIKELIHOOD = 2.0
+PARALLEL_TOLERANCE_DEG = 30.0
+HEADING_TOLERANCE_DEG = 60.0
+
+# Track heading is taken between the points HEADING_SPAN before and after,
+# so GPS noise does not dominate, and only where they are at least
+# MIN_HEADING_STEP_M apart (not standing still)
+HEADING_SPAN = 5
+MIN_HEADING_STEP_M = 10.0
+
+# Points added around flagged points, so the HMM sees where a window
+# enters and leaves the ambiguous section
+WINDOW_PAD = 3
+
+TIERS = ("nearest", "hmm")
+
+
+@dataclass
+class TieredMatch(MatchResult):
+    """MatchResult plus the tier of every point."""
+    tier: np.ndarray                  # (N,) index into TIERS
+    windows: List[Tuple[int, int]]    # [start, end) point ranges map-matched
+    flags: Dict[str, np.ndarray]      # (N,) bool per flag reason
+
+    @property
+    def tier_fractions(self) -> Dict[str, float]:
+        n = max(len(self.tier), 1)
+        return {name: float(np.sum(self.tier == i)) / n for i, name in enumerate(TIERS)}
+
+    @property
+    def flag_fractions(self) -> Dict[str, float]:
+        n = max(len(self.tier), 1)
+        return {name: float(f.sum()) / n for name, f in self.flags.items()}
+
+
+# -------------------------------------------------------------------
+# Flags
+# -------------------------------------------------------------------
+
+def ambiguity_flags(index, x, y, cols):
+    """Per-point flag arrays for snap_points_columnar output cols; see module docstring."""
+    n = len(x)
+    edge = cols["edge"]
+    err = cols["error_meters"]
+    usable = ~np.isnan(cols["offset"])
+
+    flags = {"error": (err > AMBIGUOUS_ERROR_M) | ~usable}
+
+    # Another physical edge (tree item) nearly as likely as the snapped one,
+    # not sharing a node with it and running alongside it
+    pts = shapely.points(x, y)
+    reach = np.sqrt(err ** 2 + 2 * GPS_SIGMA_M ** 2 * AMBIGUOUS_LOG_LIKELIHOOD)
+    p, item = index.tree.query(pts, predicate="dwithin", distance=np.where(usable, reach, 0))
+    other = index.tree_rows[item]
+    u, v = index.edge_u[edge[p]], index.edge_v[edge[p]]
+    ou, ov = index.edge_u[other], index.edge_v[other]
+    keep = (ou != u) & (ou != v) & (ov != u) & (ov != v) & usable[p] & index.valid[other]
+    p, other = p[keep], other[keep]
+    lines = index.geoms_m[other]
+    at = shapely.line_locate_point(lines, pts[p])
+    d = shapely.distance(lines, pts[p])
+    close = (d ** 2 - err[p] ** 2) / (2 * GPS_SIGMA_M ** 2) <= AMBIGUOUS_LOG_LIKELIHOOD
+    beside = (at > 0) & (at < shapely.length(lines))
+    own = index.geoms_m[edge[p]]
+    cos = np.abs(_cos_between(
+        _tangents(lines, at), _tangents(own, cols["offset"][p] * shapely.length(own))
+    ))
+    parallel = cos >= np.cos(np.radians(PARALLEL_TOLERANCE_DEG))
+    flags["nearby"] = np.bincount(p[close & beside & parallel], minlength=n) > 0
+
+    # Track direction against the snapped edge direction
+    ahead = np.minimum(np.arange(n) + HEADING_SPAN, n - 1)
+    behind = np.maximum(np.arange(n) - HEADING_SPAN, 0)
+    dx, dy = x[ahead] - x[behind], y[ahead] - y[behind]
+    heading = np.zeros(n, dtype=bool)
+    check = np.flatnonzero(usable & (np.hypot(dx, dy) >= MIN_HEADING_STEP_M))
+    if len(check):
+        lines = index.geoms_m[edge[check]]
+        tangent = _tangents(lines, cols["offset"][check] * shapely.length(lines))
+        cos = np.abs(_cos_between(np.column_stack([dx[check], dy[check]]), tangent))
+        heading[check] = cos < np.cos(np.radians(HEADING_TOLERANCE_DEG))
+    flags["heading"] = heading
+    return flags
+
+
+def _tangents(lines, at):
+    """(N, 2) direction of each line around distance at along it (metres)."""
+    a = shapely.get_coordinates(shapely.line_interpolate_point(lines, at - 1.0))
+    b = shapely.get_coordinates(shapely.line_interpolate_point(lines, at + 1.0))
+    return b - a
+
+
+def _cos_between(a, b):
+    """Cosine of the angle between the rows of two (N, 2) arrays."""
+    return np.sum(a * b, axis=1) / (np.hypot(*a.T) * np.hypot(*b.T) + 1e-12)
+
+
+def flagged_windows(flagged, pad=WINDOW_PAD):
+    """Merge flagged points, widened by pad, into [start, end) windows."""
+    n = len(flagged)
+    idx = np.flatnonzero(flagged)
+    if len(idx) == 0:
+        return []
+    starts = np.maximum(idx - pad, 0)
+    ends = np.minimum(idx + pad + 1, n)
+    windows = []
+    for a, b in zip(starts.tolist(), ends.tolist()):
+        if windows and a <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], b)
+        else:
+            windows.append([a, b])
+    return [(a, b) for a, b in windows]
+
+
+# -------------------------------------------------------------------
+# Matching
+# -------------------------------------------------------------------
+
+def _match_windows(matcher, pts, x, y, windows):
+    """
+    MapMatcher.match on every [start, end) window, with one candidate query
+    and one Viterbi pass over all of them; returns a MatchResult per window.
+    """
+    if not windows:
+        return []
+    sel = np.concatenate([np.arange(a, b) for a, b in windows])
+    bounds = np.cumsum([0] + [b - a for a, b in windows])
+    cut = np.zeros(len(sel) - 1, dtype=bool)
+    cut[bounds[1:-1] - 1] = True
+
+    cand_edge, cand_off, emission, trans, via, cache = matcher.lattice(x[sel], y[sel], cut=cut)
+    back = np.zeros(cand_edge.shape, dtype=np.int64)
+    vias = np.full(cand_edge.shape, -1, dtype=np.int64)
+    breaks, finals = [0], {}
+    viterbi_forward(emission[0], 1, emission, trans, via, back, vias, breaks, finals)
+    chosen = viterbi_backtrack(back, breaks, finals)
+
+    out = []
+    for (a, b), lo, hi in zip(windows, bounds[:-1].tolist(), bounds[1:].tolist()):
+        rows = slice(lo, hi)
+        out.append(matcher._result(
+            pts[a:b], x[a:b], y[a:b], cand_edge[rows], cand_off[rows], chosen[rows],
+            vias[rows], [t - lo for t in breaks if lo <= t < hi], cache,
+        ))
+    return out
+
+
+def match_points_tiered(G, points, pad=WINDOW_PAD) -> TieredMatch:
+    """
+    Nearest-edge snapping with HMM matching on ambiguous windows; see the
+    module docstring. The node path follows the nearest-edge node of every
+    unambiguous point and the matched path through every window.
+    """
+    matcher = get_map_matcher(G)
+    ga, index = matcher.ga, matcher.index
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(pts)
+    if n == 0:
+        raise ValueError("match_points_tiered() requires at least one point.")
+
+    cols = snap_points_columnar(ga, pts, index=index)
+    x, y = to_metric(pts[:, 1], pts[:, 0], index.crs)
+    flags = ambiguity_flags(index, x, y, cols)
+    flagged = np.logical_or.reduce(list(flags.values()))
+    windows = flagged_windows(flagged, pad)
+
+    snapped_lat = cols["snapped_lat"].copy()
+    snapped_lon = cols["snapped_lon"].copy()
+    edge = cols["edge"].copy()
+    offset = cols["offset"].copy()
+    error = cols["error_meters"].copy()
+    tier = np.zeros(n, dtype=np.int8)
+    breaks = [0]
+
+    # Node path: nearest-edge nodes between windows, matched paths inside.
+    # Nodes that do not share an edge (seams between tiers, nearest edges
+    # of consecutive points a hop apart) are joined by a bounded route
+    nodes: List[int] = []        # node indices
+    path_breaks: List[int] = []
+    cache = {}
+
+    def _extend(seq):
+        for node in ga.node_index(seq).tolist():
+            if nodes and nodes[-1] != node and not _adjacent(ga, nodes[-1], node):
+                route = matcher.join_nodes(nodes[-1], node, cache)
+                if route is None:
+                    path_breaks.append(len(nodes))
+                    nodes.append(node)
+                else:
+                    nodes.extend(route[1:])
+            elif not nodes or nodes[-1] != node:
+                nodes.append(node)
+
+    # All windows in one lattice, cut between windows so each is its own chain
+    for a, b in windows:
+        tier[a:b] = 1
+    matched = _match_windows(matcher, pts, x, y, windows)
+
+    done = 0
+    for (a, b), m in zip(windows, matched):
+        _extend(cols["node"][done:a].tolist())
+        snapped_lat[a:b], snapped_lon[a:b] = m.snapped_lat, m.snapped_lon
+        edge[a:b], offset[a:b], error[a:b] = m.edge, m.offset, m.error_meters
+        breaks += [a + t for t in m.breaks if a + t > 0]
+        _extend(m.node_path)
+        done = b
+    _extend(cols["node"][done:].tolist())
+
+    edge_path = path_edges(ga, nodes, path_breaks)
+
+    return TieredMatch(
+        snapped_lat=snapped_lat,
+        snapped_lon=snapped_lon,
+        edge=edge,
+        offset=offset,
+        error_meters=error,
+        node_path=[int(i) for i in ga.node_ids[nodes]],
+        edge_path=edge_path,
+        breaks=sorted(set(breaks)),
+        path_breaks=path_breaks,
+        tier=tier,
+        windows=windows,
+        flags=flags,
+    )
+
+
+def _adjacent(ga, u, v):
+    return ga.find_edge(u, v) is not None or ga.find_edge(v, u) is not None
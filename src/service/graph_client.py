@@ -0,0 +1,120 @@
+# src/service/graph_client.py
+
+"""
+Thin client for the graph service (see graph_service.py).
+
+Only uses the standard library, so importing it does not pull in numpy,
+shapely or osmnx and a page using it starts in milliseconds.
+"""
+
+import json
+import os
+import socket
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+
+DEFAULT_SOCKET_PATH = os.environ.get(
+    "RUNNINGAPP_GRAPH_SOCKET", os.path.join(PROJECT_ROOT, "data/run/graph_service.sock")
+)
+
+
+class GraphServiceError(RuntimeError):
+    """The service answered with an error."""
+
+
+class GraphServiceUnavailable(ConnectionError):
+    """No graph service answers on the socket; the message says how to start one."""
+
+
+class GraphClient:
+    """One persistent connection to the graph service."""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise GraphServiceUnavailable(
+                    f"No graph service on {self.socket_path} ({e}). "
+                    "Start it with: python -m src.service.graph_service"
+                ) from e
+            self._sock = sock
+            self._file = sock.makefile("rb")
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = None
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def call(self, op, **params):
+        """Send one request and return its result (raises GraphServiceError)."""
+        self._connect()
+        self._sock.sendall((json.dumps({"op": op, **params}) + "\n").encode())
+        line = self._file.readline()
+        if not line:
+            self.close()
+            raise GraphServiceUnavailable("Graph service closed the connection")
+
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise GraphServiceError(response.get("error"))
+        return response["result"]
+
+    # ---- batch endpoints ----
+
+    def snap(self, points):
+        return self.call("snap", points=[list(p) for p in points])
+
+    def nearest_nodes(self, points):
+        return self.call("nearest_node", points=[list(p) for p in points])
+
+    def route(self, pairs):
+        return self.call("route", pairs=[list(p) for p in pairs])
+
+    def crop(self, latlng=None, bbox=None, margin_deg=0.002):
+        if bbox is not None:
+            return self.call("crop", bbox=list(bbox))
+        return self.call("crop", latlng=[list(p) for p in latlng], margin_deg=margin_deg)
+
+    def nodes(self, bbox=None):
+        return self.call("nodes", bbox=None if bbox is None else list(bbox))
+
+    def run_path(self, latlng, times=None, mode="nearest"):
+        return self.call("run_path", latlng=[list(p) for p in latlng], times=times, mode=mode)
+
+    def bounds(self):
+        return self.call("bounds")
+
+    def stats(self):
+        return self.call("stats")
+
+
+def service_available(socket_path=DEFAULT_SOCKET_PATH):
+    """True if a graph service answers on socket_path."""
+    try:
+        with GraphClient(socket_path, timeout=1.0) as client:
+            return client.call("ping") == "pong"
+    except OSError:
+        return False
+
+
+if __name__ == "__main__":
+    with GraphClient() as client:
+        print(json.dumps(client.stats(), indent=2))
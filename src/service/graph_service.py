@@ -0,0 +1,277 @@
+# src/service/graph_service.py
+
+"""
+Long-lived local graph service.
+
+Loads the repaired master graph (memory-mapped GraphArrays) and its spatial
+indexes once, then answers requests over a Unix socket so UI pages and batch
+tools do not each load the graph themselves.
+
+Protocol: one JSON object per line in each direction.
+
+    -> {"op": "snap", "points": [[lat, lon], ...]}
+    <- {"ok": true, "result": [...], "ms": 1.7}
+
+Ops (all batch):
+    snap           points [[lat, lon], ...]        -> snap records (no geom)
+    nearest_node   points [[lat, lon], ...]        -> OSM node ids
+    route          pairs [[u, v], ...] (OSM ids)   -> {"nodes", "length_m"} or None
+    crop           latlng [[lat, lon], ...] or
+                   bbox [min_lat, max_lat, min_lon, max_lon],
+                   margin_deg (latlng only)        -> {"edges", "paths"}
+    nodes          bbox (optional, as for crop)    -> {"ids", "lat", "lon"}
+    run_path       latlng, times (optional), mode  -> {"raw", "snapped",
+                                                       "node_sequence", "stats"}
+    bounds                                         -> [min_lat, max_lat, min_lon, max_lon]
+    stats                                          -> latency per op + queue depth
+    ping                                           -> "pong"
+
+Start with:
+    python -m src.service.graph_service [--socket PATH] [--max-gap-m 30]
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+
+from src.core.graph_cropper import track_bbox
+from src.core.routing import path_length_m, shortest_path
+from src.core.run_path import RunPath
+from src.core.snap_index import get_snap_index
+from src.core.snapping_fast import snap_points_fast
+
+DEFAULT_SOCKET_PATH = os.environ.get(
+    "RUNNINGAPP_GRAPH_SOCKET", os.path.join(PROJECT_ROOT, "data/run/graph_service.sock")
+)
+
+# Number of recent requests per op kept for latency percentiles
+LATENCY_WINDOW = 1000
+
+
+# -------------------------------------------------------------------
+# Request handling
+# -------------------------------------------------------------------
+
+class GraphService:
+    """The loaded graph, its indexes and request statistics."""
+
+    def __init__(self, ga):
+        self.ga = ga
+
+        t0 = time.perf_counter()
+        self.snap_index = get_snap_index(ga)
+        self.node_index = self.snap_index.nodes
+        self.index_seconds = time.perf_counter() - t0
+
+        self._lock = threading.Lock()
+        self._latency = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self._counts = defaultdict(int)
+        self._errors = 0
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._started = time.time()
+
+    # ---- ops ----
+
+    def snap(self, points):
+        records = snap_points_fast(self.ga, points, index=self.snap_index)
+        return [
+            {
+                "snapped_lat": float(r["snapped_lat"]),
+                "snapped_lon": float(r["snapped_lon"]),
+                "edge": int(r["edge"]),
+                "error_meters": r["error_meters"],
+            }
+            for r in records
+        ]
+
+    def nearest_node(self, points):
+        if len(points) == 0:
+            return []
+        _, ids = self.node_index.nearest(points)
+        return ids.tolist()
+
+    def route(self, pairs):
+        out = []
+        for u, v in pairs:
+            try:
+                nodes = shortest_path(self.ga, int(u), int(v))
+            except KeyError:
+                nodes = None
+            if nodes is None:
+                out.append(None)
+                continue
+            out.append({"nodes": nodes, "length_m": path_length_m(self.ga, nodes)})
+        return out
+
+    def crop(self, latlng=None, bbox=None, margin_deg=0.002):
+        if bbox is None:
+            bbox = track_bbox(latlng, margin_deg)
+        min_lat, max_lat, min_lon, max_lon = bbox
+        edges = self.ga.geometry.query_bbox(min_lon, min_lat, max_lon, max_lat)
+        return {"edges": edges.tolist(), "paths": self.ga.geometry.paths(edges)}
+
+    def nodes(self, bbox=None):
+        x, y = np.asarray(self.ga.node_x), np.asarray(self.ga.node_y)
+        if bbox is None:
+            sel = np.arange(len(x))
+        else:
+            min_lat, max_lat, min_lon, max_lon = bbox
+            sel = np.flatnonzero((y >= min_lat) & (y <= max_lat) & (x >= min_lon) & (x <= max_lon))
+        return {
+            "ids": self.ga.node_ids[sel].tolist(),
+            "lat": y[sel].tolist(),
+            "lon": x[sel].tolist(),
+        }
+
+    def run_path(self, latlng, times=None, mode="nearest"):
+        run = RunPath(self.ga, latlng, times, mode=mode)
+        return {
+            "raw": [list(p) for p in run.raw_points],
+            "snapped": [[float(lat), float(lon)] for lat, lon in run.snapped_points],
+            "node_sequence": [int(n) for n in run.node_sequence],
+            "stats": {k: None if v is None else float(v) for k, v in run.stats.__dict__.items()},
+        }
+
+    def bounds(self):
+        return [
+            float(self.ga.node_y.min()),
+            float(self.ga.node_y.max()),
+            float(self.ga.node_x.min()),
+            float(self.ga.node_x.max()),
+        ]
+
+    def stats(self):
+        with self._lock:
+            latency = {}
+            for op, window in self._latency.items():
+                ms = np.asarray(window)
+                latency[op] = {
+                    "count": self._counts[op],
+                    "mean_ms": round(float(ms.mean()), 3),
+                    "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                    "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                    "max_ms": round(float(ms.max()), 3),
+                }
+            return {
+                "uptime_s": round(time.time() - self._started, 1),
+                "queue_depth": self._in_flight - 1,  # excluding this request
+                "max_queue_depth": self._max_in_flight,
+                "errors": self._errors,
+                "num_nodes": self.ga.num_nodes,
+                "num_edges": self.ga.num_edges,
+                "index_seconds": round(self.index_seconds, 3),
+                "latency": latency,
+            }
+
+    def ping(self):
+        return "pong"
+
+    # ---- dispatch ----
+
+    OPS = ("snap", "nearest_node", "route", "crop", "nodes", "run_path", "bounds", "stats", "ping")
+
+    def handle(self, request):
+        """Run one decoded request and return the response dict."""
+        op = request.get("op")
+        params = {k: v for k, v in request.items() if k != "op"}
+
+        with self._lock:
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+
+        t0 = time.perf_counter()
+        try:
+            if op not in self.OPS:
+                raise ValueError(f"Unknown op: {op}")
+            response = {"ok": True, "result": getattr(self, op)(**params)}
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        ms = (time.perf_counter() - t0) * 1000.0
+
+        with self._lock:
+            self._in_flight -= 1
+            if op in self.OPS:
+                self._counts[op] += 1
+                self._latency[op].append(ms)
+
+        response["ms"] = round(ms, 3)
+        return response
+
+
+# -------------------------------------------------------------------
+# Socket server
+# -------------------------------------------------------------------
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                response = {"ok": False, "error": f"Bad request: {e}"}
+            else:
+                response = self.server.service.handle(request)
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
+
+
+class GraphServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, service, socket_path=DEFAULT_SOCKET_PATH):
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # stale socket from a previous run
+        self.service = service
+        self.socket_path = socket_path
+        super().__init__(socket_path, _Handler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the walk graph over a Unix socket.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH)
+    parser.add_argument("--max-gap-m", type=float, default=30)
+    args = parser.parse_args()
+
+    from src.core.graph_loader import load_graph_arrays
+
+    t0 = time.perf_counter()
+    service = GraphService(load_graph_arrays(max_gap_m=args.max_gap_m))
+    print(
+        f"DEBUG: graph service ready in {time.perf_counter() - t0:.2f} s "
+        f"({service.ga.num_nodes} nodes, {service.ga.num_edges} edges)"
+    )
+
+    server = GraphServer(service, args.socket)
+    print("DEBUG: listening on", args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
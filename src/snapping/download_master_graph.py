@@ -1,27 +1,26 @@
+import sys
+import os
+
+# Ensure project root is on path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
 import osmnx as ox
-from shapely.geometry import Polygon
-
-def download_master_graph_bbox():
-    north = 52.390
-    south = 52.340
-    east  = 4.990
-    west  = 4.870
-
-    poly = Polygon([
-        (west, north),
-        (east, north),
-        (east, south),
-        (west, south),
-        (west, north),
-    ])
+
+from src.core.regions import get_region, region_polygon
+
+
+def download_master_graph_bbox(region_name="amsterdam_east"):
+    region = get_region(region_name)
 
     G = ox.graph.graph_from_polygon(
-        poly,
-        network_type="walk",
+        region_polygon(region),
+        network_type=region["network_type"],
         simplify=False,
     )
 
-    ox.io.save_graphml(G, "data/osm_cache/amsterdam_east_master_dense.graphml")
+    ox.io.save_graphml(G, f"{PROJECT_ROOT}/data/osm_cache/{region_name}_master_dense.graphml")
 
     print("DONE:", len(G.nodes()), "nodes,", len(G.edges()), "edges")
 
@@ -1,5 +1,15 @@
+import sys
+import os
+
+# Ensure project root is on path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
 import osmnx as ox
-G = ox.load_graphml("/home/nathan/Downloads/RunningApp/data/osm_cache/amsterdam_east_master.graphml")
+from src.core.graph_loader import MASTER_GRAPH_PATH
+
+G = ox.load_graphml(MASTER_GRAPH_PATH)
 _, gdf_edges = ox.graph_to_gdfs(G)
 
 print(gdf_edges.geometry.head())
@@ -1,3 +1,12 @@
+import sys
+import os
+
+# Ensure project root is on path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
 import osmnx as ox
-G = ox.load_graphml("data/osm_cache/amsterdam_east_master.graphml")
+from src.core.graph_loader import MASTER_GRAPH_PATH
+G = ox.load_graphml(MASTER_GRAPH_PATH)
 print(len(G.nodes()), len(G.edges()))
@@ -0,0 +1,178 @@
+# src/strava/replay_streams.py
+
+"""
+Replay archived activity streams through the streaming matcher, as if they
+came from a live feed, and measure per-point latency.
+
+    python src/strava/replay_streams.py 1234567890 [more ids] [--speed 10] [--lag 10] [--batch 1]
+    python src/strava/replay_streams.py --all --speed 0
+
+Points are cleaned like RunPath cleans them (preprocess_points; --raw
+skips this) and pushed at their recorded time divided by --speed (--speed 0
+pushes as fast as possible), --batch points per push. Reported per activity:
+
+    push       wall time of StreamingMatcher.push per point (p50 / p95 / max)
+    decision   wall time from a point's arrival to its decision, which
+               includes waiting for the lag window to fill
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+
+from src.core.batch_snap import STREAMS_DIR, stream_paths
+from src.core.graph_loader import load_graph_arrays
+from src.core.preprocessing import preprocess_points
+from src.core.streaming_matching import STREAM_LAG, StreamingMatcher
+
+
+# -------------------------------------------------------------------
+# Replay
+# -------------------------------------------------------------------
+
+def load_stream(path):
+    """(latlng (N, 2), seconds (N,)) of a stream file, or None without GPS."""
+    with open(path, "r") as f:
+        streams = json.load(f)
+    latlng = streams.get("latlng", {}).get("data")
+    if not latlng:
+        return None
+    times = streams.get("time", {}).get("data")
+    if not times or len(times) != len(latlng):
+        times = range(len(latlng))
+    return np.asarray(latlng, dtype=np.float64), np.asarray(times, dtype=np.float64)
+
+
+def clean_stream(latlng, times):
+    """
+    The points preprocess_points keeps, with their times. Each point is only
+    judged against the one before it, so a live feed can clean as it goes.
+    """
+    rows = latlng.tolist()
+    keep = np.zeros(len(rows), dtype=bool)
+    i = 0
+    for p in preprocess_points(rows, times.tolist()):
+        while tuple(rows[i]) != p:
+            i += 1
+        keep[i] = True
+        i += 1
+    return latlng[keep], times[keep]
+
+
+def replay(G, latlng, times, speed=10.0, lag=STREAM_LAG, batch=1):
+    """
+    Feed one track into a StreamingMatcher at speed x real time.
+    Returns (matches, push_ms per point, decision_ms per point).
+    """
+    matcher = StreamingMatcher(G, lag=lag)
+    n = len(latlng)
+    arrived = np.empty(n)
+    decided = np.empty(n)
+    push_ms = []
+    matches = []
+
+    def _record(out, now):
+        for m in out:
+            decided[m.index] = now
+        matches.extend(out)
+
+    t_start = time.perf_counter()
+    for a in range(0, n, batch):
+        b = min(a + batch, n)
+        if speed > 0:
+            wait = t_start + (times[b - 1] - times[0]) / speed - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+
+        t0 = time.perf_counter()
+        arrived[a:b] = t0
+        out = matcher.push(latlng[a:b])
+        t1 = time.perf_counter()
+        push_ms.append(1000 * (t1 - t0) / (b - a))
+        _record(out, t1)
+
+    _record(matcher.flush(), time.perf_counter())
+    return matches, np.asarray(push_ms), 1000 * (decided - arrived)
+
+
+def _pct(values):
+    if len(values) == 0:
+        return "-"
+    return (f"p50 {np.percentile(values, 50):7.2f}  p95 {np.percentile(values, 95):7.2f}  "
+            f"max {values.max():7.2f} ms")
+
+
+# -------------------------------------------------------------------
+# Main
+# -------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay stream files through the streaming matcher.")
+    parser.add_argument("ids", nargs="*", type=int, help="activity ids (default: --all)")
+    parser.add_argument("--all", action="store_true", help="replay every stream file")
+    parser.add_argument("--streams-dir", default=STREAMS_DIR)
+    parser.add_argument("--speed", type=float, default=10.0, help="x real time; 0 = no waiting")
+    parser.add_argument("--lag", type=int, default=STREAM_LAG)
+    parser.add_argument("--batch", type=int, default=1, help="points per push")
+    parser.add_argument("--max-gap-m", type=float, default=30)
+    parser.add_argument("--raw", action="store_true", help="push points without preprocess_points")
+    args = parser.parse_args(argv)
+
+    if args.ids:
+        paths = [os.path.join(args.streams_dir, f"{i}.json") for i in args.ids]
+    else:
+        paths = stream_paths(args.streams_dir)
+        if not args.all:
+            paths = paths[-1:]
+    if not paths:
+        print(f"No stream files in {args.streams_dir}")
+        return
+
+    G = load_graph_arrays(max_gap_m=args.max_gap_m, mmap=True)
+    all_push, all_decision = [], []
+
+    for path in paths:
+        stream = load_stream(path)
+        name = os.path.basename(path)
+        if stream is None:
+            print(f"{name}: no GPS, skipped")
+            continue
+
+        latlng, times = stream
+        dropped = 0
+        if not args.raw:
+            dropped = len(latlng)
+            latlng, times = clean_stream(latlng, times)
+            dropped -= len(latlng)
+
+        t0 = time.perf_counter()
+        matches, push_ms, decision_ms = replay(
+            G, latlng, times, speed=args.speed, lag=args.lag, batch=args.batch
+        )
+        wall = time.perf_counter() - t0
+        nodes = sum(len(m.new_nodes) for m in matches)
+        restarts = sum(m.restart for m in matches)
+
+        print(f"\n{name}: {len(latlng)} points ({dropped} dropped by cleaning) in {wall:.1f} s, "
+              f"{nodes} path nodes, {restarts} chain starts")
+        print(f"  push      {_pct(push_ms)}")
+        print(f"  decision  {_pct(decision_ms)}")
+        all_push.append(push_ms)
+        all_decision.append(decision_ms)
+
+    if len(all_push) > 1:
+        print(f"\nAll activities (lag {args.lag}, batch {args.batch}, speed {args.speed}x)")
+        print(f"  push      {_pct(np.concatenate(all_push))}")
+        print(f"  decision  {_pct(np.concatenate(all_decision))}")
+
+
+if __name__ == "__main__":
+    main()
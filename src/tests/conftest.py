@@ -0,0 +1,93 @@
+import os
+import sys
+
+import networkx as nx
+import numpy as np
+import pytest
+from shapely.geometry import LineString
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.core.preprocessing import haversine_m
+
+
+def make_grid_graph(rows=6, cols=6, spacing_deg=0.0005, lat0=52.36, lon0=4.90):
+    """
+    Small osmnx-style walk graph: a bidirectional grid around Amsterdam East.
+    Every other horizontal edge carries an explicit (bent) geometry.
+    """
+    G = nx.MultiDiGraph(crs="epsg:4326")
+
+    def nid(r, c):
+        return 1000 + r * cols + c
+
+    for r in range(rows):
+        for c in range(cols):
+            G.add_node(nid(r, c), x=lon0 + c * spacing_deg, y=lat0 + r * spacing_deg)
+
+    def connect(a, b, bend):
+        xa, ya = G.nodes[a]["x"], G.nodes[a]["y"]
+        xb, yb = G.nodes[b]["x"], G.nodes[b]["y"]
+        length = haversine_m(ya, xa, yb, xb)
+        if bend:
+            mid = ((xa + xb) / 2, (ya + yb) / 2 + spacing_deg * 0.05)
+            geom = LineString([(xa, ya), mid, (xb, yb)])
+            G.add_edge(a, b, length=length, geometry=geom)
+            G.add_edge(b, a, length=length, geometry=LineString(geom.coords[::-1]))
+        else:
+            G.add_edge(a, b, length=length)
+            G.add_edge(b, a, length=length)
+
+    for r in range(rows):
+        for c in range(cols):
+            if c + 1 < cols:
+                connect(nid(r, c), nid(r, c + 1), bend=(r % 2 == 0))
+            if r + 1 < rows:
+                connect(nid(r, c), nid(r + 1, c), bend=False)
+
+    return G
+
+
+def make_gappy_graph():
+    """Grid with a few removed edges plus isolated nodes off to the side."""
+    G = make_grid_graph(rows=8, cols=8, spacing_deg=0.0002)
+    G.remove_edges_from([(1009, 1010, 0), (1010, 1009, 0), (1020, 1028, 0), (1028, 1020, 0)])
+    for k in range(6):
+        G.add_node(5000 + k, x=4.9030 + k * 0.00011, y=52.3600 + (k % 3) * 0.00007)
+    G.add_node(6000, x=4.9002, y=52.3610)
+    G.add_node(6001, x=4.90028, y=52.36108)
+    G.add_edge(6000, 6001, length=haversine_m(52.3610, 4.9002, 52.36108, 4.90028),
+               geometry=LineString([(4.9002, 52.3610), (4.90028, 52.36108)]))
+    return G
+
+
+def make_serpentine_track(rows=8, cols=8, spacing_deg=0.0005, step_deg=0.00003, seed=0):
+    """Noisy points (~4 m) walking the rows of make_grid_graph east, west, east, ..."""
+    rng = np.random.default_rng(seed)
+    corners = []
+    for r in range(rows):
+        lons = [4.90, 4.90 + (cols - 1) * spacing_deg]
+        for lon in (lons if r % 2 == 0 else lons[::-1]):
+            corners.append((52.36 + r * spacing_deg, lon))
+    corners = np.array(corners)
+
+    seg = np.hypot(*np.diff(corners, axis=0).T)
+    at = np.concatenate([[0], np.cumsum(seg)])
+    s = np.arange(0, at[-1], step_deg)
+    track = np.column_stack([np.interp(s, at, corners[:, 0]), np.interp(s, at, corners[:, 1])])
+    return track + rng.normal(0, 0.00004, track.shape)
+
+
+def edge_attr_list(G):
+    """(u, v, key, length, geometry coords) per edge, in G's edge order."""
+    return [
+        (u, v, k, round(d["length"], 9), tuple(d["geometry"].coords) if "geometry" in d else None)
+        for u, v, k, d in G.edges(keys=True, data=True)
+    ]
+
+
+@pytest.fixture
+def grid_graph():
+    return make_grid_graph()
@@ -0,0 +1,45 @@
+import json
+
+from conftest import make_grid_graph
+from src.core.batch_snap import ArchiveStore, snap_archive, stream_paths
+from src.core.graph_arrays import GraphArrays
+from src.core.run_path import RunPath
+
+TRACK = [(52.3600, 4.9001), (52.3601, 4.9010), (52.3600, 4.9020), (52.3601, 4.9030)]
+
+
+def _write_streams(tmp_path):
+    streams_dir = tmp_path / "streams"
+    streams_dir.mkdir()
+    for act_id, latlng in ((11, TRACK), (12, TRACK[::-1]), (13, None)):
+        streams = {"time": {"data": list(range(0, 40, 10))}}
+        if latlng is not None:
+            streams["latlng"] = {"data": [list(p) for p in latlng]}
+        (streams_dir / f"{act_id}.json").write_text(json.dumps(streams))
+    return stream_paths(str(streams_dir))
+
+
+def test_archive_is_snapped_once_per_graph_version(tmp_path):
+    paths = _write_streams(tmp_path)
+    ga = GraphArrays.from_graph(make_grid_graph())
+    ga.meta["fingerprint"] = "grid-v1"
+    store = ArchiveStore(str(tmp_path / "paths.sqlite"))
+
+    report = snap_archive(ga, paths, store, workers=2)
+    assert (report["ok"], report["no_gps"], report["errors"]) == (2, 1, 0)
+    assert set(report["stage_s"]) >= {"load", "snap", "nodes", "store"}
+
+    row = store.get(11, "grid-v1")
+    assert row["status"] == "ok"
+    assert row["node_sequence"] == RunPath(ga, TRACK).node_sequence
+    assert store.get(13, "grid-v1")["status"] == "no_gps"
+
+    # Resuming skips everything already stored for this version
+    again = snap_archive(ga, paths, store, workers=1)
+    assert (again["skipped"], again["processed"]) == (3, 0)
+
+    # A new graph version is processed again; old rows stay readable
+    ga.meta["fingerprint"] = "grid-v2"
+    assert snap_archive(ga, paths, store, workers=1)["processed"] == 3
+    assert store.get(12, "grid-v1")["node_sequence"] == store.get(12, "grid-v2")["node_sequence"]
+    store.close()
@@ -0,0 +1,58 @@
+import os
+
+from src.core.build_graph import Pipeline, read_manifest
+from src.core.graph_loader import file_sha256
+
+
+def _run(out_dir, source, calls, force=False):
+    """Two stub stages: source -> upper.txt -> count.txt."""
+    upper = os.path.join(out_dir, "upper.txt")
+    count = os.path.join(out_dir, "count.txt")
+
+    def build_upper(out):
+        calls.append("upper")
+        with open(source) as f, open(out, "w") as g:
+            g.write(f.read().strip().upper())
+
+    def build_count(out):
+        calls.append("count")
+        with open(upper) as f, open(out, "w") as g:
+            g.write(str(len(f.read())))
+
+    pipe = Pipeline(out_dir, force=force)
+    pipe.run("upper", {"source": file_sha256(source)}, upper, build_upper, os.path.exists)
+    pipe.run("count", {"upper": file_sha256(upper)}, count, build_count, os.path.exists)
+    return [status for _, status, _ in pipe.timings]
+
+
+def test_pipeline_reruns_only_stages_with_changed_inputs(tmp_path):
+    out_dir = str(tmp_path)
+    source = os.path.join(out_dir, "source.txt")
+    with open(source, "w") as f:
+        f.write("abc")
+
+    calls = []
+    assert _run(out_dir, source, calls) == ["built", "built"]
+    assert _run(out_dir, source, calls) == ["skipped", "skipped"]
+    assert calls == ["upper", "count"]
+
+    # New input bytes, same stage output: only the first stage re-runs
+    with open(source, "w") as f:
+        f.write("abc\n")
+    assert _run(out_dir, source, calls) == ["built", "skipped"]
+
+    # Changed output of the first stage invalidates the second
+    with open(source, "w") as f:
+        f.write("abcd")
+    assert _run(out_dir, source, calls) == ["built", "built"]
+    with open(os.path.join(out_dir, "count.txt")) as f:
+        assert f.read() == "4"
+
+    # A missing output is rebuilt even when the inputs match
+    os.remove(os.path.join(out_dir, "count.txt"))
+    assert _run(out_dir, source, calls) == ["skipped", "built"]
+
+    assert _run(out_dir, source, calls, force=True) == ["built", "built"]
+    stages = read_manifest(out_dir)["stages"]
+    assert stages["count"]["inputs"] == {"upper": file_sha256(os.path.join(out_dir, "upper.txt"))}
+    assert stages["count"]["output"] == "count.txt"
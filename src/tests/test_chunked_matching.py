@@ -0,0 +1,27 @@
+import numpy as np
+
+from conftest import make_grid_graph, make_serpentine_track
+from src.core.chunked_matching import match_points_chunked, snap_points_chunked
+from src.core.graph_arrays import GraphArrays
+from src.core.map_matching import match_points
+from src.core.snapping_fast import snap_points_columnar
+
+
+def test_chunked_results_equal_sequential():
+    ga = GraphArrays.from_graph(make_grid_graph(rows=8, cols=8))
+    points = make_serpentine_track()
+    assert len(points) > 1000
+
+    seq = match_points(ga, points)
+    par = match_points_chunked(ga, points, chunk_size=250, overlap=40, workers=2)
+    assert par.node_path == seq.node_path
+    assert par.edge_path == seq.edge_path
+    assert par.breaks == seq.breaks
+    assert np.array_equal(par.edge, seq.edge)
+    assert np.allclose(par.snapped_lat, seq.snapped_lat)
+    assert np.allclose(par.snapped_lon, seq.snapped_lon)
+
+    cols = snap_points_columnar(ga, points)
+    chunked = snap_points_chunked(ga, points, chunk_size=300, workers=2)
+    for key, values in cols.items():
+        assert np.array_equal(chunked[key], values, equal_nan=True)
@@ -0,0 +1,55 @@
+import numpy as np
+from shapely.geometry import LineString, MultiLineString
+
+from src.core.edge_geometry import EdgeGeometry
+from src.core.graph_snapshot import graph_to_arrays
+from src.core.preprocessing import haversine_m
+from conftest import make_grid_graph
+
+
+def test_edge_geometry_matches_brute_force():
+    G = make_grid_graph(rows=8, cols=8, spacing_deg=0.0003)
+    arrays = graph_to_arrays(G)
+    table = EdgeGeometry.from_arrays(arrays, dtype=np.float64)
+    table.grid_cell_deg = 0.0004
+    coords = [table.coords_of(e) for e in range(len(table))]
+
+    # lengths_m: haversine along every polyline
+    expected = [
+        sum(haversine_m(a[1], a[0], b[1], b[0]) for a, b in zip(c[:-1], c[1:]))
+        for c in coords
+    ]
+    assert np.allclose(table.lengths_m, expected)
+
+    # paths: the polyline coordinates, all edges and a subset
+    assert table.paths() == [c.tolist() for c in coords]
+    assert table.paths([5, 2]) == [coords[5].tolist(), coords[2].tolist()]
+
+    # query_bbox: every edge whose bounds touch the box, and nothing else
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        x0, y0 = np.array([4.8995, 52.3595]) + rng.random(2) * 0.0025
+        x1, y1 = np.array([x0, y0]) + rng.random(2) * 0.001
+        brute = [
+            e for e, c in enumerate(coords)
+            if c[:, 0].min() <= x1 and c[:, 0].max() >= x0
+            and c[:, 1].min() <= y1 and c[:, 1].max() >= y0
+        ]
+        assert sorted(table.query_bbox(x0, y0, x1, y1).tolist()) == brute
+
+
+def test_multilinestring_edges_keep_their_shape():
+    G = make_grid_graph(rows=2, cols=2)
+    n = G.nodes
+    a, b = (n[1000]["x"], n[1000]["y"]), (n[1003]["x"], n[1003]["y"])
+    bend = (a[0], b[1])
+    G.add_edge(1000, 1003, length=100.0,
+               geometry=MultiLineString([LineString([a, bend]), LineString([bend, b])]))
+
+    arrays = graph_to_arrays(G)
+    table = EdgeGeometry.from_arrays(arrays)
+    idx = np.searchsorted(arrays["node_ids"], [1000, 1003])
+    lo, hi = arrays["indptr"][idx[0]], arrays["indptr"][idx[0] + 1]
+    e = lo + int(np.flatnonzero(arrays["targets"][lo:hi] == idx[1])[-1])
+
+    assert table.coords_of(e).tolist() == [list(a), list(bend), list(b)]
@@ -0,0 +1,76 @@
+import numpy as np
+
+from src.core.edge_store import EdgeStore
+from src.core.graph_arrays import GraphArrays
+from src.core.map_matching import get_map_matcher, match_points
+from src.core.repair_one_gap import add_edge_between_nodes
+from src.core.routing import path_length_m, shortest_path
+from src.core.run_path import RunPath
+from src.core.snap_index import get_snap_index, graph_fingerprint
+from src.core.snapping_fast import snap_points_columnar
+from conftest import make_grid_graph, make_serpentine_track
+
+
+def test_edge_store_dedupes_and_roundtrips():
+    G = make_grid_graph()
+    n = G.nodes
+    # Repair-style edge: both directions share one geometry object
+    add_edge_between_nodes(G, 1000, 1007, n[1000]["x"], n[1000]["y"], n[1007]["x"], n[1007]["y"])
+    # One-way edge
+    G.add_edge(1000, 1035, length=5.0)
+
+    store = EdgeStore.from_graph(G)
+
+    assert store.num_directed_edges == G.number_of_edges()
+    assert store.num_edges == (G.number_of_edges() - 1) // 2 + 1
+
+    H = store.to_graph()
+    assert set(H.edges(keys=True)) == set(G.edges(keys=True))
+    for u, v, k, data in G.edges(keys=True, data=True):
+        h = H.edges[u, v, k]
+        assert h["length"] == data["length"]
+        assert ("geometry" in h) == ("geometry" in data)
+        if "geometry" in data:
+            assert list(h["geometry"].coords) == list(data["geometry"].coords)
+
+
+def test_edge_store_routes_on_rows():
+    G = make_grid_graph()
+    G.add_edge(1000, 1035, length=5.0)       # one-way shortcut
+    store = EdgeStore.from_graph(G)
+    ga = GraphArrays.from_graph(G)
+
+    for a, b in [(1000, 1035), (1035, 1000), (1007, 1029), (1014, 1014)]:
+        path = shortest_path(store, a, b)
+        assert path_length_m(store, path) == path_length_m(ga, ga.shortest_path(a, b))
+        assert path_length_m(store, path) == path_length_m(G, path)
+
+
+def test_edge_store_is_snapped_and_matched_without_keeping_an_expansion(tmp_path):
+    G = make_grid_graph()
+    ga = GraphArrays.from_graph(G)
+    EdgeStore.from_graph(G).save(str(tmp_path / "grid.edges"))
+    store = EdgeStore.load(str(tmp_path / "grid.edges"))
+    assert isinstance(store.edge_u, np.memmap)
+
+    track = make_serpentine_track(rows=6, cols=6)
+
+    # Snapping indexes store rows, one per physical edge
+    index = get_snap_index(store)
+    assert index.num_edges == store.num_edges
+    got = snap_points_columnar(store, track)
+    expected = snap_points_columnar(ga, track)
+    np.testing.assert_allclose(got["error_meters"], expected["error_meters"], atol=1e-6)
+    np.testing.assert_allclose(got["snapped_lat"], expected["snapped_lat"], atol=1e-9)
+    assert set(index.edge_u[got["edge"]]) <= set(store.node_ids)
+
+    # The matcher holds the only expansion; the store keeps none
+    matcher = get_map_matcher(store)
+    assert get_map_matcher(store) is matcher
+    assert graph_fingerprint(matcher.ga) != store.fingerprint
+    assert not any(isinstance(v, GraphArrays) for v in store.__dict__.values())
+    assert match_points(store, track).node_path == match_points(ga, track).node_path
+
+    run = RunPath(store, track.tolist(), mode="hmm")
+    assert run.G is store
+    assert run.node_sequence == match_points(ga, track).node_path
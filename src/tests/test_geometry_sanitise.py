@@ -0,0 +1,47 @@
+import numpy as np
+from shapely.geometry import GeometryCollection, LinearRing, LineString, MultiLineString, Point
+
+from conftest import make_grid_graph
+from src.core.edge_geometry import EdgeGeometry
+from src.core.graph_arrays import GraphArrays
+from src.core.geometry_sanitise import sanitise_geometries
+from src.core.graph_snapshot import graph_to_arrays
+
+
+def test_sanitise_geometries_mixed_types():
+    line = LineString([(0, 0), (1, 0)])
+    geoms = np.array([
+        line,
+        MultiLineString([[(0, 0), (1, 0)], [(1, 0), (2, 0)]]),
+        GeometryCollection([Point(0, 0), LineString([(0, 0), (0, 3)])]),
+        LinearRing([(0, 0), (1, 0), (1, 1)]),
+        Point(0, 0),
+        LineString([(1, 1), (1, 1)]),
+        None,
+    ], dtype=object)
+
+    lines, valid = sanitise_geometries(geoms)
+
+    assert lines[0] is line
+    assert lines[1].equals(LineString([(0, 0), (2, 0)]))
+    assert lines[2].equals(LineString([(0, 0), (0, 3)]))
+    assert lines[3].geom_type == "LineString"
+    assert lines[4] is None and lines[6] is None
+    assert valid.tolist() == [True, True, True, True, False, False, False]
+
+
+def test_snapshot_stores_merged_multilinestrings():
+    G = make_grid_graph(rows=2, cols=2)
+    u, v = 1000, 1001
+    xu, yu = G.nodes[u]["x"], G.nodes[u]["y"]
+    xv, yv = G.nodes[v]["x"], G.nodes[v]["y"]
+    mid = ((xu + xv) / 2, yu + 0.0001)
+    G.edges[u, v, 0]["geometry"] = MultiLineString([[(xu, yu), mid], [mid, (xv, yv)]])
+
+    ga = GraphArrays(**graph_to_arrays(G))
+    table = EdgeGeometry.from_arrays(ga)
+    edge = ga.find_edge(ga.node_index(u), ga.node_index(v))
+
+    assert ga.has_geometry[edge]
+    assert len(table.coords_of(edge)) == 3
+    assert table.valid.all()
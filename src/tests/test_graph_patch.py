@@ -0,0 +1,76 @@
+import numpy as np
+
+from conftest import make_grid_graph
+from src.core.graph_arrays import GraphArrays
+from src.core.graph_patch import (
+    GraphDelta,
+    append_patch,
+    apply_patches,
+    apply_patches_arrays,
+    read_patches,
+    repaired_patches,
+)
+from src.core.graph_snapshot import graph_to_arrays
+from src.core.incremental_repair import RepairIndex
+
+
+def test_patch_file_round_trip_matches_networkx(tmp_path):
+    G = make_grid_graph()
+    path = str(tmp_path / "patches.jsonl")
+
+    append_patch("add", 1000, 1035, source="test", path=path)
+    append_patch("remove", 1000, 1001, source="test", path=path)
+    append_patch("add", 1001, 1034, source="test", path=path)
+    append_patch("remove", 1034, 1001, source="test", path=path)
+    patches = read_patches(path)
+    assert len(patches) == 4
+
+    patched = apply_patches(G.copy(), patches)
+    assert patched.has_edge(1000, 1035) and patched.has_edge(1035, 1000)
+    assert not patched.has_edge(1000, 1001) and not patched.has_edge(1001, 1000)
+    assert not patched.has_edge(1001, 1034)
+
+    expected = graph_to_arrays(patched)
+    got = apply_patches_arrays(GraphArrays.from_graph(G), patches)
+    for name in ("node_ids", "indptr", "targets", "lengths", "geom_coords"):
+        np.testing.assert_array_equal(got[name], expected[name])
+
+
+def test_graph_delta_leaves_base_untouched(tmp_path):
+    G = make_grid_graph()
+    num_edges = G.number_of_edges()
+    path = str(tmp_path / "patches.jsonl")
+
+    delta = GraphDelta(G)
+    delta.add_edge(1000, 1035)
+    delta.remove_edge(1000, 1001)
+    assert delta.has_edge(1035, 1000)
+    assert not delta.has_edge(1000, 1001)
+    assert len(delta.added_paths()) == 1
+    assert G.number_of_edges() == num_edges
+
+    materialized = delta.materialize()
+    assert materialized.number_of_edges() == num_edges + 2 - 2
+
+    written = delta.commit(source="test", path=path)
+    assert len(written) == 2 and len(delta) == 0
+    assert [p["op"] for p in read_patches(path)] == ["add", "remove"]
+
+
+def test_patches_are_repaired_around_without_reconnecting_removals():
+    # Two spur nodes in the middle of a block, each linked to one corner
+    G = make_grid_graph()
+    G.add_node(9000, x=4.90120, y=52.36120)
+    G.add_node(9001, x=4.90130, y=52.36130)
+    apply_patches(G, [{"op": "add", "u": 9000, "v": 1014}, {"op": "add", "u": 9001, "v": 1021}])
+    records = [{"op": "remove", "u": 9000, "v": 1014}, {"op": "remove", "u": 9001, "v": 1021}]
+
+    # Cut loose, the two are a gap: repaired like RepairIndex on the whole graph
+    patches = repaired_patches(graph_to_arrays(G), records, max_gap_m=60)
+    full = apply_patches(G.copy(), records)
+    expected = RepairIndex(full, max_gap_m=60).repair(nodes=[9000, 1014, 9001, 1021])
+    assert [(p["u"], p["v"]) for p in patches[2:]] == expected == [(9000, 9001)]
+
+    # A pair removed by a patch is never reconnected
+    records.append({"op": "remove", "u": 9000, "v": 9001})
+    assert repaired_patches(graph_to_arrays(G), records, max_gap_m=60) == records
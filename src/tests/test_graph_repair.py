@@ -0,0 +1,104 @@
+import networkx as nx
+
+from conftest import edge_attr_list as _edge_list, make_gappy_graph as _gappy_graph, make_grid_graph
+from src.core import graph_loader
+from src.core.graph_loader import repaired_cache_key
+from src.core.graph_repair import _repair_graph_loop, repair_candidates, repair_graph
+from src.core.graph_snapshot import save_snapshot
+from src.core.preprocessing import haversine_m
+
+
+def test_bulk_repair_matches_per_pair_loop():
+    for max_gap_m in (10, 30, 60):
+        expected = _repair_graph_loop(_gappy_graph(), max_gap_m=max_gap_m)
+        got = repair_graph(_gappy_graph(), max_gap_m=max_gap_m)
+
+        # Connectors are merged in sorted order, so only the order may differ
+        assert sorted(_edge_list(got)) == sorted(_edge_list(expected))
+        if max_gap_m > 10:
+            assert got.number_of_edges() > _gappy_graph().number_of_edges()
+
+
+def test_partitioned_repair_is_identical_to_serial():
+    serial = repair_graph(_gappy_graph(), max_gap_m=60)
+    for workers, cell_size_m in ((1, 60), (2, 100), (2, 2000)):
+        got = repair_graph(_gappy_graph(), max_gap_m=60, workers=workers, cell_size_m=cell_size_m)
+        assert _edge_list(got) == _edge_list(serial)
+
+
+def _canal_block(k=30):
+    """Two parallel streets ~20 m apart, joined only at both ends."""
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    dx, dy = 0.000147, 0.00018  # ~10 m, ~20 m
+    for side in (0, 1):
+        for c in range(k):
+            G.add_node(100 * side + c, x=4.90 + c * dx, y=52.36 + side * dy)
+    pairs = [(100 * s + c, 100 * s + c + 1) for s in (0, 1) for c in range(k - 1)]
+    pairs += [(0, 100), (k - 1, 100 + k - 1)]
+    for u, v in pairs:
+        d = G.nodes[u], G.nodes[v]
+        length = haversine_m(d[0]["y"], d[0]["x"], d[1]["y"], d[1]["x"])
+        G.add_edge(u, v, length=length)
+        G.add_edge(v, u, length=length)
+    return G
+
+
+def test_pruning_keeps_only_gaps():
+    # Well-connected grid: every close pair has a short network path
+    _, grid = repair_candidates(make_grid_graph(rows=8, cols=8, spacing_deg=0.0002), max_gap_m=60)
+    _, grid_unpruned = repair_candidates(
+        make_grid_graph(rows=8, cols=8, spacing_deg=0.0002), max_gap_m=60, prune=False
+    )
+    assert grid_unpruned["gaps"] > 0
+    assert grid["gaps"] == 0
+
+    # Across the canal the network detour is long: those pairs stay gaps,
+    # pairs along each street do not
+    _, canal = repair_candidates(_canal_block(), max_gap_m=40)
+    assert 0 < canal["gaps"] < canal["unlinked"]
+
+    # Dead ends and separate components are gaps without a detour search
+    pairs, counts = repair_candidates(_gappy_graph(), max_gap_m=60)
+    _, unpruned = repair_candidates(_gappy_graph(), max_gap_m=60, prune=False)
+    assert counts["gaps"] < unpruned["gaps"] / 2
+    assert counts["added"] == unpruned["added"] == len(pairs) > 0
+
+
+def test_detour_factor_is_configurable():
+    # Walking round the block (~600 m) is within 100 x the ~20 m crossing
+    _, default = repair_candidates(_canal_block(), max_gap_m=40)
+    _, lenient = repair_candidates(_canal_block(), max_gap_m=40, detour_factor=100.0)
+    assert default["gaps"] > lenient["gaps"] == 0
+
+    serial = repair_graph(_canal_block(), max_gap_m=40, detour_factor=1.5)
+    parallel = repair_graph(_canal_block(), max_gap_m=40, detour_factor=1.5, workers=2,
+                            cell_size_m=100)
+    assert _edge_list(parallel) == _edge_list(serial)
+
+    assert repaired_cache_key("abc", 30) != repaired_cache_key("abc", 30, detour_factor=1.5)
+
+
+def test_cached_repair_hashes_the_graphml_once(tmp_path, monkeypatch):
+    graphml = tmp_path / "master.graphml"
+    graphml.write_text("<graphml/>")
+    monkeypatch.setattr(graph_loader, "MASTER_GRAPH_PATH", str(graphml))
+    monkeypatch.setattr(graph_loader, "REPAIRED_CACHE_DIR", str(tmp_path / "repaired"))
+    monkeypatch.setattr(graph_loader, "SOURCE_HASHES_PATH", str(tmp_path / "repaired/hashes.json"))
+    monkeypatch.setattr(graph_loader, "_SOURCE_HASHES", {})
+
+    calls = []
+    real = graph_loader.file_sha256
+    monkeypatch.setattr(graph_loader, "file_sha256", lambda p: calls.append(p) or real(p))
+
+    key = repaired_cache_key(real(str(graphml)), 30)
+    save_snapshot(make_grid_graph(), str(tmp_path / f"repaired/{key}.snapshot"))
+
+    for _ in range(3):
+        assert graph_loader.repaired_master_snapshot(30).endswith(f"{key}.snapshot")
+    assert len(calls) == 1
+
+    # A new process without the GraphML still finds the recorded hash
+    graphml.unlink()
+    monkeypatch.setattr(graph_loader, "_SOURCE_HASHES", {})
+    assert graph_loader.repaired_master_snapshot(30).endswith(f"{key}.snapshot")
+    assert len(calls) == 1
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from conftest import make_grid_graph
+from src.core.graph_arrays import GraphArrays
+from src.core.run_path import RunPath
+from src.core.snapping_fast import snap_points_fast
+from src.service.graph_client import GraphClient, GraphServiceError, GraphServiceUnavailable
+from src.service.graph_service import GraphServer, GraphService
+
+
+@pytest.fixture
+def client(tmp_path):
+    ga = GraphArrays.from_graph(make_grid_graph())
+    server = GraphServer(GraphService(ga), str(tmp_path / "graph.sock"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    with GraphClient(server.socket_path) as c:
+        yield ga, c
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_batch_endpoints_match_local_calls(client):
+    ga, c = client
+    points = [(52.3601, 4.9003), (52.3612, 4.9018), (52.3624, 4.9021)]
+
+    local = snap_points_fast(ga, points)
+    remote = c.snap(points)
+    assert [r["edge"] for r in remote] == [r["edge"] for r in local]
+    assert remote[0]["snapped_lat"] == pytest.approx(local[0]["snapped_lat"])
+
+    assert c.nearest_nodes([(52.36, 4.90)]) == [1000]
+
+    route = c.route([(1000, 1035), (1000, 999)])
+    assert route[0]["nodes"] == ga.shortest_path(1000, 1035)
+    assert route[0]["length_m"] > 0
+    assert route[1] is None
+
+    cropped = c.crop(bbox=(52.3599, 52.3601, 4.8999, 4.9001))
+    assert len(cropped["edges"]) == len(cropped["paths"]) > 0
+
+    stats = c.stats()
+    assert stats["latency"]["snap"]["count"] == 1
+    assert stats["queue_depth"] == 0
+
+    with pytest.raises(GraphServiceError):
+        c.call("no_such_op")
+
+
+def test_nodes_and_run_path_endpoints(client):
+    ga, c = client
+
+    nodes = c.nodes(bbox=(52.3599, 52.3601, 4.8999, 4.9006))
+    assert nodes == {"ids": [1000, 1001], "lat": [52.36, 52.36], "lon": [4.90, 4.9005]}
+    assert len(c.nodes()["ids"]) == ga.num_nodes
+
+    latlng = [(52.36001, 4.9001), (52.36002, 4.9004), (52.36001, 4.9008), (52.36002, 4.9012)]
+    remote = c.run_path(latlng, times=[0, 10, 20, 30])
+    local = RunPath(ga, latlng, [0, 10, 20, 30])
+    assert remote["node_sequence"] == local.node_sequence
+    assert remote["snapped"] == [list(p) for p in local.snapped_points]
+    assert remote["stats"]["num_nodes"] == len(local.node_sequence)
+
+
+def test_client_without_service_says_how_to_start_it(tmp_path):
+    with GraphClient(str(tmp_path / "missing.sock")) as c:
+        with pytest.raises(GraphServiceUnavailable, match="python -m src.service.graph_service"):
+            c.stats()
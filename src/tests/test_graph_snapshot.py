@@ -0,0 +1,70 @@
+import numpy as np
+
+from src.core.graph_snapshot import (
+    graph_to_arrays,
+    load_snapshot,
+    load_snapshot_arrays,
+    save_snapshot,
+    write_snapshot_arrays,
+)
+
+
+def test_snapshot_roundtrip(grid_graph, tmp_path):
+    path = str(tmp_path / "grid.snapshot")
+    save_snapshot(grid_graph, path)
+
+    G2 = load_snapshot(path)
+
+    assert set(G2.nodes) == set(grid_graph.nodes)
+    assert set(G2.edges(keys=True)) == set(grid_graph.edges(keys=True))
+
+    for u, v, k, data in grid_graph.edges(keys=True, data=True):
+        data2 = G2.edges[u, v, k]
+        assert data2["length"] == data["length"]
+        assert ("geometry" in data2) == ("geometry" in data)
+        if "geometry" in data:
+            assert data2["geometry"].equals(data["geometry"])
+
+    for n, data in grid_graph.nodes(data=True):
+        assert G2.nodes[n]["x"] == data["x"]
+        assert G2.nodes[n]["y"] == data["y"]
+
+
+def test_snapshot_keeps_osm_attributes(grid_graph, tmp_path):
+    G = grid_graph.copy()
+    G.graph["simplified"] = True
+    G.nodes[1000].update(street_count=2, highway="crossing")
+    for u, v, k in list(G.edges(keys=True))[:5]:
+        G.edges[u, v, k].update(highway="footway", name="Sarphatistraat", osmid=[7, 8], oneway=False)
+
+    path = str(tmp_path / "grid.snapshot")
+    save_snapshot(G, path)
+    G2 = load_snapshot(path)
+
+    assert G2.graph["simplified"] is True
+    assert G2.nodes[1000] == G.nodes[1000]
+    for u, v, k, data in G.edges(keys=True, data=True):
+        data2 = G2.edges[u, v, k]
+        assert {a: b for a, b in data2.items() if a != "geometry"} == {
+            a: b for a, b in data.items() if a != "geometry"
+        }
+
+    # Writing arrays alone over it drops the stale attributes
+    write_snapshot_arrays(graph_to_arrays(G), path)
+    assert "highway" not in load_snapshot(path).nodes[1000]
+
+
+def test_snapshot_arrays_layout(grid_graph, tmp_path):
+    arrays = graph_to_arrays(grid_graph)
+
+    assert np.all(np.diff(arrays["node_ids"]) > 0)
+    assert arrays["indptr"][-1] == grid_graph.number_of_edges()
+    assert arrays["geom_offsets"][-1] == len(arrays["geom_coords"])
+
+    path = str(tmp_path / "grid.snapshot")
+    save_snapshot(grid_graph, path)
+    mapped, meta = load_snapshot_arrays(path, mmap_mode="r")
+
+    assert meta["num_edges"] == grid_graph.number_of_edges()
+    assert isinstance(mapped["geom_coords"], np.memmap)
+    assert np.array_equal(mapped["targets"], arrays["targets"])
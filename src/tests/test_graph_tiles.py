@@ -0,0 +1,32 @@
+from src.core.graph_arrays import GraphArrays
+from src.core.graph_tiles import build_tiles, load_tiles_for_bbox, load_tiles_for_track
+from conftest import make_grid_graph
+
+
+def test_stitching_all_tiles_restores_graph(tmp_path):
+    G = make_grid_graph(rows=12, cols=12)
+    tiles_dir = str(tmp_path / "tiles")
+
+    # Small tiles so plenty of edges cross a border
+    index = build_tiles(GraphArrays.from_graph(G), tiles_dir, tile_size_deg=0.0013)
+    assert len(index["tiles"]) > 1
+
+    H = load_tiles_for_bbox(tiles_dir, 52.0, 53.0, 4.0, 5.0)
+
+    assert set(H.nodes) == set(G.nodes)
+    assert set(H.edges(keys=True)) == set(G.edges(keys=True))
+    for u, v, k, data in G.edges(keys=True, data=True):
+        assert H.edges[u, v, k]["length"] == data["length"]
+
+
+def test_track_loads_only_nearby_tiles(tmp_path):
+    G = make_grid_graph(rows=12, cols=12)
+    tiles_dir = str(tmp_path / "tiles")
+    build_tiles(GraphArrays.from_graph(G), tiles_dir, tile_size_deg=0.0013)
+
+    track = [(52.3601, 4.9001), (52.3604, 4.9004)]
+    sub = load_tiles_for_track(tiles_dir, track, margin_deg=0.0002, as_arrays=True)
+
+    assert 0 < sub.num_edges < G.number_of_edges()
+    # Every edge near the track must be present
+    assert sub.find_edge(sub.node_index(1000), sub.node_index(1001)) is not None
@@ -0,0 +1,55 @@
+from conftest import edge_attr_list, make_gappy_graph
+from src.core.graph_repair import repair_graph
+from src.core.incremental_repair import RepairIndex
+
+CLUSTER = {7000 + k: (4.9060 + k * 0.00011, 52.3605 + (k % 2) * 0.00008) for k in range(5)}
+
+
+def test_bbox_repair_matches_full_repair():
+    expected = repair_graph(make_gappy_graph(), max_gap_m=60)
+
+    G = make_gappy_graph()
+    added = RepairIndex(G, max_gap_m=60).repair(bbox=(52.0, 53.0, 4.0, 5.0))
+
+    assert len(added) > 0
+    assert edge_attr_list(G) == edge_attr_list(expected)
+
+
+def test_repair_after_edit_only_touches_the_change():
+    G = repair_graph(make_gappy_graph(), max_gap_m=60)
+    index = RepairIndex(G, max_gap_m=60)
+    before = G.number_of_edges()
+
+    for n, (x, y) in CLUSTER.items():
+        G.add_node(n, x=x, y=y)
+    added = index.repair(nodes=list(CLUSTER))
+
+    assert added and all(u in CLUSTER and v in CLUSTER for u, v in added)
+    assert G.number_of_edges() == before + 2 * len(added)
+
+    # Same result as repairing the edited graph from scratch
+    full = make_gappy_graph()
+    for n, (x, y) in CLUSTER.items():
+        full.add_node(n, x=x, y=y)
+    full = repair_graph(full, max_gap_m=60)
+    assert sorted(edge_attr_list(G)) == sorted(edge_attr_list(full))
+
+    # The new connectors are indexed in place: nothing left to add
+    assert index.repair(nodes=list(CLUSTER)) == []
+
+
+def test_repair_after_edge_removal_seeds_its_endpoints():
+    G = repair_graph(make_gappy_graph(), max_gap_m=60)
+    G.graph["fingerprint"] = "before-edit"
+    index = RepairIndex(G, max_gap_m=60)
+
+    # Cut two cluster nodes loose: only the connector between them is free
+    removed = [e for e in G.edges(keys=True) if {e[0], e[1]} & {5000, 5001}]
+    G.remove_edges_from(removed)
+    full = repair_graph(G.copy(), max_gap_m=60)
+    added = index.repair(edges=[(u, v) for u, v, _ in removed])
+
+    assert added == [(5000, 5001)]
+    assert sorted(edge_attr_list(G)) == sorted(edge_attr_list(full))
+    assert "fingerprint" not in G.graph
+    assert not any(key in index.edge_boxes for key in removed if {key[0], key[1]} != {5000, 5001})
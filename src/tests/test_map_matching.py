@@ -0,0 +1,205 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from conftest import make_grid_graph
+from src.core.edge_store import arrays_fingerprint
+from src.core.graph_arrays import GraphArrays
+from src.core.map_matching import get_map_matcher, match_points
+from src.core.preprocessing import haversine_m
+from src.core.run_path import RunPath
+from src.core.snapping_fast import snap_points_columnar
+from src.core.tiered_matching import ambiguity_flags, match_points_tiered
+from src.core.projection import to_metric
+
+LAT0, LON0 = 52.36, 4.90
+M_LAT = 1 / 111_195
+M_LON = 1 / (111_195 * np.cos(np.radians(LAT0)))
+
+
+def make_canal_graph(n=20, spacing_m=30, gap_m=12):
+    """
+    Two parallel east-west paths gap_m apart (think both sides of a canal),
+    only linked at their ends. South nodes 1..n, north nodes 101..100+n.
+    """
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    for i in range(n):
+        G.add_node(1 + i, x=LON0 + i * spacing_m * M_LON, y=LAT0)
+        G.add_node(101 + i, x=LON0 + i * spacing_m * M_LON, y=LAT0 + gap_m * M_LAT)
+
+    def connect(a, b):
+        na, nb = G.nodes[a], G.nodes[b]
+        length = haversine_m(na["y"], na["x"], nb["y"], nb["x"])
+        G.add_edge(a, b, length=length)
+        G.add_edge(b, a, length=length)
+
+    for i in range(n - 1):
+        connect(1 + i, 2 + i)
+        connect(101 + i, 102 + i)
+    connect(1, 101)
+    connect(n, 100 + n)
+    return G
+
+
+def make_side_street_graph(n=30, seg_m=10, side_every=4, side_len=3):
+    """
+    An east-west street of seg_m edges (nodes 0..n) with a side street of
+    side_len edges running south from every side_every-th node.
+    """
+    G = nx.MultiDiGraph(crs="epsg:4326")
+
+    def connect(a, b):
+        na, nb = G.nodes[a], G.nodes[b]
+        length = haversine_m(na["y"], na["x"], nb["y"], nb["x"])
+        G.add_edge(a, b, length=length)
+        G.add_edge(b, a, length=length)
+
+    for i in range(n + 1):
+        G.add_node(i, x=LON0 + i * seg_m * M_LON, y=LAT0)
+        if i:
+            connect(i - 1, i)
+        if i and i % side_every == 0:
+            prev = i
+            for j in range(1, side_len + 1):
+                G.add_node(1000 * i + j, x=LON0 + i * seg_m * M_LON, y=LAT0 - j * seg_m * M_LAT)
+                connect(prev, 1000 * i + j)
+                prev = 1000 * i + j
+    return G
+
+
+def _south_side_track(n_points=200, length_m=500, seed=0):
+    rng = np.random.default_rng(seed)
+    along = np.linspace(45, 45 + length_m, n_points)
+    north = rng.normal(2, 3, n_points)
+    north[::7] = 8   # drifts closer to the north path
+    return np.column_stack([LAT0 + north * M_LAT, LON0 + along * M_LON])
+
+
+def test_hmm_stays_on_one_side_and_is_connected():
+    ga = GraphArrays.from_graph(make_canal_graph())
+    pts = _south_side_track()
+
+    nearest = snap_points_columnar(ga, pts)
+    north_edges = ga.node_ids[ga.sources[nearest["edge"]]] > 100
+    assert north_edges.any()
+
+    result = match_points(ga, pts)
+    assert result.breaks == [0]
+    assert all(nid < 100 for nid in result.node_path)
+    assert result.node_path == sorted(result.node_path)
+    assert None not in result.edge_path
+    assert len(result.edge_path) == len(result.node_path) - 1
+    assert np.allclose(result.snapped_lat, LAT0)
+
+
+def test_restarted_chains_are_routed_or_split():
+    # Switching canal sides mid-run restarts the chain; the node path
+    # still follows a route around the canal end
+    G = make_canal_graph(gap_m=80)
+    along = np.linspace(45, 450, 80)
+    north = np.where(np.arange(80) < 40, 0.0, 80.0)
+    pts = np.column_stack([LAT0 + north * M_LAT, LON0 + along * M_LON])
+    result = match_points(GraphArrays.from_graph(G), pts)
+    assert len(result.breaks) == 2 and result.path_breaks == []
+    assert len(result.edge_path) == len(result.node_path) - 1
+    assert all(G.has_edge(u, v) for u, v in zip(result.node_path[:-1], result.node_path[1:]))
+
+    # Two components: one path per piece, no made-up hop between them
+    G = nx.compose(make_canal_graph(), make_grid_graph(rows=2, cols=6, lon0=4.91))
+    pts = np.vstack([
+        pts[:40],
+        np.column_stack([np.full(40, LAT0), np.linspace(4.9101, 4.9120, 40)]),
+    ])
+    result = match_points(GraphArrays.from_graph(G), pts)
+    assert len(result.breaks) == 2 and len(result.path_breaks) == 1
+    assert None not in result.edge_path
+    assert len(result.edge_path) == len(result.node_path) - 2
+    first, second = result.node_paths
+    assert max(first) < 100 and min(second) >= 1000
+    for piece in result.node_paths:
+        assert all(G.has_edge(u, v) for u, v in zip(piece[:-1], piece[1:]))
+
+    run = RunPath(G, pts.tolist(), mode="hmm")
+    assert run.path_breaks == result.path_breaks
+    assert run.node_sequence[run.path_breaks[0]] == second[0]
+
+
+def test_matcher_is_looked_up_before_flattening_the_graph(monkeypatch):
+    G = make_grid_graph()
+    G.graph["fingerprint"] = "grid-matcher-v1"
+    matcher = get_map_matcher(G)
+    # The flattened copy has its own version: its edge order differs from G's
+    assert matcher.index.fingerprint == arrays_fingerprint("grid-matcher-v1")
+
+    def from_graph(G):
+        raise AssertionError("graph flattened again")
+
+    monkeypatch.setattr(GraphArrays, "from_graph", from_graph)
+    assert get_map_matcher(G) is matcher
+
+
+def test_run_path_hmm_mode():
+    G = make_canal_graph()
+    pts = _south_side_track().tolist()
+
+    run = RunPath(G, pts, mode="hmm")
+    assert run.match is not None
+    assert all(nid < 100 for nid in run.node_sequence)
+    assert len(run.snapped_points) == len(run.clean_points)
+
+    # Consecutive nodes are graph neighbours
+    for u, v in zip(run.node_sequence[:-1], run.node_sequence[1:]):
+        assert G.has_edge(u, v)
+
+
+def test_tiered_mode_matches_only_ambiguous_windows():
+    # Both canal sides are within reach everywhere: all points go to the HMM
+    ga = GraphArrays.from_graph(make_canal_graph())
+    pts = _south_side_track()
+    tiered = match_points_tiered(ga, pts)
+    assert tiered.tier_fractions["hmm"] == 1.0
+    assert tiered.node_path == match_points(ga, pts).node_path
+
+    # Noisy points by side streets: some windows are matched, the rest
+    # snapped, and the node path stays connected across the seams
+    G = make_side_street_graph()
+    north = np.random.default_rng(28).normal(0, 4, 100)
+    pts = np.column_stack([LAT0 + north * M_LAT, LON0 + np.linspace(5, 295, 100) * M_LON])
+    tiered = match_points_tiered(GraphArrays.from_graph(G), pts)
+    assert 0 < tiered.tier_fractions["hmm"] < 1
+    assert tiered.path_breaks == [] and None not in tiered.edge_path
+    assert len(tiered.edge_path) == len(tiered.node_path) - 1
+    path = tiered.node_path
+    assert all(G.has_edge(u, v) for u, v in zip(path[:-1], path[1:]))
+    with pytest.raises(ValueError):
+        RunPath(G, pts.tolist(), mode="tiered", workers=2)
+
+    # A straight run along one grid street needs no matching at all
+    G = make_grid_graph()
+    track = np.column_stack([np.full(40, 52.36), np.linspace(4.9001, 4.9024, 40)])
+    run = RunPath(G, track.tolist(), mode="tiered")
+    assert run.match.tier_fractions == {"nearest": 1.0, "hmm": 0.0}
+    assert run.node_sequence == RunPath(G, track.tolist()).node_sequence
+
+
+def test_crossing_streets_of_short_segments_are_not_nearby():
+    # A + junction whose arms are split into 5 m edges, as OSM walk graphs are
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    G.add_node(0, x=LON0, y=LAT0)
+    for arm, (dx, dy) in enumerate([(1, 0), (-1, 0), (0, 1), (0, -1)]):
+        prev = 0
+        for i in range(1, 9):
+            nid = 10 * (arm + 1) + i
+            G.add_node(nid, x=LON0 + dx * 5 * i * M_LON, y=LAT0 + dy * 5 * i * M_LAT)
+            G.add_edge(prev, nid, length=5.0)
+            G.add_edge(nid, prev, length=5.0)
+            prev = nid
+
+    # Straight through the junction along the east-west street
+    ga = GraphArrays.from_graph(G)
+    along = np.linspace(-35, 35, 30)
+    pts = np.column_stack([LAT0 + 2 * M_LAT * np.ones(30), LON0 + along * M_LON])
+    matcher = get_map_matcher(ga)
+    cols = snap_points_columnar(ga, pts, index=matcher.index)
+    x, y = to_metric(pts[:, 1], pts[:, 0], matcher.index.crs)
+    assert not ambiguity_flags(matcher.index, x, y, cols)["nearby"].any()
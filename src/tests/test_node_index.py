@@ -0,0 +1,46 @@
+import numpy as np
+
+from conftest import make_grid_graph
+from src.core.graph_arrays import GraphArrays
+from src.core.node_index import NodeIndex
+from src.core.repair_one_gap import nearest_nodes_k
+from src.core.snap_index import clear_snap_index_cache, get_node_index, get_snap_index
+
+
+def test_nearest_and_within_match_brute_force():
+    G = make_grid_graph(rows=5, cols=5)
+    nodes = get_node_index(G)
+    rng = np.random.default_rng(0)
+    points = np.column_stack([
+        rng.uniform(52.3595, 52.3645, 50), rng.uniform(4.8995, 4.9045, 50)
+    ])
+
+    dist, ids = nodes.nearest(points, k=3)
+    within = nodes.within(points, radius_m=80)
+    for p, xy, d, row, hits in zip(points, nodes.project(points), dist, ids, within):
+        brute = np.hypot(*(nodes.xy_m - xy).T)
+        order = np.argsort(brute)
+        assert row.tolist() == nodes.node_ids[order[:3]].tolist()
+        assert np.allclose(d, brute[order[:3]])
+        assert sorted(hits.tolist()) == sorted(nodes.node_ids[brute <= 80].tolist())
+
+
+def test_node_index_is_shared_per_graph_version(monkeypatch):
+    clear_snap_index_cache()
+    G = make_grid_graph()
+    G.graph["fingerprint"] = "grid-v1"
+
+    standalone = get_node_index(G)
+    assert get_node_index(G) is standalone
+
+    # A snap index built later adopts it rather than building a second tree
+    monkeypatch.setattr(NodeIndex, "from_parts", None)
+    assert get_snap_index(G).nodes is standalone
+    monkeypatch.undo()
+    assert get_node_index(G) is standalone
+    ga = GraphArrays.from_graph(make_grid_graph())
+    assert get_node_index(ga).crs == get_snap_index(ga).crs
+
+    ids, dists = nearest_nodes_k(G, 4.90, 52.36, k=2)
+    assert ids[0] == 1000 and dists[0] < 1e-6
+    assert len(ids) == 2
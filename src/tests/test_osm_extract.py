@@ -0,0 +1,98 @@
+import gzip
+
+import numpy as np
+
+from src.core.graph_snapshot import arrays_to_graph, graph_to_arrays
+from src.core.osm_extract import extract_to_arrays
+from src.core.preprocessing import haversine_m
+
+OSM_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="52.3600" lon="4.9000"/>
+  <node id="2" lat="52.3600" lon="4.9010"/>
+  <node id="3" lat="52.3610" lon="4.9010"/>
+  <node id="4" lat="52.3610" lon="4.9000"/>
+  <node id="5" lat="52.3620" lon="4.9000"/>
+  <node id="6" lat="52.3620" lon="4.9020"/>
+  <node id="7" lat="52.3630" lon="4.9020"/>
+  <node id="99" lat="52.4000" lon="4.9500"/>
+  <way id="10">
+    <nd ref="1"/><nd ref="2"/><nd ref="3"/>
+    <tag k="highway" v="footway"/>
+  </way>
+  <way id="11">
+    <nd ref="3"/><nd ref="4"/>
+    <tag k="highway" v="residential"/>
+    <tag k="oneway" v="yes"/>
+  </way>
+  <way id="12">
+    <nd ref="2"/><nd ref="3"/>
+    <tag k="highway" v="path"/>
+  </way>
+  <way id="13">
+    <nd ref="4"/><nd ref="5"/><nd ref="6"/><nd ref="4"/>
+    <tag k="highway" v="pedestrian"/>
+    <tag k="area" v="yes"/>
+  </way>
+  <way id="14">
+    <nd ref="5"/><nd ref="6"/>
+    <tag k="highway" v="cycleway"/>
+  </way>
+  <way id="15">
+    <nd ref="6"/><nd ref="7"/>
+    <tag k="highway" v="footway"/>
+    <tag k="access" v="private"/>
+  </way>
+  <way id="16">
+    <nd ref="4"/><nd ref="99"/>
+    <tag k="building" v="yes"/>
+  </way>
+</osm>
+"""
+
+
+def _edges(arrays):
+    """{(u, v, key): length} of snapshot arrays, keyed by OSM ids."""
+    ids = arrays["node_ids"]
+    src = np.repeat(np.arange(len(ids)), np.diff(arrays["indptr"]))
+    return {
+        (int(ids[s]), int(ids[t]), int(k)): float(length)
+        for s, t, k, length in zip(src, arrays["targets"], arrays["edge_keys"], arrays["lengths"])
+    }
+
+
+def test_extract_filters_ways_and_keys_parallel_edges(tmp_path):
+    path = tmp_path / "tiny.osm"
+    path.write_text(OSM_XML)
+
+    arrays, stats = extract_to_arrays(str(path), report=False)
+    edges = _edges(arrays)
+
+    assert stats["ways_seen"] == 7
+    assert stats["ways_kept"] == 3
+    # Area, cycleway, private and non-highway ways are dropped with their nodes
+    assert arrays["node_ids"].tolist() == [1, 2, 3, 4]
+
+    # Oneway is ignored for walking: every segment exists in both directions;
+    # the second 2-3 way becomes a parallel edge with key 1
+    assert set(edges) == {
+        (1, 2, 0), (2, 1, 0),
+        (2, 3, 0), (3, 2, 0), (2, 3, 1), (3, 2, 1),
+        (3, 4, 0), (4, 3, 0),
+    }
+    assert np.isclose(edges[1, 2, 0], haversine_m(52.36, 4.90, 52.36, 4.901))
+
+    # Same arrays as going through a networkx graph and back
+    G = arrays_to_graph(arrays)
+    assert set(G.edges(keys=True)) == set(edges)
+    back = graph_to_arrays(G)
+    for name in ("node_ids", "node_x", "node_y", "indptr", "targets", "edge_keys",
+                 "lengths", "geom_offsets", "geom_coords"):
+        assert np.array_equal(back[name], arrays[name]), name
+
+    # gzip input and a bbox that cuts node 4 off
+    gz = tmp_path / "tiny.osm.gz"
+    with gzip.open(gz, "wt") as f:
+        f.write(OSM_XML)
+    clipped, _ = extract_to_arrays(str(gz), bbox=(52.35, 52.3605, 4.89, 4.91), report=False)
+    assert set(_edges(clipped)) == {(1, 2, 0), (2, 1, 0)}
@@ -0,0 +1,136 @@
+import numpy as np
+import shapely
+
+from conftest import make_gappy_graph, make_grid_graph
+from src.core import snap_index
+from src.core.graph_arrays import GraphArrays
+from src.core.graph_patch import apply_patches, apply_patches_arrays
+from src.core.graph_repair import repair_graph
+from src.core.snap_index import (
+    MEMO_SIZE,
+    SnapIndex,
+    clear_snap_index_cache,
+    get_node_index,
+    get_snap_index,
+    graph_fingerprint,
+)
+from src.core.snapping_fast import snap_points_fast
+
+POINTS = [(52.3601, 4.9003), (52.3612, 4.9018), (52.3624, 4.9021), (52.3619, 4.9007)]
+
+
+def test_index_is_built_once_per_graph_version(tmp_path):
+    clear_snap_index_cache()
+    G = make_grid_graph()
+    G.graph["fingerprint"] = "grid-v1"
+
+    index = get_snap_index(G)
+    assert get_snap_index(G) is index
+    assert snap_points_fast(G, POINTS) == snap_points_fast(G, POINTS, index=index)
+
+    # A new version gets a new index; unversioned graphs are content-hashed
+    G.graph["fingerprint"] = "grid-v2"
+    assert get_snap_index(G) is not index
+    ga = GraphArrays.from_graph(make_grid_graph())
+    assert get_snap_index(ga) is get_snap_index(GraphArrays.from_graph(make_grid_graph()))
+
+    # Persisted copy snaps the same
+    clear_snap_index_cache()
+    built = get_snap_index(G, persist=True, cache_dir=str(tmp_path))
+    clear_snap_index_cache()
+    loaded = get_snap_index(G, persist=True, cache_dir=str(tmp_path))
+    assert loaded is not built
+    assert loaded.fingerprint == "grid-v2"
+    assert [r["edge"] for r in snap_points_fast(G, POINTS, index=loaded)] == [
+        r["edge"] for r in snap_points_fast(G, POINTS, index=built)
+    ]
+
+
+def test_networkx_and_arrays_indexes_snap_alike():
+    G = make_grid_graph()
+    ga = GraphArrays.from_graph(G)
+    nx_records = snap_points_fast(SnapIndex.from_graph(G), POINTS)
+    arr_records = snap_points_fast(ga, POINTS)
+
+    for a, b in zip(nx_records, arr_records):
+        assert abs(a["snapped_lat"] - b["snapped_lat"]) < 1e-9
+        assert abs(a["snapped_lon"] - b["snapped_lon"]) < 1e-9
+
+
+def test_content_fingerprint_is_stored_until_the_graph_changes(monkeypatch):
+    clear_snap_index_cache()
+    G = make_gappy_graph()
+    fp = graph_fingerprint(G)
+    assert G.graph["fingerprint"] == fp
+
+    # Later lookups reuse the stored hash instead of re-reading the graph
+    monkeypatch.setattr(snap_index, "graph_to_arrays", None)
+    assert graph_fingerprint(G) == fp
+    index = get_snap_index(G)
+    assert get_snap_index(G) is index
+    monkeypatch.undo()
+
+    # Repairing in place drops it, so the repaired graph gets a new index
+    repair_graph(G, max_gap_m=40.0)
+    assert "fingerprint" not in G.graph
+    assert graph_fingerprint(G) != fp
+    assert get_snap_index(G) is not index
+
+    # Only the most recent graph versions stay memoised
+    for i in range(MEMO_SIZE + 2):
+        G.graph["fingerprint"] = f"v{i}"
+        get_snap_index(G)
+    assert list(snap_index._MEMO) == [f"v{i}" for i in range(2, MEMO_SIZE + 2)]
+
+
+def test_index_of_an_edited_graph_is_derived_from_the_previous_version(monkeypatch):
+    clear_snap_index_cache()
+    edits = [{"op": "add", "u": 1000, "v": 1035}, {"op": "remove", "u": 1000, "v": 1001}]
+
+    G = make_grid_graph()
+    G.graph["fingerprint"] = "grid-v1"
+    ga = GraphArrays.from_graph(G)
+    ga.meta["fingerprint"] = "arrays-v1"
+    parents = [get_snap_index(G), get_snap_index(ga)]
+
+    H = apply_patches(G.copy(), edits)
+    assert H.graph["derived_from"] == ["grid-v1"]
+    ha = GraphArrays(meta={"derived_from": ["arrays-v1"]}, **apply_patches_arrays(ga, edits))
+
+    projected = []
+    real = snap_index.geoms_to_metric
+    monkeypatch.setattr(snap_index, "geoms_to_metric", lambda g, crs: projected.append(len(g)) or real(g, crs))
+
+    for graph, parent in zip((H, ha), parents):
+        projected.clear()
+        index = get_snap_index(graph)
+        # Only the connector is projected: its two directions plus its tree row
+        assert sum(projected) == 3
+        assert index.nodes.tree is parent.nodes.tree
+        assert get_node_index(graph) is index.nodes
+
+        fresh = SnapIndex.build(graph)
+        for name in ("edge_u", "edge_v", "edge_key", "tree_rows", "valid"):
+            assert np.array_equal(getattr(index, name), getattr(fresh, name))
+        assert shapely.equals_exact(index.geoms_m, fresh.geoms_m, 1e-6).all()
+        assert snap_points_fast(graph, POINTS) == snap_points_fast(graph, POINTS, index=fresh)
+
+
+def test_snap_xy_matches_geos_nearest_and_locate():
+    # ~220 m blocks: every edge is cut into several pieces, and points far
+    # from the streets need the wider second pass
+    ga = GraphArrays.from_graph(make_grid_graph(rows=6, cols=6, spacing_deg=0.002))
+    index = SnapIndex.from_arrays(ga)
+    rng = np.random.default_rng(7)
+    x0, y0, x1, y1 = shapely.total_bounds(index.geoms_m)
+    x, y = rng.uniform(x0 - 300, x1 + 300, 2000), rng.uniform(y0 - 300, y1 + 300, 2000)
+
+    edge, offset, snapped_x, snapped_y = index.snap_xy(x, y)
+
+    pts = shapely.points(x, y)
+    ref_edge = index.nearest_edges(pts)
+    ref_d = shapely.distance(pts, index.geoms_m[ref_edge])
+    assert np.allclose(np.hypot(snapped_x - x, snapped_y - y), ref_d, rtol=0, atol=1e-6)
+    # Points nearest a node tie between the edges meeting there
+    ref_offset = shapely.line_locate_point(index.geoms_m[edge], pts, normalized=True)
+    assert np.allclose(offset, ref_offset, rtol=0, atol=1e-9)
@@ -0,0 +1,73 @@
+import numpy as np
+import shapely
+
+from conftest import make_grid_graph
+from src.core.graph_arrays import GraphArrays
+from src.core.run_path import RunPath
+from src.core.snap_index import SnapIndex
+from src.core.snapping_fast import _snap_points_loop, snap_points_columnar
+
+
+def _noisy_points(n=400, seed=3):
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(52.3598, 52.3628, n)
+    lon = rng.uniform(4.8998, 4.9028, n)
+    return np.column_stack([lat, lon])
+
+
+def test_columnar_matches_per_point_loop():
+    ga = GraphArrays.from_graph(make_grid_graph())
+    pts = _noisy_points()
+
+    cols = snap_points_columnar(ga, pts)
+    ref = _snap_points_loop(ga, pts.tolist())
+
+    assert np.allclose(cols["snapped_lat"], [r["snapped_lat"] for r in ref], rtol=0, atol=1e-9)
+    assert np.allclose(cols["snapped_lon"], [r["snapped_lon"] for r in ref], rtol=0, atol=1e-9)
+    assert np.allclose(cols["error_meters"], [r["error_meters"] for r in ref], rtol=0, atol=1e-6)
+    assert ((cols["offset"] >= 0) & (cols["offset"] <= 1)).all()
+
+    # Nearest endpoint along the snapped edge
+    index = SnapIndex.from_arrays(ga)
+    first_half = cols["offset"] < 0.5
+    assert (cols["node"][first_half] == index.edge_u[cols["edge"][first_half]]).all()
+    assert (cols["node"][~first_half] == index.edge_v[cols["edge"][~first_half]]).all()
+
+    # Twin u -> v / v -> u edges are indexed once
+    assert len(index.tree_rows) * 2 == index.num_edges
+
+
+def test_columnar_falls_back_to_nearest_node():
+    G = make_grid_graph(rows=2, cols=2)
+    for u, v, k in list(G.edges(keys=True)):
+        G.edges[u, v, k]["geometry"] = shapely.Point(G.nodes[u]["x"], G.nodes[u]["y"])
+
+    cols = snap_points_columnar(SnapIndex.from_graph(G), [(52.36001, 4.90001)])
+
+    assert np.isnan(cols["offset"][0])
+    assert cols["node"][0] == 1000
+    assert (cols["snapped_lat"][0], cols["snapped_lon"][0]) == (52.36, 4.90)
+
+
+def test_nearest_edge_is_chosen_in_metres():
+    # 10 m north of an east-west street, 8 m east of a north-south one: in
+    # raw degrees the east-west street looks closer
+    G = make_grid_graph(rows=2, cols=2, spacing_deg=0.001)
+    lat = 52.36 + 10 / 111_195
+    lon = 4.90 + 0.001 + 8 / (111_195 * np.cos(np.radians(52.36)))
+
+    cols = snap_points_columnar(SnapIndex.from_graph(G), [(lat, lon)])
+
+    assert abs(cols["snapped_lon"][0] - (4.90 + 0.001)) < 1e-7
+    assert abs(cols["error_meters"][0] - 8) < 0.05
+
+
+def test_run_path_node_sequence_from_snapped_edges():
+    G = make_grid_graph()
+    # East along the bottom row, 1 m north of it
+    pts = [(52.36 + 1e-5, 4.90 + i * 0.0001) for i in range(25)]
+
+    run_nx = RunPath(G, pts)
+    run_arrays = RunPath(GraphArrays.from_graph(G), pts)
+
+    assert run_nx.node_sequence == run_arrays.node_sequence == [1000, 1001, 1002, 1003, 1004, 1005]
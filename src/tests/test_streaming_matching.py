@@ -0,0 +1,63 @@
+import numpy as np
+
+from conftest import make_grid_graph, make_serpentine_track
+from src.core.graph_arrays import GraphArrays
+from src.core.map_matching import match_points
+from src.core.streaming_matching import StreamingMatcher, match_stream
+from src.core.preprocessing import preprocess_points
+from src.strava.replay_streams import clean_stream, replay
+
+
+def test_stream_with_full_lag_equals_batch_matching():
+    ga = GraphArrays.from_graph(make_grid_graph(rows=8, cols=8))
+    points = make_serpentine_track()
+    batch = match_points(ga, points)
+
+    # Points arrive one by one and in small batches
+    feed = [points[i:i + 7] for i in range(0, len(points), 7)]
+    matches = list(match_stream(ga, feed, lag=len(points)))
+
+    assert [m.index for m in matches] == list(range(len(points)))
+    assert [m.edge for m in matches] == batch.edge.tolist()
+    assert [n for m in matches for n in m.new_nodes] == batch.node_path
+
+
+def test_fixed_lag_stream_is_connected_with_bounded_state():
+    G = make_grid_graph(rows=8, cols=8)
+    ga = GraphArrays.from_graph(G)
+    points = make_serpentine_track(seed=1)
+    matcher = StreamingMatcher(ga, lag=4, route_cache_size=20)
+
+    matches = []
+    for p in points:
+        out = matcher.push(p)
+        # Every point is decided lag points after it arrives
+        assert [m.index for m in out] == ([matcher._count - 5] if matcher._count > 4 else [])
+        assert len(matcher._buf) <= 4 and len(matcher._cache) <= 20
+        matches.extend(out)
+    matches.extend(matcher.flush())
+
+    assert [m.index for m in matches] == list(range(len(points)))
+    path = [n for m in matches for n in m.new_nodes]
+    assert all(G.has_edge(u, v) for u, v in zip(path[:-1], path[1:]))
+    assert np.mean([m.error_meters for m in matches]) < 10
+
+
+def test_replay_measures_latency():
+    ga = GraphArrays.from_graph(make_grid_graph(rows=8, cols=8))
+    points = make_serpentine_track()[:200]
+    matches, push_ms, decision_ms = replay(ga, points, np.arange(200.0), speed=0, lag=5, batch=3)
+    assert len(matches) == 200
+    assert len(push_ms) == 67 and (push_ms >= 0).all()
+    assert (decision_ms >= 0).all()
+
+
+def test_replay_cleans_points_like_run_path():
+    points = make_serpentine_track()[:50]
+    points[20] += 0.01  # a 1 km jump and back
+    times = np.arange(50.0) * 5
+
+    latlng, kept_times = clean_stream(points, times)
+    assert [tuple(p) for p in latlng.tolist()] == preprocess_points(points.tolist(), times.tolist())
+    assert kept_times.tolist() == [t for t in times.tolist() if t not in (100.0, 105.0)]
+    assert np.array_equal(latlng, points[(kept_times / 5).astype(int)])
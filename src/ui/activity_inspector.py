@@ -6,7 +6,6 @@ import json
 
 import streamlit as st
 import pydeck as pdk
-import osmnx as ox
 
 PROJECT_ROOT = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "..")
@@ -14,26 +13,13 @@ PROJECT_ROOT = os.path.abspath(
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from src.core.graph_loader import load_graph
-from src.core.graph_cropper import crop_graph_edges
-from src.core.run_path import RunPath
+from src.service.graph_client import GraphClient, GraphServiceUnavailable
 
 DATA_ROOT = os.path.join(PROJECT_ROOT, "src", "data")
 STREAMS_DIR = os.path.join(DATA_ROOT, "streams")
 ACTIVITIES_PATH = os.path.join(DATA_ROOT, "all_activities.json")
 
 
-def compute_bbox(G):
-    lats = [data["y"] for _, data in G.nodes(data=True)]
-    lons = [data["x"] for _, data in G.nodes(data=True)]
-    return min(lats), max(lats), min(lons), max(lons)
-
-
-@st.cache_resource
-def get_graph():
-    return load_graph(use_master=True)
-
-
 @st.cache_data
 def load_activities():
     with open(ACTIVITIES_PATH, "r") as f:
@@ -50,8 +36,14 @@ def load_streams(activity_id):
 def main():
     st.title("Activity Inspector")
 
-    G = get_graph()
-    lat_min, lat_max, lon_min, lon_max = compute_bbox(G)
+    # Graph, snapping and RunPath live in the graph service
+    # (start it with: python -m src.service.graph_service)
+    with GraphClient() as client:
+        inspect_activity(client)
+
+
+def inspect_activity(client):
+    lat_min, lat_max, lon_min, lon_max = client.bounds()
 
     activities = load_activities()
 
@@ -75,35 +67,33 @@ def main():
         st.error("Outside graph area.")
         st.stop()
 
-    run_path = RunPath.from_streams(G, streams)
+    times = streams.get("time", {}).get("data")
+    run_path = client.run_path(latlng, times=times)
 
-    raw_df = run_path.to_raw_dataframe()
-    snapped_df = run_path.to_snapped_dataframe()
+    raw_points = [{"lat": la, "lon": lo} for la, lo in run_path["raw"]]
+    snapped_points = [{"lat": la, "lon": lo} for la, lo in run_path["snapped"]]
 
-    gdf_nodes, gdf_edges = ox.graph_to_gdfs(G, nodes=True, edges=True)
-    cropped_edges = crop_graph_edges(gdf_edges, latlng)
+    cropped = client.crop(latlng=latlng)
 
-    edge_points = []
-    for geom in cropped_edges.geometry:
-        if geom is None or geom.geom_type != "LineString":
-            continue
-        xs, ys = geom.xy
-        for la, lo in zip(ys, xs):
-            edge_points.append({"lat": la, "lon": lo})
+    edge_points = [
+        {"lat": la, "lon": lo}
+        for path in cropped["paths"]
+        for lo, la in path
+    ]
 
     edge_layer = pdk.Layer("ScatterplotLayer", edge_points,
                            get_position=["lon", "lat"],
                            get_radius=4, get_color=[160, 160, 160])
 
-    raw_layer = pdk.Layer("ScatterplotLayer", raw_df,
+    raw_layer = pdk.Layer("ScatterplotLayer", raw_points,
                           get_position=["lon", "lat"],
                           get_radius=6, get_color=[0, 0, 255])
 
-    snapped_layer = pdk.Layer("ScatterplotLayer", snapped_df,
+    snapped_layer = pdk.Layer("ScatterplotLayer", snapped_points,
                               get_position=["lon", "lat"],
                               get_radius=4, get_color=[255, 0, 0])
 
-    mid = raw_df.iloc[len(raw_df)//2]
+    mid = raw_points[len(raw_points)//2]
     view = pdk.ViewState(latitude=mid["lat"], longitude=mid["lon"], zoom=14)
 
     st.pydeck_chart(pdk.Deck(
@@ -114,4 +104,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except GraphServiceUnavailable as e:
+        st.error(str(e))
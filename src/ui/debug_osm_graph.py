@@ -1,76 +1,44 @@
 import streamlit as st
 import pydeck as pdk
-import osmnx as ox
-from shapely.geometry import LineString
-from shapely.ops import linemerge
 import sys, os
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from src.core.graph_loader import load_graph
-
-def normalize_geom(geom):
-    if geom is None or geom.is_empty:
-        return None
-
-    if geom.geom_type == "LineString":
-        return geom
-
-    if geom.geom_type == "MultiLineString":
-        # choose the longest segment
-        parts = list(geom.geoms)
-        if len(parts) == 0:
-            return None
-        return max(parts, key=lambda g: g.length)
-
-    return None
+from src.service.graph_client import GraphClient, GraphServiceUnavailable
 
 
 def main():
     st.title("OSM Graph Debug Viewer")
 
-    G = load_graph(use_master=True)
+    # Graph and edge geometry live in the graph service
+    # (start it with: python -m src.service.graph_service)
+    with GraphClient() as client:
+        bounds = client.bounds()
+        cropped = client.crop(bbox=bounds)
+        nodes = client.nodes()
     st.write("Graph loaded")
 
-    gdf_nodes, gdf_edges = ox.convert.graph_to_gdfs(
-        G, nodes=True, edges=True, fill_edge_geometry=True
-    )
     # Debug: print graph bounding box
-    xs = gdf_nodes["x"].values
-    ys = gdf_nodes["y"].values
+    min_lat, max_lat, min_lon, max_lon = bounds
 
     st.write("Graph bounds:")
-    st.write("min_lon:", float(xs.min()))
-    st.write("max_lon:", float(xs.max()))
-    st.write("min_lat:", float(ys.min()))
-    st.write("max_lat:", float(ys.max()))
-
-    gdf_edges["geometry"] = gdf_edges.geometry.apply(normalize_geom)
-    lines = gdf_edges[gdf_edges.geometry.notna()]
+    st.write("min_lon:", min_lon)
+    st.write("max_lon:", max_lon)
+    st.write("min_lat:", min_lat)
+    st.write("max_lat:", max_lat)
 
-    st.write("Valid geometries:", len(lines))
+    st.write("Edges:", len(cropped["paths"]))
 
     # Build PathLayer data
-    paths = []
-    for geom in lines.geometry:
-        if geom is None or geom.is_empty:
-            continue
-
-        xs, ys = geom.xy
-        path = [[float(lon), float(lat)] for lon, lat in zip(xs, ys)]
-        paths.append({"path": path})
+    paths = [{"path": path} for path in cropped["paths"]]
 
     st.write("Paths to draw:", len(paths))
 
     # Build node layer
-    # node_data = [
-    #     {"lon": row["x"], "lat": row["y"]}
-    #     for _, row in gdf_nodes.iterrows()
-    # ]
     node_data = [
-        {"lon": row["x"], "lat": row["y"], "id": int(idx)}
-        for idx, row in gdf_nodes.iterrows()
+        {"lon": lon, "lat": lat, "id": nid}
+        for nid, lat, lon in zip(nodes["ids"], nodes["lat"], nodes["lon"])
     ]
 
     node_layer = pdk.Layer(
@@ -92,8 +60,8 @@ def main():
     )
 
     # Center on average coordinates
-    lat_center = gdf_nodes["y"].mean()
-    lon_center = gdf_nodes["x"].mean()
+    lat_center = sum(nodes["lat"]) / len(nodes["lat"])
+    lon_center = sum(nodes["lon"]) / len(nodes["lon"])
 
     view_state = pdk.ViewState(
         longitude=lon_center,
@@ -115,4 +83,7 @@ def main():
     st.pydeck_chart(deck)
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except GraphServiceUnavailable as e:
+        st.error(str(e))
@@ -2,28 +2,25 @@ import sys
 import os
 import streamlit as st
 import pydeck as pdk
-import osmnx as ox
-from osmnx import convert
 
 # Make sure project root is on path
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from src.core.graph_loader import load_graph
+from src.service.graph_client import GraphClient, GraphServiceUnavailable
 
 
 def main():
     st.title("OSM Graph Geometry Debugger")
 
-    # Load graph
-    G = load_graph(use_master=True)
+    # Graph and edge geometry live in the graph service
+    # (start it with: python -m src.service.graph_service)
+    client = GraphClient()
+    stats = client.stats()
     st.write("Graph loaded")
-
-    # Convert to GeoDataFrames
-    gdf_nodes, gdf_edges = convert.graph_to_gdfs(G, nodes=True, edges=True)
-    st.write("Nodes:", len(gdf_nodes))
-    st.write("Edges:", len(gdf_edges))
+    st.write("Nodes:", stats["num_nodes"])
+    st.write("Edges:", stats["num_edges"])
 
     # ----------------------------------------------------------------------
     # 1) DEFINE CROPPING BOUNDING BOX (your coordinates + margin)
@@ -47,34 +44,19 @@ def main():
     st.write("lat range:", (min_lat, max_lat))
     st.write("lon range:", (min_lon, max_lon))
 
-    cropped_edges = gdf_edges[
-        (gdf_edges.geometry.bounds.miny >= min_lat) &
-        (gdf_edges.geometry.bounds.maxy <= max_lat) &
-        (gdf_edges.geometry.bounds.minx >= min_lon) &
-        (gdf_edges.geometry.bounds.maxx <= max_lon)
-    ]
+    # Edges whose bounds touch the box (the service's bbox index)
+    cropped = client.crop(bbox=(min_lat, max_lat, min_lon, max_lon))
+    client.close()
 
-    st.write("Cropped edges:", len(cropped_edges))
+    st.write("Cropped edges:", len(cropped["edges"]))
 
     # ----------------------------------------------------------------------
     # 2) Build paths from cropped geometries
     # ----------------------------------------------------------------------
 
-    paths = []
-    for geom in cropped_edges.geometry:
-        if geom is None or geom.is_empty:
-            continue
-
-        if geom.geom_type == "LineString":
-            xs, ys = geom.xy
-            path = [[float(lon), float(lat)] for lon, lat in zip(xs, ys)]
-            paths.append({"path": path})
-
-        elif geom.geom_type == "MultiLineString":
-            for part in geom.geoms:
-                xs, ys = part.xy
-                path = [[float(lon), float(lat)] for lon, lat in zip(xs, ys)]
-                paths.append({"path": path})
+    # Snapshot geometries are plain LineStrings (MultiLineStrings are merged
+    # at build time), one path per edge
+    paths = [{"path": path} for path in cropped["paths"]]
 
     st.write("Rendered path count:", len(paths))
 
@@ -108,4 +90,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except GraphServiceUnavailable as e:
+        st.error(str(e))
@@ -1,43 +1,45 @@
 import streamlit as st
 import pydeck as pdk
+import numpy as np
 import osmnx as ox
-from shapely.geometry import LineString
-from shapely.ops import linemerge
 import sys, os
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+from src.core.edge_geometry import EdgeGeometry
 from src.core.graph_loader import load_graph
+from src.core.graph_patch import PATCH_PATH, GraphDelta
 from src.streamlit_map_click import map_click
 
 
-def normalize_geom(geom):
-    if geom is None or geom.is_empty:
-        return None
+@st.cache_resource
+def get_base_graph():
+    """
+    One shared, read-only graph for all sessions; edits go to a GraphDelta.
+    Loaded in-process rather than through the graph service: GraphDelta
+    checks existing edges and builds connector geometry on this graph.
+    """
+    return load_graph(use_master=True)
 
-    if geom.geom_type == "LineString":
-        return geom
 
-    if geom.geom_type == "MultiLineString":
-        # choose the longest segment
-        parts = list(geom.geoms)
-        if len(parts) == 0:
-            return None
-        return max(parts, key=lambda g: g.length)
-
-    return None
+@st.cache_resource
+def get_edge_table():
+    """Sanitised edge geometries of the base graph, built once."""
+    return EdgeGeometry.from_graph(get_base_graph())
 
 
 def main():
     st.title("OSM Graph Debug Viewer")
 
-    G = load_graph(use_master=True)
+    G = get_base_graph()
     st.write("Graph loaded")
 
-    gdf_nodes, gdf_edges = ox.convert.graph_to_gdfs(
-        G, nodes=True, edges=True, fill_edge_geometry=True
-    )
+    if "graph_delta" not in st.session_state:
+        st.session_state.graph_delta = GraphDelta(G)
+    delta = st.session_state.graph_delta
+
+    gdf_nodes = ox.convert.graph_to_gdfs(G, nodes=True, edges=False)
     # Debug: print graph bounding box
     xs = gdf_nodes["x"].values
     ys = gdf_nodes["y"].values
@@ -48,20 +50,16 @@ def main():
     st.write("min_lat:", float(ys.min()))
     st.write("max_lat:", float(ys.max()))
 
-    gdf_edges["geometry"] = gdf_edges.geometry.apply(normalize_geom)
-    lines = gdf_edges[gdf_edges.geometry.notna()]
+    table = get_edge_table()
+    valid = np.flatnonzero(table.valid)
 
-    st.write("Valid geometries:", len(lines))
+    st.write("Valid geometries:", len(valid))
 
     # Build PathLayer data
-    paths = []
-    for geom in lines.geometry:
-        if geom is None or geom.is_empty:
-            continue
+    paths = [{"path": path} for path in table.paths(valid)]
 
-        xs, ys = geom.xy
-        path = [[float(lon), float(lat)] for lon, lat in zip(xs, ys)]
-        paths.append({"path": path})
+    # Uncommitted connectors from this session
+    paths.extend({"path": path} for path in delta.added_paths())
 
     st.write("Paths to draw:", len(paths))
 
@@ -137,16 +135,23 @@ def main():
             b = node_id
             st.session_state.first_node = None
 
-            # Add edge to graph
-            if not G.has_edge(a, b):
-                G.add_edge(a, b)
-                G.add_edge(b, a)
-
-            # Save repaired graph
-            ox.save_graphml(G, "data/osm_cache/amsterdam_east_repaired.graphml")
+            # Record the edge in this session's delta; the base graph is shared
+            if not delta.has_edge(a, b):
+                delta.add_edge(a, b)
 
             st.success(f"Added repaired edge between {a} and {b}")
 
+    st.write("Uncommitted edits:", len(delta))
+
+    if st.button("Commit edits to patch file"):
+        written = delta.commit(source="debug_osm_graph_click")
+        # Reload the shared graph with the new patches applied, and start a
+        # fresh delta on it
+        get_base_graph.clear()
+        get_edge_table.clear()
+        del st.session_state.graph_delta
+        st.success(f"Appended {len(written)} edits to: {PATCH_PATH}")
+
 
 if __name__ == "__main__":
     main()
@@ -3,34 +3,37 @@ import pydeck as pdk
 import os
 import sys
 import osmnx as ox
-from shapely.geometry import LineString
 
 # Project root
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+from src.core.edge_geometry import EdgeGeometry
 from src.core.graph_loader import load_graph
-from src.core.preprocessing import haversine_m
+from src.core.graph_patch import PATCH_PATH, GraphDelta
 
 
 # -------------------------------------------------------
-# Helper to add an edge
+# Shared base graph (one copy for all sessions, never mutated).
+# Loaded in-process rather than through the graph service: GraphDelta
+# checks existing edges and builds connector geometry on this graph.
 # -------------------------------------------------------
-def add_edge(G, u, v, x_u, y_u, x_v, y_v):
-    geom = LineString([(x_u, y_u), (x_v, y_v)])
-    length = haversine_m(y_u, x_u, y_v, x_v)
-
-    G.add_edge(u, v, geometry=geom, length=length)
-    G.add_edge(v, u, geometry=geom, length=length)
-    return G
+@st.cache_resource
+def get_base_graph():
+    G = load_graph(use_master=True)
+    gdf_nodes = ox.graph_to_gdfs(G, nodes=True, edges=False)
+    paths = EdgeGeometry.from_graph(G).paths()
+    return G, gdf_nodes, paths
 
 
 # -------------------------------------------------------
-# Session state
+# Session state: only this session's uncommitted edits
 # -------------------------------------------------------
-if "G" not in st.session_state:
-    st.session_state.G = load_graph(use_master=True)
+G, gdf_nodes, base_paths = get_base_graph()
+
+if "graph_delta" not in st.session_state:
+    st.session_state.graph_delta = GraphDelta(G)
 
 if "selected_node_1" not in st.session_state:
     st.session_state.selected_node_1 = None
@@ -42,11 +45,7 @@ if "selected_node_2" not in st.session_state:
 # -------------------------------------------------------
 # Build map layers
 # -------------------------------------------------------
-G = st.session_state.G
-
-gdf_nodes, gdf_edges = ox.graph_to_gdfs(
-    G, nodes=True, edges=True, fill_edge_geometry=True
-)
+delta = st.session_state.graph_delta
 
 # Node list
 node_data = [
@@ -54,13 +53,9 @@ node_data = [
     for idx, row in gdf_nodes.iterrows()
 ]
 
-# Edge list
-paths = []
-for geom in gdf_edges.geometry:
-    if geom is None or geom.is_empty:
-        continue
-    xs, ys = geom.xy
-    paths.append({"path": [[float(lon), float(lat)] for lon, lat in zip(xs, ys)]})
+# Edge list, straight from the flat coordinate buffer
+paths = [{"path": path} for path in base_paths]
+added_paths = [{"path": path} for path in delta.added_paths()]
 
 
 node_layer = pdk.Layer(
@@ -81,6 +76,15 @@ edge_layer = pdk.Layer(
     width_min_pixels=1,
 )
 
+added_layer = pdk.Layer(
+    "PathLayer",
+    data=added_paths,
+    get_path="path",
+    get_color=[0, 160, 0],
+    width_scale=2,
+    width_min_pixels=3,
+)
+
 view_state = pdk.ViewState(
     latitude=float(gdf_nodes["y"].mean()),
     longitude=float(gdf_nodes["x"].mean()),
@@ -88,7 +92,7 @@ view_state = pdk.ViewState(
 )
 
 deck = pdk.Deck(
-    layers=[edge_layer, node_layer],
+    layers=[edge_layer, added_layer, node_layer],
     initial_view_state=view_state,
     tooltip={"html": "<b>Node ID:</b> {id}"}
 )
@@ -131,22 +135,26 @@ v = st.session_state.selected_node_2
 if u is not None and v is not None:
     if st.button("Add Edge"):
         try:
-            x_u = float(gdf_nodes.loc[u].x)
-            y_u = float(gdf_nodes.loc[u].y)
-            x_v = float(gdf_nodes.loc[v].x)
-            y_v = float(gdf_nodes.loc[v].y)
-
-            st.session_state.G = add_edge(G, u, v, x_u, y_u, x_v, y_v)
+            delta.add_edge(u, v)
             st.success(f"Added edge between {u} and {v}")
 
         except Exception as e:
             st.error(str(e))
 
+    if st.button("Remove Edge"):
+        delta.remove_edge(u, v)
+        st.success(f"Removed edge between {u} and {v}")
+
 
 # -------------------------------------------------------
-# Export graph
+# Commit edits
 # -------------------------------------------------------
-if st.button("Export repaired graph"):
-    out_path = os.path.join(PROJECT_ROOT, "data/osm_cache/repaired_graph.graphml")
-    ox.save_graphml(st.session_state.G, out_path)
-    st.success(f"Saved repaired graph to: {out_path}")
+st.write("Uncommitted edits:", len(delta))
+
+if st.button("Commit edits to patch file"):
+    written = delta.commit(source="debug_osm_graph_repair")
+    # Reload the shared graph with the new patches applied, and start a
+    # fresh delta on it
+    get_base_graph.clear()
+    del st.session_state.graph_delta
+    st.success(f"Appended {len(written)} edits to: {PATCH_PATH}")
@@ -2,8 +2,6 @@ import sys, os
 import json
 import streamlit as st
 import pydeck as pdk
-import osmnx as ox
-from shapely.geometry import Point, LineString
 
 PROJECT_ROOT = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "..")
@@ -11,7 +9,7 @@ PROJECT_ROOT = os.path.abspath(
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from src.core.graph_loader import load_graph
+from src.service.graph_client import GraphClient, GraphServiceUnavailable
 
 
 
@@ -38,24 +36,16 @@ def main():
     latlng = streams["latlng"]["data"]
     gps_df = [{"lat": p[0], "lon": p[1]} for p in latlng]
 
-    # Load master graph
-    G = load_graph(use_master=True)
+    # Edges around the run, from the graph service
+    # (start it with: python -m src.service.graph_service)
+    with GraphClient() as client:
+        cropped = client.crop(latlng, margin_deg=0.003)
 
-    # Convert edges to scatterable points for visualization
-    gdf_nodes, gdf_edges = ox.graph_to_gdfs(G, nodes=True, edges=True)
-
-    from src.core.graph_cropper import crop_graph_edges
-
-    cropped_edges = crop_graph_edges(gdf_edges, latlng, margin_deg=0.003)
-
-    edge_points = []
-    for geom in cropped_edges.geometry:
-        if geom is None:
-            continue
-        if geom.geom_type == "LineString":
-            xs, ys = geom.xy
-            for la, lo in zip(ys, xs):
-                edge_points.append({"lat": la, "lon": lo})
+    edge_points = [
+        {"lat": la, "lon": lo}
+        for path in cropped["paths"]
+        for lo, la in path
+    ]
 
     # Build pydeck layers
     layers = [
@@ -87,4 +77,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except GraphServiceUnavailable as e:
+        st.error(str(e))